@@ -0,0 +1,40 @@
+"""Who can see, review or edit a single post.
+
+Each check is a single query on the post's primary key: visibility is either an in-memory
+lookup in the user's cached followed users (see app.graph_cache), or an EXISTS subquery
+on the (user, followed_user) unique index when the user's followed users are not cached.
+Visibility rules match the feed, see app.posts.own_or_followed_tickets.
+"""
+
+from django.db.models import Exists, OuterRef, Q, QuerySet
+from .models import Ticket, Review, User, UserFollows
+from .posts import INLINE_FOLLOWED_IDS
+from . import graph_cache
+
+
+def visible_tickets(user: User) -> QuerySet[Ticket]:
+    """Tickets displayed in the feed of user: own tickets and tickets of followed users.
+    Meant to be filtered by primary key, the whole feed is queried by app.posts."""
+    followed = graph_cache.peek(user.pk)
+    if followed is not None and len(followed) <= INLINE_FOLLOWED_IDS:
+        return Ticket.objects.filter(user_id__in=[user.pk, *sorted(followed)])
+    return Ticket.objects.filter(Q(user_id=user.pk) | Exists(_followed(user, OuterRef("user_id"))))
+
+
+def reviewable_tickets(user: User) -> QuerySet[Ticket]:
+    """Tickets user can reply to: visible and not reviewed yet, with their author."""
+    return visible_tickets(user).filter(review_count=0).select_related("user")
+
+
+def editable_tickets(user: User) -> QuerySet[Ticket]:
+    """Tickets user can edit or delete: their own."""
+    return Ticket.objects.filter(user_id=user.pk)
+
+
+def editable_reviews(user: User) -> QuerySet[Review]:
+    """Reviews user can edit or delete: their own, with their ticket and its author."""
+    return Review.objects.filter(user_id=user.pk).select_related("ticket__user")
+
+
+def _followed(user: User, followed_user_id: int | OuterRef) -> QuerySet[UserFollows]:
+    return UserFollows.objects.filter(user_id=user.pk, followed_user_id=followed_user_id)
@@ -0,0 +1,223 @@
+"""JSON API for mobile and single page clients.
+
+Entries have the shapes of app.posts.ticket_dict() and review_dict(), pages are
+paginated with the same cursors as the feed page.
+
+Query parameters:
+- cursor: the next_cursor of the previous page,
+- fields: comma-separated list of the entry fields to return, all fields by default.
+
+Pages also return the latest_cursor of their most recent entry: polling feed/since
+with it returns the entries posted since then, or an empty 204 when nothing is new.
+
+The users/suggestions endpoint completes the username typed in the subscription form.
+The subscriptions/batch endpoint is the only one changing data: it follows and unfollows
+many users in a single request, for instance to import a contact list.
+The metrics endpoint returns the app's counters (see app.metrics) to staff users.
+
+Responses carry an ETag derived from the version of the user's feed (see app.feed_cache):
+clients polling an unchanged feed get a 304 before anything is loaded or serialized.
+
+Responses are serialized with orjson when it is installed, with the json module otherwise.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from functools import wraps
+from django.db.models.fields.files import FieldFile
+from django.http import HttpRequest, HttpResponse
+from django.views.decorators.http import condition, require_GET, require_POST
+from my_auth import throttle
+from . import feed as feed_tools
+from . import feed_cache
+from . import fragment_cache
+from . import graph_cache
+from . import metrics as metrics_tools
+from . import posts as post_tools
+from . import subscriptions as subscription_tools
+from .entries import ImageRef, TicketEntry, ReviewEntry
+
+# max number of users followed or unfollowed by a single batch request
+BATCH_LIMIT = 1000
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def login_required(view):
+    """Rejects anonymous requests with a 401 instead of redirecting to the login page."""
+
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return json_response({"error": "Authentication required"}, status=401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def feed_etag(request: HttpRequest, *args, **kwargs) -> str:
+    """ETag of a response computed from the requested url and the version of the user's feed."""
+    version = feed_cache.feed_version(request.user.pk)
+    raw = f"{request.user.pk}|{version}|{request.path}|{request.GET.urlencode()}"
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+@login_required
+@require_GET
+@condition(etag_func=feed_etag)
+def feed(request: HttpRequest) -> HttpResponse:
+    """A page of the user's feed."""
+    cursor = request.GET.get("cursor")
+    try:
+        entries, next_cursor = feed_cache.get_or_load(
+            request.user.pk, cursor, lambda: feed_tools.prepared_page(request.user, cursor)
+        )
+    except ValueError:
+        return json_response({"error": "Invalid cursor"}, status=400)
+    return page_response(entries, next_cursor, request_fields(request))
+
+
+@login_required
+@require_GET
+def feed_since(request: HttpRequest) -> HttpResponse:
+    """The entries of the user's feed newer than the "since" cursor, most recent first.
+    The answer is an empty 204 when nothing is new."""
+    since = request.GET.get("since")
+    if not since:
+        return json_response({"error": "Missing since cursor"}, status=400)
+    try:
+        entries, next_cursor = feed_tools.prepared_since(request.user, since)
+    except ValueError:
+        return json_response({"error": "Invalid cursor"}, status=400)
+    if not entries:
+        return HttpResponse(status=204)
+    return page_response(entries, next_cursor, request_fields(request))
+
+
+@login_required
+@require_GET
+@condition(etag_func=feed_etag)
+def posts(request: HttpRequest) -> HttpResponse:
+    """A page of the posts of the user."""
+    try:
+        page = post_tools.entries_page(
+            post_tools.own_tickets(request.user),
+            post_tools.own_reviews(request.user),
+            cursor=request.GET.get("cursor"),
+        )
+    except ValueError:
+        return json_response({"error": "Invalid cursor"}, status=400)
+    return page_response(page.entries, page.next_cursor, request_fields(request))
+
+
+@login_required
+@require_GET
+def username_suggestions(request: HttpRequest) -> HttpResponse:
+    """Usernames starting with the "q" prefix, ignoring case, that the user may follow.
+    At most "limit" usernames are returned, up to SUGGESTIONS_LIMIT."""
+    try:
+        limit = min(int(request.GET.get("limit", subscription_tools.SUGGESTIONS_LIMIT)), subscription_tools.SUGGESTIONS_LIMIT)
+    except ValueError:
+        return json_response({"error": "Invalid limit"}, status=400)
+    usernames = subscription_tools.username_suggestions(request.user, request.GET.get("q", ""), limit=max(limit, 0))
+    return json_response({"usernames": usernames})
+
+
+@login_required
+@require_POST
+def subscriptions_batch(request: HttpRequest) -> HttpResponse:
+    """Follows and unfollows many users at once.
+
+    The request body is a JSON object with optional keys:
+    - follow: a list of usernames to follow, ignoring case,
+    - unfollow: a list of ids of the users to unfollow.
+    Each list holds at most BATCH_LIMIT items.
+    """
+    try:
+        data = json.loads(request.body)
+        follow, unfollow = data.get("follow", []), data.get("unfollow", [])
+        # strings are iterable too: "alix" would follow "a", "l", "i" and "x"
+        if not isinstance(follow, list) or not isinstance(unfollow, list):
+            raise TypeError("follow and unfollow must be lists")
+        follow = [str(x) for x in follow]
+        unfollow = [int(x) for x in unfollow]
+    except (ValueError, TypeError, AttributeError):
+        return json_response({"error": "Invalid request body"}, status=400)
+    if len(follow) > BATCH_LIMIT or len(unfollow) > BATCH_LIMIT:
+        return json_response({"error": "Too many users, at most %d per list" % BATCH_LIMIT}, status=400)
+    unfollowed = subscription_tools.bulk_unfollow(request.user, unfollow) if unfollow else 0
+    followed = subscription_tools.bulk_follow(request.user, follow) if follow else []
+    return json_response({"followed": followed, "unfollowed": unfollowed})
+
+
+@login_required
+@require_GET
+def metrics(request: HttpRequest) -> HttpResponse:
+    """The app's counters and rates, as counted by the worker serving the request
+    when the cache backend is process-local."""
+    if not request.user.is_staff:
+        return json_response({"error": "Staff only"}, status=403)
+    return json_response(metrics_report())
+
+
+def metrics_report() -> dict[str, int | float]:
+    """All declared counters, followed by the rates computed from them."""
+    return metrics_tools.snapshot() | {
+        "feed_cache.hit_rate": feed_cache.stats()["hit_rate"],
+        "post_fragments.hit_rate": fragment_cache.stats()["hit_rate"],
+        "graph_cache.hit_rate": graph_cache.stats()["hit_rate"],
+        "login_throttle.rejection_rate": throttle.stats()["rejection_rate"],
+    }
+
+
+def request_fields(request: HttpRequest) -> set[str] | None:
+    """Reads the fields requested in the query, None if all fields are requested."""
+    fields = request.GET.get("fields")
+    if not fields:
+        return None
+    return {x.strip() for x in fields.split(",") if x.strip()}
+
+
+def page_response(
+    entries: list[TicketEntry | ReviewEntry], next_cursor: str | None, fields: set[str] = None
+) -> HttpResponse:
+    return json_response(
+        {
+            "entries": [json_entry(x, fields) for x in entries],
+            "next_cursor": next_cursor,
+            "latest_cursor": post_tools.encode_cursor(entries[0]) if entries else None,
+        }
+    )
+
+
+def json_entry(entry: TicketEntry | ReviewEntry, fields: set[str] = None) -> dict:
+    """Converts a post entry to JSON-compatible values, keeping only the requested fields."""
+    data = post_tools.entry_dict(entry)
+    return {k: json_value(v) for k, v in data.items() if fields is None or k in fields}
+
+
+def json_value(value):
+    if isinstance(value, dict):
+        return {k: json_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [json_value(x) for x in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (FieldFile, ImageRef)):
+        return value.url if value else None
+    return value
+
+
+def dumps(data) -> bytes:
+    """Serializes data to JSON, with orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def json_response(data, status: int = 200) -> HttpResponse:
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
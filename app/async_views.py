@@ -0,0 +1,106 @@
+"""Asynchronous versions of the feed, posts and subscriptions pages, served when ASYNC_VIEWS is set
+(see settings.py) and the app runs under ASGI (see litrevu/asgi.py).
+
+Independent queries of a page run concurrently with asyncio.gather() through Django's async ORM.
+Pages are rendered like their synchronous counterparts in app.views, streamed pages
+from entries loaded with the async ORM (see app.streaming.astream_page()).
+Form submissions, whose signal receivers are synchronous, are handed over to the synchronous views.
+"""
+
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest, HttpResponse, Http404, StreamingHttpResponse
+from django.shortcuts import render
+from .models import User
+from . import events
+from . import feed as feed_tools
+from . import feed_cache
+from . import forms
+from . import posts as post_tools
+from . import streaming
+from . import subscriptions as subscription_tools
+from . import suggestions as suggestion_tools
+from . import views
+
+
+@login_required
+async def feed(request: HttpRequest) -> HttpResponse:
+    """Display a page of the user's feed, see app.views.feed()."""
+    user = await _request_user(request)
+    if settings.STREAM_PAGES:
+        entries = (
+            post_tools.prepare_post_entry(x, feed_tools.entry_commands(x))
+            async for x in feed_tools.aiter_feed(user, chunk_size=settings.STREAM_CHUNK_SIZE)
+        )
+        return streaming.astream_page(request, "app/feed/feed.html", {}, entries)
+    cursor = request.GET.get("cursor")
+    try:
+        entries, next_cursor = await feed_cache.aget_or_load(
+            user.pk, cursor, lambda: feed_tools.aprepared_page(user, cursor)
+        )
+    except ValueError:
+        raise Http404()
+    context = {"feed_entries": entries, "next_cursor": next_cursor}
+    return render(request, "app/feed/feed.html", context)
+
+
+@login_required
+async def posts(request: HttpRequest) -> HttpResponse:
+    """Display the user's posts, see app.views.posts()."""
+    user = await _request_user(request)
+    if settings.STREAM_PAGES:
+        entries = (
+            views.posts_entry(x, request)
+            async for x in post_tools.aiter_entries(
+                post_tools.own_tickets(user), post_tools.own_reviews(user), chunk_size=settings.STREAM_CHUNK_SIZE
+            )
+        )
+        return streaming.astream_page(request, "app/posts/posts.html", {}, entries)
+    entries = await post_tools.aentries(post_tools.own_tickets(user), post_tools.own_reviews(user))
+    context = {"posts": [views.posts_entry(x, request) for x in entries]}
+    return render(request, "app/posts/posts.html", context=context)
+
+
+@login_required
+async def subscriptions(request: HttpRequest) -> HttpResponse:
+    """Display the subscription page, see app.views.subscriptions()."""
+    if request.method == "POST":
+        return await sync_to_async(views.subscriptions)(request)
+    user = await _request_user(request)
+    try:
+        following, followers, suggestions = await asyncio.gather(
+            subscription_tools.afollowed_users_page(user, request.GET.get("following")),
+            subscription_tools.afollowers_page(user, request.GET.get("followers")),
+            suggestion_tools.asuggested_users(user),
+        )
+    except ValueError:
+        raise Http404()
+    context = views.subscriptions_context(request, forms.SubscribeToUserForm(), following, followers, suggestions)
+    return render(request, "app/subscriptions/subscriptions.html", context=context)
+
+
+@login_required
+async def feed_events(request: HttpRequest) -> HttpResponse | StreamingHttpResponse:
+    """Server-sent events pushing the new entries of the user's feed, see app.events.
+    Served by the async views in all deployments, it requires ASGI: a WSGI handler would read
+    the endless event stream to its end, holding its worker forever. Answers 501 under WSGI."""
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Server-sent events require an ASGI server.", status=501, content_type="text/plain")
+    user = await _request_user(request)
+    response = StreamingHttpResponse(
+        events.event_stream(user, request.headers.get("Last-Event-ID")), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    # keep reverse proxies from buffering events
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _request_user(request: HttpRequest) -> User:
+    """Loads the authenticated user with the async ORM.
+    request.user is replaced, so that templates read it without querying the database."""
+    request.user = await request.auser()
+    return request.user
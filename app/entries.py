@@ -0,0 +1,275 @@
+"""Compact post entries displayed in feeds and post lists.
+
+Entries are slot-based objects built from .values() rows rather than model instances.
+An EntryMap builds each user and each reviewed ticket only once: every entry referencing the same
+author or the same reviewed ticket shares a single object.
+Tickets displayed as entries of their own get commands (see app.posts.prepare_post_entry()):
+they are never shared, so that their commands do not leak to the reviews displaying them.
+"""
+
+from datetime import datetime
+from .helpers import reverse_id
+from .models import Ticket, Review
+
+# fields selected by .values() to build entries, see app.posts.ticket_values() and review_values()
+TICKET_FIELDS = (
+    "id",
+    "time_created",
+    "updated_at",
+    "title",
+    "description",
+    "image",
+    "review_count",
+    "user",
+    "user__username",
+)
+REVIEW_FIELDS = (
+    "id",
+    "time_created",
+    "updated_at",
+    "rating",
+    "headline",
+    "body",
+    "user",
+    "user__username",
+) + tuple("ticket__" + x for x in TICKET_FIELDS)
+
+
+class UserEntry:
+    """The author of a post."""
+
+    __slots__ = ("id", "username")
+
+    def __init__(self, id: int, username: str):
+        self.id = id
+        self.username = username
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+
+class ImageRef:
+    """The image of a ticket: its url is resolved on demand."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @property
+    def url(self) -> str:
+        return Ticket._meta.get_field("image").storage.url(self.name)
+
+    def __bool__(self) -> bool:
+        return bool(self.name)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class TicketEntry:
+    __slots__ = (
+        "id",
+        "time_created",
+        "updated_at",
+        "user",
+        "title",
+        "description",
+        "image",
+        "review_count",
+        "commands",
+    )
+    content_type = "TICKET"
+
+    def __init__(
+        self,
+        id: int,
+        time_created: datetime,
+        updated_at: datetime,
+        user: UserEntry,
+        title: str,
+        description: str,
+        image: ImageRef | None,
+        review_count: int,
+    ):
+        self.id = id
+        self.time_created = time_created
+        self.updated_at = updated_at
+        self.user = user
+        self.title = title
+        self.description = description
+        self.image = image
+        self.review_count = review_count
+        self.commands = None
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+    @property
+    def can_review(self) -> bool:
+        return self.review_count == 0
+
+    @property
+    def edit_url(self) -> str:
+        return reverse_id("edit_ticket", "ticket_id", self.id)
+
+    @property
+    def delete_url(self) -> str:
+        return reverse_id("delete_ticket", "ticket_id", self.id)
+
+    @property
+    def review_url(self) -> str:
+        return reverse_id("review_for_ticket", "ticket_id", self.id)
+
+
+class ReviewEntry:
+    __slots__ = (
+        "id",
+        "time_created",
+        "updated_at",
+        "user",
+        "rating",
+        "headline",
+        "body",
+        "ticket",
+        "commands",
+    )
+    content_type = "REVIEW"
+
+    def __init__(
+        self,
+        id: int,
+        time_created: datetime,
+        updated_at: datetime,
+        user: UserEntry,
+        rating: int,
+        headline: str,
+        body: str,
+        ticket: TicketEntry,
+    ):
+        self.id = id
+        self.time_created = time_created
+        self.updated_at = updated_at
+        self.user = user
+        self.rating = rating
+        self.headline = headline
+        self.body = body
+        self.ticket = ticket
+        self.commands = None
+
+    @property
+    def pk(self) -> int:
+        return self.id
+
+    @property
+    def title(self) -> str:
+        return self.headline
+
+    @property
+    def edit_url(self) -> str:
+        return reverse_id("edit_review", "review_id", self.id)
+
+    @property
+    def delete_url(self) -> str:
+        return reverse_id("delete_review", "review_id", self.id)
+
+
+class EntryMap:
+    """Identity map building entries from .values() rows or model instances.
+
+    Users are always shared. Reviewed tickets are shared unless share_tickets is False:
+    long streams would otherwise keep every ticket they display in memory.
+    Ticket entries are not, see the module docstring.
+    """
+
+    __slots__ = ("users", "tickets")
+
+    def __init__(self, share_tickets: bool = True):
+        self.users: dict[int, UserEntry] = {}
+        self.tickets: dict[int, TicketEntry] | None = {} if share_tickets else None
+
+    def user(self, user_id: int, username: str) -> UserEntry:
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = UserEntry(user_id, username)
+        return user
+
+    def entry(self, row: dict, prefix: str = "") -> TicketEntry | ReviewEntry:
+        """Builds the entry of a row, its type is read from the row's content_type.
+        Entry fields are read from the row keys starting with prefix."""
+        if row["content_type"] == "REVIEW":
+            return self.review(row, prefix)
+        return self.ticket(row, prefix, shared=False)
+
+    def ticket(self, row: dict, prefix: str = "", shared: bool = True) -> TicketEntry:
+        """Builds a ticket, shared with the other reviews of the map when shared is True."""
+        shared = shared and self.tickets is not None
+        ticket_id = row[prefix + "id"]
+        if shared and ticket_id in self.tickets:
+            return self.tickets[ticket_id]
+        image = row[prefix + "image"]
+        ticket = TicketEntry(
+            id=ticket_id,
+            time_created=row[prefix + "time_created"],
+            updated_at=row[prefix + "updated_at"],
+            user=self.user(row[prefix + "user"], row[prefix + "user__username"]),
+            title=row[prefix + "title"],
+            description=row[prefix + "description"],
+            image=ImageRef(image) if image else None,
+            review_count=row[prefix + "review_count"],
+        )
+        if shared:
+            self.tickets[ticket_id] = ticket
+        return ticket
+
+    def review(self, row: dict, prefix: str = "") -> ReviewEntry:
+        return ReviewEntry(
+            id=row[prefix + "id"],
+            time_created=row[prefix + "time_created"],
+            updated_at=row[prefix + "updated_at"],
+            user=self.user(row[prefix + "user"], row[prefix + "user__username"]),
+            rating=row[prefix + "rating"],
+            headline=row[prefix + "headline"],
+            body=row[prefix + "body"],
+            ticket=self.ticket(row, prefix + "ticket__"),
+        )
+
+    def from_instance(self, post: Ticket | Review) -> TicketEntry | ReviewEntry:
+        """Builds the entry of a model instance."""
+        if post.content_type == "REVIEW":
+            return self.review(_review_row(post))
+        return self.ticket(_ticket_row(post), shared=False)
+
+
+def row_key(row: dict) -> tuple[datetime, str, int]:
+    """The key ordering .values() rows in a feed, see app.posts.feed_sort_key()."""
+    return (row["time_created"], row["content_type"], row["id"])
+
+
+def _ticket_row(ticket: Ticket, prefix: str = "") -> dict:
+    return {
+        prefix + "id": ticket.pk,
+        prefix + "time_created": ticket.time_created,
+        prefix + "updated_at": ticket.updated_at,
+        prefix + "title": ticket.title,
+        prefix + "description": ticket.description,
+        prefix + "image": ticket.image.name if ticket.image else None,
+        prefix + "review_count": ticket.review_count,
+        prefix + "user": ticket.user_id,
+        prefix + "user__username": ticket.user.username,
+    }
+
+
+def _review_row(review: Review) -> dict:
+    return {
+        "id": review.pk,
+        "time_created": review.time_created,
+        "updated_at": review.updated_at,
+        "rating": review.rating,
+        "headline": review.headline,
+        "body": review.body,
+        "user": review.user_id,
+        "user__username": review.user.username,
+    } | _ticket_row(review.ticket, "ticket__")
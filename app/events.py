@@ -0,0 +1,258 @@
+"""Server-sent events pushing new feed entries to connected readers.
+
+When a post is created, app.signals publishes it once the transaction is committed,
+to the users whose feed displays it (see app.feed.fan_out). The entry is serialized once,
+as a ready-to-send event frame shared by all its readers.
+
+Events go through a bus, keyed by reader id, selected by the FEED_EVENTS setting:
+- LocalBus: in-process, events only reach the readers connected to the publishing worker,
+- SqliteBus: events are written to a SQLite file polled by every worker, so that several
+    workers on the same host share their events.
+
+Each connection is an idle coroutine waiting on its subscription: it holds a bounded
+queue of pending frames (oldest frames are dropped when a reader is too slow)
+and sends a keepalive comment every FEED_EVENTS_HEARTBEAT seconds.
+Reconnecting clients send the id of the last event received (Last-Event-ID):
+the entries posted in between are sent first, from the feed (see app.feed.prepared_since).
+
+The event stream must be served under ASGI (see litrevu/asgi.py).
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import cache
+from typing import AsyncIterator, Iterable, Iterator
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .api import dumps, json_entry
+from .models import Ticket, Review
+from . import feed as feed_tools
+from . import metrics
+from . import posts as post_tools
+
+PUBLISHED = metrics.counter("events.published")
+DELIVERED = metrics.counter("events.delivered")
+DROPPED = metrics.counter("events.dropped")
+
+# sent first: delay before the client reconnects after the connection is lost, in ms
+RETRY_FRAME = b"retry: 5000\n\n"
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+class Subscription:
+    """The pending events of a single connection, bound to the event loop serving it.
+    Events may be pushed from any thread."""
+
+    __slots__ = ("user_id", "_loop", "_pending", "_waiter")
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.user_id = user_id
+        self._loop = loop
+        self._pending = deque(maxlen=queue_size)
+        self._waiter = None
+
+    def push(self, frame: bytes):
+        try:
+            self._loop.call_soon_threadsafe(self._put, frame)
+        except RuntimeError:
+            # the loop serving the connection is closed
+            pass
+
+    def _put(self, frame: bytes):
+        if len(self._pending) == self._pending.maxlen:
+            metrics.incr(DROPPED)
+        self._pending.append(frame)
+        if self._waiter is not None:
+            _wake(self._waiter)
+
+    async def get(self, timeout: float) -> bytes | None:
+        """The next pending frame, or None if nothing was pushed within timeout seconds."""
+        if not self._pending:
+            # a timer resolves the waiter: unlike asyncio.wait_for(), no task is created per wait
+            self._waiter = self._loop.create_future()
+            timer = self._loop.call_later(timeout, _wake, self._waiter)
+            try:
+                await self._waiter
+            finally:
+                timer.cancel()
+                self._waiter = None
+            if not self._pending:
+                return None
+        return self._pending.popleft()
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class LocalBus:
+    """Dispatches events to the subscriptions of the current process."""
+
+    def __init__(self, queue_size: int = 20):
+        self.queue_size = queue_size
+        self._subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """Subscribes to the events of a user. Must be called from the loop serving the connection."""
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def connections(self) -> int:
+        """Number of open subscriptions."""
+        with self._lock:
+            return sum(len(x) for x in self._subscriptions.values())
+
+    def listening(self, user_ids: Iterable[int]) -> bool:
+        """Tells if an event for these users may reach a subscription:
+        events for users without subscriptions are not even serialized."""
+        with self._lock:
+            return any(x in self._subscriptions for x in user_ids)
+
+    def publish(self, user_ids: Iterable[int], frame: bytes):
+        self.dispatch(user_ids, frame)
+
+    def dispatch(self, user_ids: Iterable[int], frame: bytes):
+        """Pushes a frame to the local subscriptions of these users."""
+        with self._lock:
+            subscriptions = [x for user_id in user_ids for x in self._subscriptions.get(user_id, ())]
+        for subscription in subscriptions:
+            subscription.push(frame)
+        if subscriptions:
+            metrics.incr(DELIVERED, len(subscriptions))
+
+
+class SqliteBus(LocalBus):
+    """Shares events between the workers of a host through a SQLite file.
+
+    Published events are appended to the file, each worker polls it every poll_interval seconds
+    while it has subscriptions, and dispatches new events to its local subscriptions.
+    Events older than retention seconds are deleted.
+    """
+
+    def __init__(self, path: str, queue_size: int = 20, poll_interval: float = 0.5, retention: float = 60):
+        super().__init__(queue_size=queue_size)
+        self.path = str(path)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._poller: asyncio.Task | None = None
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS feed_events"
+                " (id INTEGER PRIMARY KEY AUTOINCREMENT, user_ids TEXT NOT NULL, frame BLOB NOT NULL, created REAL NOT NULL)"
+            )
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = super().subscribe(user_id)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        return subscription
+
+    def listening(self, user_ids: Iterable[int]) -> bool:
+        # readers may be connected to another worker
+        return True
+
+    def publish(self, user_ids: Iterable[int], frame: bytes):
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO feed_events (user_ids, frame, created) VALUES (?, ?, ?)",
+                (json.dumps(sorted(user_ids)), frame, now),
+            )
+            db.execute("DELETE FROM feed_events WHERE created < ?", (now - self.retention,))
+
+    async def _poll(self):
+        """Dispatches new events to the local subscriptions, until there are none left."""
+        last_id = await asyncio.to_thread(self._last_id)
+        while self.connections():
+            await asyncio.sleep(self.poll_interval)
+            for event_id, user_ids, frame in await asyncio.to_thread(self._events_after, last_id):
+                self.dispatch(json.loads(user_ids), frame)
+                last_id = event_id
+
+    def _last_id(self) -> int:
+        with self._connect() as db:
+            return db.execute("SELECT COALESCE(MAX(id), 0) FROM feed_events").fetchone()[0]
+
+    def _events_after(self, last_id: int) -> list[tuple[int, str, bytes]]:
+        with self._connect() as db:
+            return db.execute(
+                "SELECT id, user_ids, frame FROM feed_events WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """A connection to the events file, committed and closed on exit."""
+        db = sqlite3.connect(self.path, timeout=5)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+@cache
+def bus() -> LocalBus:
+    """The event bus configured by the FEED_EVENTS setting."""
+    config = settings.FEED_EVENTS
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+
+def publish_post(post: Ticket | Review, readers: Iterable[int]):
+    """Pushes a new post to the connected readers of its feed."""
+    readers = set(readers)
+    events = bus()
+    if not events.listening(readers):
+        return
+    entry = post_tools.prepare_post_entry(post, feed_tools.entry_commands(post))
+    events.publish(readers, entry_frame(entry))
+    metrics.incr(PUBLISHED)
+
+
+def entry_frame(entry) -> bytes:
+    """Serializes a post entry as an event, identified by the entry's cursor."""
+    return b"id: %s\nevent: entry\ndata: %s\n\n" % (post_tools.encode_cursor(entry).encode(), dumps(json_entry(entry)))
+
+
+async def event_stream(user, last_event_id: str = None) -> AsyncIterator[bytes]:
+    """The frames sent to a connected user: the entries missed since last_event_id if any,
+    then new entries as they are published, and keepalive comments in between."""
+    events = bus()
+    subscription = events.subscribe(user.pk)
+    try:
+        yield RETRY_FRAME
+        if last_event_id:
+            # subscribed first, so that nothing is lost: an entry may be sent twice, with the same id
+            for frame in await _missed_frames(user, last_event_id):
+                yield frame
+        while True:
+            frame = await subscription.get(timeout=settings.FEED_EVENTS_HEARTBEAT)
+            yield KEEPALIVE_FRAME if frame is None else frame
+    finally:
+        events.unsubscribe(subscription)
+
+
+@sync_to_async
+def _missed_frames(user, last_event_id: str) -> list[bytes]:
+    try:
+        entries, _ = feed_tools.prepared_since(user, last_event_id)
+    except ValueError:
+        return []
+    return [entry_frame(x) for x in reversed(entries)]
@@ -0,0 +1,310 @@
+"""Materialized feeds: fan-out on write.
+
+Each post is copied as a FeedEntry in the feed of every user allowed to see it
+when the post is created, so reading a feed is a range scan on (owner, time_created).
+Entries are deleted along with their post (cascade).
+
+Visibility rules match app.posts.own_or_followed_tickets and own_or_followed_reviews:
+- a ticket is visible to its author and the author's followers,
+- a review is visible to its author, the author's followers and the owner of the reviewed ticket.
+"""
+
+from collections import defaultdict
+from typing import AsyncIterator, Iterable
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.db.models.functions import Coalesce
+from .models import User, Ticket, Review, UserFollows, FeedEntry
+from .posts import FeedPage, FEED_PAGE_SIZE, decode_cursor, encode_cursor
+from .entries import EntryMap, TicketEntry, ReviewEntry, TICKET_FIELDS, REVIEW_FIELDS
+from . import posts as post_tools
+
+# rows inserted per statement when writing feed entries in bulk
+BATCH_SIZE = 1000
+
+# fields selected by .values() to build post entries from feed entries
+FEED_ENTRY_FIELDS = (
+    ("content_type",)
+    + tuple("ticket__" + x for x in TICKET_FIELDS)
+    + tuple("review__" + x for x in REVIEW_FIELDS)
+)
+ENTRY_PREFIX = {"TICKET": "ticket__", "REVIEW": "review__"}
+
+
+def fan_out(post: Ticket | Review) -> set[int]:
+    """Adds a new post to the feed of every user allowed to see it.
+    Returns the ids of these users."""
+    owners = set(
+        UserFollows.objects.filter(followed_user_id=post.user_id).values_list("user_id", flat=True)
+    )
+    owners.add(post.user_id)
+    if post.content_type == "REVIEW":
+        ticket_owner = Ticket.objects.filter(pk=post.ticket_id).values_list("user_id", flat=True).first()
+        if ticket_owner is not None:
+            owners.add(ticket_owner)
+    FeedEntry.objects.bulk_create(
+        [_feed_entry(owner_id, post) for owner_id in owners],
+        ignore_conflicts=True,
+    )
+    return owners
+
+
+def backfill(user: User, *followed_user_ids: int):
+    """Adds all posts from newly followed users to the user's feed."""
+    tickets = Ticket.objects.filter(user_id__in=followed_user_ids)
+    reviews = Review.objects.filter(user_id__in=followed_user_ids)
+    FeedEntry.objects.bulk_create(
+        (_feed_entry(user.pk, x) for x in _posts(tickets, reviews)),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune(user: User, *followed_user_ids: int):
+    """Removes the posts from users no longer followed from the user's feed.
+    Reviews posted in reply to the user's own tickets remain in the feed."""
+    FeedEntry.objects.filter(owner_id=user.pk).filter(
+        Q(ticket__user_id__in=followed_user_ids)
+        | (Q(review__user_id__in=followed_user_ids) & ~Q(review__ticket__user_id=user.pk))
+    ).delete()
+
+
+def rebuild_feeds() -> int:
+    """Rebuilds the feeds of all users from scratch.
+    Returns the number of feed entries written."""
+    followers = defaultdict(set)
+    for user_id, followed_user_id in UserFollows.objects.values_list("user_id", "followed_user_id"):
+        followers[followed_user_id].add(user_id)
+    tickets = Ticket.objects.only("pk", "user", "time_created")
+    reviews = Review.objects.select_related("ticket").only(
+        "pk", "user", "time_created", "ticket__user"
+    )
+
+    def entries():
+        for post in _posts(tickets, reviews):
+            owners = followers[post.user_id] | {post.user_id}
+            if post.content_type == "REVIEW":
+                owners.add(post.ticket.user_id)
+            for owner_id in owners:
+                yield _feed_entry(owner_id, post)
+
+    with transaction.atomic():
+        FeedEntry.objects.all().delete()
+        return len(FeedEntry.objects.bulk_create(entries(), batch_size=BATCH_SIZE))
+
+
+def feed_page(user: User, cursor: str = None, page_size: int = FEED_PAGE_SIZE) -> FeedPage:
+    """Loads a single page of a user's feed from the materialized feed, as model instances.
+    Same results and cursors as app.posts.feed_page().
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    rows = list(
+        _feed_entries(user, cursor).select_related(
+            "ticket__user", "review__user", "review__ticket__user"
+        )[: page_size + 1]
+    )
+    posts = [x.post for x in rows[:page_size]]
+    next_cursor = encode_cursor(posts[-1]) if len(rows) > page_size else None
+    return FeedPage(posts, next_cursor)
+
+
+def entries_page(
+    user: User, cursor: str = None, page_size: int = FEED_PAGE_SIZE, entry_map: EntryMap = None
+) -> FeedPage:
+    """Loads a single page of a user's feed from the materialized feed,
+    as post entries built from .values() rows (see app.entries).
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    rows = _feed_entries(user, cursor).values(*FEED_ENTRY_FIELDS)[: page_size + 1]
+    return _entries_page(list(rows), page_size, entry_map or EntryMap())
+
+
+def entries_since(
+    user: User, since: str, page_size: int = FEED_PAGE_SIZE, entry_map: EntryMap = None
+) -> FeedPage:
+    """Loads the entries of a user's materialized feed newer than the since cursor,
+    see app.posts.entries_since().
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    entries = _feed_entries(user).filter(_before_cursor(decode_cursor(since)))
+    rows = entries.values(*FEED_ENTRY_FIELDS)[: page_size + 1]
+    return _entries_page(list(rows), page_size, entry_map or EntryMap())
+
+
+async def aentries_page(
+    user: User, cursor: str = None, page_size: int = FEED_PAGE_SIZE, entry_map: EntryMap = None
+) -> FeedPage:
+    """Same as entries_page(), with the async ORM."""
+    rows = _feed_entries(user, cursor).values(*FEED_ENTRY_FIELDS)[: page_size + 1]
+    return _entries_page(await post_tools.alist(rows), page_size, entry_map or EntryMap())
+
+
+def iter_entries(user: User, chunk_size: int = 100) -> Iterable[TicketEntry | ReviewEntry]:
+    """Iterates lazily over a user's whole materialized feed, most recent first.
+    Rows are loaded chunk_size at a time."""
+    entry_map = EntryMap(share_tickets=False)
+    rows = _feed_entries(user).values(*FEED_ENTRY_FIELDS).iterator(chunk_size=chunk_size)
+    return (entry_map.entry(x, ENTRY_PREFIX[x["content_type"]]) for x in rows)
+
+
+async def aiter_entries(user: User, chunk_size: int = 100) -> AsyncIterator[TicketEntry | ReviewEntry]:
+    """Same as iter_entries(), with the async ORM."""
+    entry_map = EntryMap(share_tickets=False)
+    async for row in _feed_entries(user).values(*FEED_ENTRY_FIELDS).aiterator(chunk_size=chunk_size):
+        yield entry_map.entry(row, ENTRY_PREFIX[row["content_type"]])
+
+
+def load_page(user: User, cursor: str = None, page_size: int = FEED_PAGE_SIZE) -> FeedPage:
+    """Loads a page of a user's feed as post entries, from the materialized feed,
+    or from the posts tables when FEED_MATERIALIZED is not set.
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    if settings.FEED_MATERIALIZED:
+        return entries_page(user, cursor=cursor, page_size=page_size)
+    return post_tools.entries_page(
+        post_tools.own_or_followed_tickets(user),
+        post_tools.own_or_followed_reviews(user),
+        cursor=cursor,
+        page_size=page_size,
+    )
+
+
+def load_since(user: User, since: str, page_size: int = FEED_PAGE_SIZE) -> FeedPage:
+    """Loads the entries of a user's feed newer than the since cursor, from the materialized feed,
+    or from the posts tables when FEED_MATERIALIZED is not set.
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    if settings.FEED_MATERIALIZED:
+        return entries_since(user, since, page_size=page_size)
+    return post_tools.feed_since(user, since, page_size=page_size)
+
+
+async def aload_page(user: User, cursor: str = None, page_size: int = FEED_PAGE_SIZE) -> FeedPage:
+    """Same as load_page(), with the async ORM."""
+    if settings.FEED_MATERIALIZED:
+        return await aentries_page(user, cursor=cursor, page_size=page_size)
+    return await post_tools.aentries_page(
+        post_tools.own_or_followed_tickets(user),
+        post_tools.own_or_followed_reviews(user),
+        cursor=cursor,
+        page_size=page_size,
+    )
+
+
+def iter_feed(user: User, chunk_size: int = 100) -> Iterable[TicketEntry | ReviewEntry]:
+    """Iterates lazily over a user's whole feed as post entries, from the materialized feed,
+    or from the posts tables when FEED_MATERIALIZED is not set."""
+    if settings.FEED_MATERIALIZED:
+        return iter_entries(user, chunk_size=chunk_size)
+    return post_tools.iter_entries(
+        post_tools.own_or_followed_tickets(user),
+        post_tools.own_or_followed_reviews(user),
+        chunk_size=chunk_size,
+    )
+
+
+def aiter_feed(user: User, chunk_size: int = 100) -> AsyncIterator[TicketEntry | ReviewEntry]:
+    """Same as iter_feed(), with the async ORM."""
+    if settings.FEED_MATERIALIZED:
+        return aiter_entries(user, chunk_size=chunk_size)
+    return post_tools.aiter_entries(
+        post_tools.own_or_followed_tickets(user),
+        post_tools.own_or_followed_reviews(user),
+        chunk_size=chunk_size,
+    )
+
+
+def prepared_page(user: User, cursor: str = None) -> tuple[list[TicketEntry | ReviewEntry], str | None]:
+    """Loads and prepares the entries of a feed page for display.
+    Returns the entries and the cursor of the next page.
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    return _prepared(load_page(user, cursor=cursor))
+
+
+def prepared_since(user: User, since: str) -> tuple[list[TicketEntry | ReviewEntry], str | None]:
+    """Loads and prepares the feed entries newer than the since cursor for display.
+    Returns the entries and the cursor of the next page.
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    return _prepared(load_since(user, since))
+
+
+async def aprepared_page(user: User, cursor: str = None) -> tuple[list[TicketEntry | ReviewEntry], str | None]:
+    """Same as prepared_page(), with the async ORM."""
+    return _prepared(await aload_page(user, cursor=cursor))
+
+
+def _prepared(page: FeedPage) -> tuple[list[TicketEntry | ReviewEntry], str | None]:
+    entries = [post_tools.prepare_post_entry(x, entry_commands(x)) for x in page.entries]
+    return entries, page.next_cursor
+
+
+def entry_commands(entry: Ticket | Review | TicketEntry | ReviewEntry) -> list | None:
+    """Commands available on an entry displayed in the feed:
+    tickets without a review can be reviewed."""
+    if entry.content_type == "TICKET" and entry.can_review:
+        return ["review"]
+    return None
+
+
+def _feed_entries(user: User, cursor: str = None) -> QuerySet[FeedEntry]:
+    """A user's feed entries in feed order, starting after the cursor."""
+    entries = FeedEntry.objects.filter(owner_id=user.pk).annotate(
+        post_id=Coalesce("review_id", "ticket_id")
+    )
+    if cursor:
+        entries = entries.filter(_after_cursor(decode_cursor(cursor)))
+    return entries.order_by("-time_created", "-content_type", "-post_id")
+
+
+def _entries_page(rows: list[dict], page_size: int, entry_map: EntryMap) -> FeedPage:
+    """Builds the entries of a page from feed entry rows: rows beyond page_size only tell there is a next page."""
+    entries = [entry_map.entry(x, ENTRY_PREFIX[x["content_type"]]) for x in rows[:page_size]]
+    next_cursor = encode_cursor(entries[-1]) if len(rows) > page_size else None
+    return FeedPage(entries, next_cursor)
+
+
+def _after_cursor(position) -> Q:
+    """Filters feed entries coming after a position in the feed,
+    ie entries with a lower (time_created, content_type, post id) key."""
+    time_created, content_type, pk = position
+    return (
+        Q(time_created__lt=time_created)
+        | Q(time_created=time_created, content_type__lt=content_type)
+        | Q(time_created=time_created, content_type=content_type, post_id__lt=pk)
+    )
+
+
+def _before_cursor(position) -> Q:
+    """Filters feed entries coming before a position in the feed,
+    ie entries with a greater (time_created, content_type, post id) key."""
+    time_created, content_type, pk = position
+    return (
+        Q(time_created__gt=time_created)
+        | Q(time_created=time_created, content_type__gt=content_type)
+        | Q(time_created=time_created, content_type=content_type, post_id__gt=pk)
+    )
+
+
+def _posts(tickets, reviews):
+    """Iterates over tickets and reviews without caching the querysets."""
+    yield from tickets.iterator(chunk_size=BATCH_SIZE)
+    yield from reviews.iterator(chunk_size=BATCH_SIZE)
+
+
+def _feed_entry(owner_id: int, post: Ticket | Review) -> FeedEntry:
+    entry = FeedEntry(owner_id=owner_id, time_created=post.time_created, content_type=post.content_type)
+    if post.content_type == "REVIEW":
+        entry.review_id = post.pk
+    else:
+        entry.ticket_id = post.pk
+    return entry
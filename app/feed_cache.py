@@ -0,0 +1,86 @@
+"""Per-user cache of rendered feed pages.
+
+Cached pages are keyed on a version token stored for each user:
+invalidating a user's feed replaces the token, so all the user's cached pages
+are dropped at once without having to know their keys.
+Invalidation is triggered by the signal receivers in app.signals.
+"""
+
+from typing import Awaitable, Callable, Iterable
+from django.conf import settings
+from django.core.cache import cache
+from .models import Ticket, Review, UserFollows
+from . import metrics
+
+HITS = metrics.counter("feed_cache.hits")
+MISSES = metrics.counter("feed_cache.misses")
+
+
+def get_or_load(user_id: int, cursor: str | None, loader: Callable):
+    """Returns the cached feed page for a user and cursor,
+    or calls loader() and caches its result on a miss."""
+    key = _page_key(user_id, cursor, feed_version(user_id))
+    page = cache.get(key)
+    if page is not None:
+        metrics.incr(HITS)
+        return page
+    metrics.incr(MISSES)
+    page = loader()
+    cache.set(key, page, timeout=settings.FEED_CACHE_TIMEOUT)
+    return page
+
+
+async def aget_or_load(user_id: int, cursor: str | None, loader: Callable[[], Awaitable]):
+    """Same as get_or_load(), with a coroutine function as loader and the async cache API."""
+    key = _page_key(user_id, cursor, await metrics.aversion(_version_key(user_id)))
+    page = await cache.aget(key)
+    if page is not None:
+        await metrics.aincr(HITS)
+        return page
+    await metrics.aincr(MISSES)
+    page = await loader()
+    await cache.aset(key, page, timeout=settings.FEED_CACHE_TIMEOUT)
+    return page
+
+
+def feed_version(user_id: int) -> str:
+    """The current version token of a user's feed."""
+    return metrics.version(_version_key(user_id))
+
+
+def invalidate(user_ids: Iterable[int]):
+    """Drops all cached feed pages of these users."""
+    metrics.new_versions({_version_key(x) for x in user_ids})
+
+
+def post_readers(post: Ticket | Review) -> set[int]:
+    """Users whose feed displays this post, or a review embedding this ticket,
+    or a ticket whose commands depend on this review."""
+    authors = {post.user_id}
+    if post.content_type == "TICKET":
+        authors.update(Review.objects.filter(ticket_id=post.pk).values_list("user_id", flat=True))
+    else:
+        if Review.ticket.is_cached(post):
+            ticket_owner = post.ticket.user_id
+        else:
+            ticket_owner = Ticket.objects.filter(pk=post.ticket_id).values_list("user_id", flat=True).first()
+        if ticket_owner is not None:
+            # the ticket owner sees the review, the ticket's readers see the "review" command change
+            authors.add(ticket_owner)
+    readers = set(
+        UserFollows.objects.filter(followed_user_id__in=authors).values_list("user_id", flat=True)
+    )
+    return readers | authors
+
+
+def stats() -> dict[str, int | float]:
+    """Hit and miss counters of the feed cache."""
+    return metrics.hit_stats(HITS, MISSES)
+
+
+def _page_key(user_id: int, cursor: str | None, version: str) -> str:
+    return f"feed:{user_id}:{version}:{cursor or ''}"
+
+
+def _version_key(user_id: int) -> str:
+    return f"feed_version:{user_id}"
@@ -1,5 +1,6 @@
 from django import forms
 from django.core import validators
+from django.urls import reverse_lazy
 from . import models
 
 
@@ -10,6 +11,14 @@ class SubscribeToUserForm(forms.Form):
     follow_username = forms.CharField(
         required=True,
         validators=[validators.ProhibitNullCharactersValidator, validators.MaxLengthValidator(150)],
+        # usernames are suggested as the user types, see username-suggestions in components.js
+        widget=forms.TextInput(
+            attrs={
+                "list": "follow_username_suggestions",
+                "autocomplete": "off",
+                "data-suggestions-url": reverse_lazy("api_username_suggestions"),
+            }
+        ),
     )
 
     def clean_follow_username(self):
@@ -0,0 +1,44 @@
+"""Cache of the rendered bodies of posts, shared by every page and every feed displaying a post.
+
+Fragments are keyed on the post type, id, last update and the active language:
+editing a post changes its key, outdated fragments simply expire.
+Per-viewer parts of an entry (author line, commands) are rendered live around the fragment,
+see the post_body template tag in app/templatetags/post_fragments.py.
+"""
+
+from typing import Callable
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import translation
+from .models import Ticket, Review
+from .entries import TicketEntry, ReviewEntry
+from . import metrics
+
+HITS = metrics.counter("post_fragments.hits")
+MISSES = metrics.counter("post_fragments.misses")
+
+
+def get_or_render(post: Ticket | Review | TicketEntry | ReviewEntry, render: Callable[[], str]) -> str:
+    """Returns the cached fragment of a post,
+    or calls render() and caches its result on a miss."""
+    if not settings.POST_FRAGMENT_CACHE:
+        return render()
+    key = fragment_key(post)
+    html = cache.get(key)
+    if html is not None:
+        metrics.incr(HITS)
+        return html
+    metrics.incr(MISSES)
+    html = render()
+    cache.set(key, html, timeout=settings.POST_FRAGMENT_TIMEOUT)
+    return html
+
+
+def fragment_key(post: Ticket | Review | TicketEntry | ReviewEntry) -> str:
+    version = int(post.updated_at.timestamp() * 1_000_000)
+    return f"post:{post.content_type}:{post.pk}:{version}:{translation.get_language()}"
+
+
+def stats() -> dict[str, int | float]:
+    """Hit and miss counters of the fragment cache."""
+    return metrics.hit_stats(HITS, MISSES)
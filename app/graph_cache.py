@@ -0,0 +1,87 @@
+"""Per-process cache of the social graph: the ids of the users followed by each user.
+
+Sets are kept in a process-local LRU of at most GRAPH_CACHE_SIZE users. Each set is tagged
+with the version of the user's subscriptions, stored in Django's cache: changing a user's
+subscriptions replaces the version (see app.signals), so that every worker reloads the set
+on its next lookup when a shared cache backend is configured (see CACHES in settings.py).
+With a process-local backend, other workers miss the new version: sets also expire
+GRAPH_CACHE_TIMEOUT seconds after they are loaded, which bounds how long they stay stale.
+
+Sets loaded inside a transaction may hold uncommitted subscriptions: they are not cached.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+from django.conf import settings
+from django.db import connection
+from .models import UserFollows
+from . import metrics
+
+HITS = metrics.counter("graph_cache.hits")
+MISSES = metrics.counter("graph_cache.misses")
+
+# user id: (version, followed ids, expiry time)
+_entries: OrderedDict[int, tuple[str, frozenset[int], float]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def followed_ids(user_id: int) -> frozenset[int]:
+    """The ids of the users followed by a user, loaded from the database if not cached."""
+    version = _version(user_id)
+    ids = _get(user_id, version)
+    if ids is not None:
+        return ids
+    ids = frozenset(UserFollows.objects.filter(user_id=user_id).values_list("followed_user_id", flat=True))
+    if not connection.in_atomic_block:
+        with _lock:
+            _entries[user_id] = (version, ids, time.monotonic() + settings.GRAPH_CACHE_TIMEOUT)
+            _entries.move_to_end(user_id)
+            while len(_entries) > settings.GRAPH_CACHE_SIZE:
+                _entries.popitem(last=False)
+    return ids
+
+
+def peek(user_id: int) -> frozenset[int] | None:
+    """Same as followed_ids(), without querying the database: None if not cached."""
+    return _get(user_id, _version(user_id))
+
+
+def invalidate(user_ids: Iterable[int]):
+    """Drops the cached sets of these users, in all workers."""
+    user_ids = set(user_ids)
+    metrics.new_versions(_version_key(x) for x in user_ids)
+    with _lock:
+        for user_id in user_ids:
+            _entries.pop(user_id, None)
+
+
+def clear():
+    """Drops all sets cached by the current process."""
+    with _lock:
+        _entries.clear()
+
+
+def stats() -> dict[str, int | float]:
+    """Hit and miss counters of the graph cache, and the number of sets cached by the current process."""
+    return metrics.hit_stats(HITS, MISSES) | {"size": len(_entries)}
+
+
+def _get(user_id: int, version: str) -> frozenset[int] | None:
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and entry[0] == version and entry[2] > time.monotonic():
+            _entries.move_to_end(user_id)
+        else:
+            entry = None
+    metrics.incr(MISSES if entry is None else HITS)
+    return None if entry is None else entry[1]
+
+
+def _version(user_id: int) -> str:
+    return metrics.version(_version_key(user_id))
+
+
+def _version_key(user_id: int) -> str:
+    return f"graph_version:{user_id}"
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections
+from django.test import Client, RequestFactory, override_settings
+from django.urls import path, include
+from app.models import User, Ticket, Review, UserFollows
+from app.urls import app_patterns
+from app import views, async_views
+
+PREFIX = "bench_asgi_"
+
+
+def _urlconf(pages):
+    """The project's urlconf, with the feed, posts and subscriptions pages served by pages."""
+
+    class urlconf:
+        urlpatterns = [path("litrevu/", include(app_patterns(pages)))]
+
+    return urlconf
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of the feed, posts and subscriptions pages under WSGI (sync views,"
+        " one thread per user) and under ASGI (async views, one task per user) for concurrent users."
+        " Requests are passed to Django's WSGI and ASGI handlers, without a web server."
+        " The synthetic users and posts are deleted when the benchmark ends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50, help="Number of concurrent users.")
+        parser.add_argument("--requests", type=int, default=20, help="Requests per user.")
+        parser.add_argument("--authors", type=int, default=20, help="Number of authors followed by every user.")
+        parser.add_argument("--posts", type=int, default=5, help="Tickets and reviews posted by each author.")
+
+    def handle(self, *args, **kwargs):
+        # DEBUG logs every query to a file (see LOGGING), which would dominate the timings
+        loggers = {x: x.level for x in (logging.getLogger(), logging.getLogger("django.db.backends"))}
+        for logger in loggers:
+            logger.setLevel(logging.WARNING)
+        cookies = []
+        try:
+            cookies = self._populate(kwargs["users"], kwargs["authors"], kwargs["posts"])
+            urls = ["/litrevu/feed", "/litrevu/posts", "/litrevu/subscriptions"]
+            # the debug toolbar middleware is sync only, it is left out of both runs
+            common = {
+                "MIDDLEWARE": [x for x in settings.MIDDLEWARE if not x.startswith("debug_toolbar.")],
+                "ALLOWED_HOSTS": ["testserver"],
+            }
+            with override_settings(ROOT_URLCONF=_urlconf(views), **common):
+                self._report("wsgi", self._run_wsgi(cookies, urls, kwargs["requests"]))
+            with override_settings(ROOT_URLCONF=_urlconf(async_views), **common):
+                self._report("asgi", asyncio.run(self._run_asgi(cookies, urls, kwargs["requests"])))
+        finally:
+            for logger, level in loggers.items():
+                logger.setLevel(level)
+            Session.objects.filter(session_key__in=[x.split("=", 1)[1] for x in cookies]).delete()
+            User.objects.filter(username__startswith=PREFIX).delete()
+
+    def _populate(self, n_users: int, n_authors: int, n_posts: int) -> list[str]:
+        """Creates the users and their posts, returns the session cookie of each reader."""
+        users = User.objects.bulk_create(
+            [User(username=f"{PREFIX}{i}", password="!") for i in range(n_users + n_authors)]
+        )
+        readers, authors = users[:n_users], users[n_users:]
+        # posts and subscriptions are created one by one, so that the materialized feeds are filled in
+        for author in authors:
+            for i in range(n_posts):
+                ticket = Ticket.objects.create(user=author, title=f"Ticket {i}")
+                Review.objects.create(user=author, ticket=ticket, rating=3, headline=f"Review {i}")
+        for reader in readers:
+            for author in authors:
+                UserFollows.objects.create(user=reader, followed_user=author)
+        cookies = []
+        for reader in readers:
+            client = Client()
+            client.force_login(reader)
+            cookies.append(f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}")
+        return cookies
+
+    def _run_wsgi(self, cookies: list[str], urls: list[str], n_requests: int) -> tuple[float, list[float]]:
+        application = get_wsgi_application()
+
+        def start_response(status: str, headers: list):
+            if not status.startswith("200"):
+                raise RuntimeError("Unexpected response: %s" % status)
+
+        def user_session(cookie: str) -> list[float]:
+            factory = RequestFactory(HTTP_COOKIE=cookie)
+            timings = []
+            try:
+                for i in range(n_requests):
+                    environ = factory.get(urls[i % len(urls)]).environ
+                    start = time.perf_counter()
+                    b"".join(application(environ, start_response))
+                    timings.append(time.perf_counter() - start)
+            finally:
+                close_old_connections()
+            return timings
+
+        cache.clear()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(cookies)) as executor:
+            timings = [x for user_timings in executor.map(user_session, cookies) for x in user_timings]
+        return time.perf_counter() - start, timings
+
+    async def _run_asgi(self, cookies: list[str], urls: list[str], n_requests: int) -> tuple[float, list[float]]:
+        application = get_asgi_application()
+
+        async def request(url: str, cookie: str):
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": url,
+                "raw_path": url.encode(),
+                "query_string": b"",
+                "root_path": "",
+                "headers": [(b"cookie", cookie.encode())],
+                "client": ("127.0.0.1", 0),
+                "server": ("testserver", 80),
+            }
+            received = asyncio.Event()
+
+            async def receive():
+                if received.is_set():
+                    # the client stays connected until the response is sent
+                    await asyncio.Event().wait()
+                received.set()
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message: dict):
+                if message["type"] == "http.response.start" and message["status"] != 200:
+                    raise RuntimeError("Unexpected response: %d" % message["status"])
+
+            await application(scope, receive, send)
+
+        async def user_session(cookie: str) -> list[float]:
+            timings = []
+            for i in range(n_requests):
+                start = time.perf_counter()
+                await request(urls[i % len(urls)], cookie)
+                timings.append(time.perf_counter() - start)
+            return timings
+
+        cache.clear()
+        start = time.perf_counter()
+        results = await asyncio.gather(*(user_session(x) for x in cookies))
+        return time.perf_counter() - start, [x for user_timings in results for x in user_timings]
+
+    def _report(self, name: str, result: tuple[float, list[float]]):
+        elapsed, timings = result
+        timings_ms = sorted(x * 1000 for x in timings)
+        p95 = timings_ms[int(len(timings_ms) * 0.95) - 1]
+        self.stdout.write(
+            "%s %d requests in %.2fs: %.1f req/s, latency median %.1f ms, p95 %.1f ms"
+            % (name, len(timings), elapsed, len(timings) / elapsed, statistics.median(timings_ms), p95)
+        )
@@ -0,0 +1,52 @@
+import timeit
+from urllib import parse as parse_url
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import reverse
+from app.helpers import add_next_url, reverse_id
+
+
+def _legacy_add_next_url(url: str, next_url: str) -> str:
+    """The former add_next_url(), parsing every url. Kept as a reference."""
+    parts = parse_url.urlsplit(url)
+    qs = parse_url.parse_qs(parts.query) or {}
+    qs.update({"next": next_url})
+    return parse_url.urlunsplit([parts.scheme, parts.netloc, parts.path, parse_url.urlencode(qs), parts.fragment])
+
+
+class Command(BaseCommand):
+    help = (
+        "Microbenchmark of the edit and delete links built for each entry of the posts page:"
+        " reverse() and a parsed next query (former links) against cached url templates (reverse_id)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1000, help="Number of posts on the page.")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **kwargs):
+        request = RequestFactory().get("/posts")
+        ids = range(1, kwargs["posts"] + 1)
+
+        def legacy():
+            for pk in ids:
+                _legacy_add_next_url(reverse("edit_ticket", kwargs={"ticket_id": pk}), "posts")
+                _legacy_add_next_url(reverse("delete_ticket", kwargs={"ticket_id": pk}), "posts")
+
+        def cached():
+            for pk in ids:
+                add_next_url(reverse_id("edit_ticket", "ticket_id", pk), request, "posts")
+                add_next_url(reverse_id("delete_ticket", "ticket_id", pk), request, "posts")
+
+        for pk in ids:
+            if _legacy_add_next_url(reverse("edit_ticket", kwargs={"ticket_id": pk}), "posts") != add_next_url(
+                reverse_id("edit_ticket", "ticket_id", pk), request, "posts"
+            ):
+                self.stderr.write(self.style.ERROR("Links differ for post #%d" % pk))
+                return
+        for name, func in (("reverse", legacy), ("template", cached)):
+            best = min(timeit.repeat(func, number=1, repeat=kwargs["repeat"]))
+            self.stdout.write(
+                "%-8s %d links: %.2f ms, %.2f us per link"
+                % (name, 2 * len(ids), best * 1000, best * 1e6 / (2 * len(ids)))
+            )
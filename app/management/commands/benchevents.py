@@ -0,0 +1,60 @@
+import asyncio
+import gc
+import time
+import tracemalloc
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from app import events
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the memory held by idle server-sent events connections (see app.events)"
+        " and the time to push an event to all of them, with the in-process bus."
+        " Connections are event streams opened in a single event loop, without a web server nor database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=5000, help="Number of idle connections.")
+
+    def handle(self, *args, **kwargs):
+        with override_settings(
+            FEED_EVENTS={"BACKEND": "app.events.LocalBus", "OPTIONS": {"queue_size": 20}},
+            FEED_EVENTS_HEARTBEAT=3600,
+        ):
+            events.bus.cache_clear()
+            try:
+                asyncio.run(self._run(kwargs["connections"]))
+            finally:
+                events.bus.cache_clear()
+
+    async def _run(self, n_connections: int):
+        users = [SimpleNamespace(pk=i) for i in range(n_connections)]
+        gc.collect()
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        streams = [events.event_stream(x) for x in users]
+        waiting = []
+        for stream in streams:
+            await anext(stream)
+            # the connection now waits for its next frame
+            waiting.append(asyncio.ensure_future(anext(stream)))
+        await asyncio.sleep(0)
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            "%d idle connections: %.1f KiB, %.2f KiB per connection"
+            % (n_connections, (after - before) / 1024, (after - before) / 1024 / n_connections)
+        )
+
+        start = time.perf_counter()
+        events.bus().publish([x.pk for x in users], b"id: 0\nevent: entry\ndata: {}\n\n")
+        await asyncio.gather(*waiting)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            "pushed 1 event to %d connections in %.1f ms, %.1f µs per connection"
+            % (n_connections, elapsed * 1000, elapsed * 1e6 / n_connections)
+        )
+        for stream in streams:
+            await stream.aclose()
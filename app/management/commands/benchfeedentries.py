@@ -0,0 +1,111 @@
+import gc
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.models import User, Ticket, Review, UserFollows
+from app.posts import merged_page, entries_page, own_or_followed_tickets, own_or_followed_reviews, user_dict
+
+
+def _legacy_entry(post: Ticket | Review) -> dict:
+    """The former entry shape: a nested dict per post, built from model instances. Kept as a reference."""
+    if post.content_type == "REVIEW":
+        return {
+            "content_type": post.content_type,
+            "user": user_dict(post.user),
+            "id": post.pk,
+            "rating": post.rating,
+            "title": post.headline,
+            "headline": post.headline,
+            "body": post.body,
+            "time_created": post.time_created,
+            "ticket": _legacy_ticket(post.ticket),
+        }
+    return _legacy_ticket(post)
+
+
+def _legacy_ticket(ticket: Ticket) -> dict:
+    return {
+        "id": ticket.pk,
+        "content_type": ticket.content_type,
+        "user": user_dict(ticket.user),
+        "title": ticket.title,
+        "description": ticket.description,
+        "image": ticket.image,
+        "time_created": ticket.time_created,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the memory used to load a feed page as model instances and dicts (former pipeline)"
+        " and as post entries built from .values() rows (see app.entries), using tracemalloc."
+        " The synthetic feed is rolled back when the benchmark ends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=5000, help="Number of entries in the feed.")
+        parser.add_argument("--authors", type=int, default=50, help="Number of followed users posting to the feed.")
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            reader = self._populate(kwargs["entries"], kwargs["authors"])
+            tickets = own_or_followed_tickets(reader)
+            reviews = own_or_followed_reviews(reader)
+            page_size = kwargs["entries"]
+            self._measure(
+                "models+dicts",
+                lambda: [_legacy_entry(x) for x in merged_page(tickets, reviews, page_size=page_size).entries],
+            )
+            self._measure("values+slots", lambda: entries_page(tickets, reviews, page_size=page_size).entries)
+            transaction.set_rollback(True)
+
+    def _populate(self, n_entries: int, n_authors: int) -> User:
+        reader = User.objects.create(username="bench_reader", password="!")
+        authors = User.objects.bulk_create([User(username=f"bench_{i}", password="!") for i in range(n_authors)])
+        UserFollows.objects.bulk_create([UserFollows(user=reader, followed_user=x) for x in authors])
+        n_tickets = n_entries // 2
+        tickets = Ticket.objects.bulk_create(
+            [
+                Ticket(user=authors[i % n_authors], title=f"Ticket {i}", description="bench " * 20)
+                for i in range(n_tickets)
+            ],
+            batch_size=1000,
+        )
+        Review.objects.bulk_create(
+            [
+                Review(
+                    user=authors[(i + 1) % n_authors],
+                    ticket=tickets[i % n_tickets],
+                    rating=3,
+                    headline=f"Review {i}",
+                    body="bench " * 40,
+                )
+                for i in range(n_entries - n_tickets)
+            ],
+            batch_size=1000,
+        )
+        return reader
+
+    def _measure(self, variant: str, load):
+        load()  # warm up caches (queries compilation, url resolvers...)
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        entries = load()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = snapshot.statistics("filename")
+        self.stdout.write(
+            "%-12s %d entries: peak %.1f KiB, retained %.1f KiB in %d blocks, %.1f ms"
+            % (
+                variant,
+                len(entries),
+                peak / 1024,
+                sum(x.size for x in stats) / 1024,
+                sum(x.count for x in stats),
+                elapsed * 1000,
+            )
+        )
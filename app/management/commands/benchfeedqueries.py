@@ -0,0 +1,102 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from app.models import User, Ticket, Review, UserFollows
+from app.posts import _own_or_followed_reviews_or, _own_or_followed_reviews_union
+
+
+def _own_or_followed_reviews_join(user: User):
+    """The former query shape, OR-ing predicates across joins, kept as a reference."""
+    own = Q(user_id=user.pk)
+    followed = Q(user__followed_by__user_id=user.pk)
+    to_own_tickets = Q(ticket__user_id=user.pk)
+    return Review.objects.filter(own | followed | to_own_tickets).distinct()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the 'or' and 'union' shapes of the feed reviews query (see FEED_REVIEWS_QUERY),"
+        " and the former join shape, on a synthetic follow graph. The synthetic data is rolled back when the benchmark ends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000, help="Number of synthetic users.")
+        parser.add_argument("--follows", type=int, default=20, help="Users followed by each user.")
+        parser.add_argument("--posts", type=int, default=2, help="Tickets and reviews posted by each user.")
+        parser.add_argument("--samples", type=int, default=200, help="Number of feeds queried.")
+        parser.add_argument("--page-size", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **kwargs):
+        rng = random.Random(kwargs["seed"])
+        with transaction.atomic():
+            users = self._populate(rng, kwargs["users"], kwargs["follows"], kwargs["posts"])
+            sample = rng.sample(users, min(kwargs["samples"], len(users)))
+            variants = {
+                "join": _own_or_followed_reviews_join,
+                "or": _own_or_followed_reviews_or,
+                "union": _own_or_followed_reviews_union,
+            }
+            self._check(sample, variants["or"], variants["join"])
+            self._check(sample, variants["union"], variants["join"])
+            for name, query in variants.items():
+                self._report(name, "page", [self._time_page(query, u, kwargs["page_size"]) for u in sample])
+                self._report(name, "all", [self._time_all(query, u) for u in sample])
+            transaction.set_rollback(True)
+
+    def _populate(self, rng: random.Random, n_users: int, n_follows: int, n_posts: int) -> list[User]:
+        start = time.perf_counter()
+        users = User.objects.bulk_create(
+            [User(username=f"bench_{i}", password="!") for i in range(n_users)], batch_size=1000
+        )
+        ids = [x.pk for x in users]
+        follows = []
+        for user_id in ids:
+            followed = [x for x in rng.sample(ids, min(n_follows + 1, n_users)) if x != user_id]
+            follows.extend(UserFollows(user_id=user_id, followed_user_id=x) for x in followed[:n_follows])
+        UserFollows.objects.bulk_create(follows, batch_size=1000, ignore_conflicts=True)
+        tickets = Ticket.objects.bulk_create(
+            [Ticket(user_id=x, title="bench") for x in ids for _ in range(n_posts)], batch_size=1000
+        )
+        Review.objects.bulk_create(
+            [
+                Review(user_id=x, ticket_id=rng.choice(tickets).pk, rating=3, headline="bench")
+                for x in ids
+                for _ in range(n_posts)
+            ],
+            batch_size=1000,
+        )
+        self.stdout.write(
+            "Created %d users, %d follows, %d tickets and %d reviews in %.1fs"
+            % (n_users, len(follows), len(tickets), n_users * n_posts, time.perf_counter() - start)
+        )
+        return users
+
+    def _check(self, sample: list[User], query, reference):
+        """Both query shapes must find the same reviews."""
+        for user in sample:
+            found = sorted(query(user).values_list("pk", flat=True))
+            expected = sorted(reference(user).values_list("pk", flat=True))
+            if found != expected:
+                self.stderr.write(self.style.ERROR("Results differ for user #%d" % user.pk))
+
+    def _time_page(self, query, user: User, page_size: int) -> float:
+        start = time.perf_counter()
+        list(query(user).select_related("user", "ticket", "ticket__user").order_by("-time_created", "-pk")[:page_size])
+        return time.perf_counter() - start
+
+    def _time_all(self, query, user: User) -> float:
+        start = time.perf_counter()
+        list(query(user).values_list("pk", flat=True))
+        return time.perf_counter() - start
+
+    def _report(self, variant: str, usecase: str, timings: list[float]):
+        timings_ms = sorted(x * 1000 for x in timings)
+        p95 = timings_ms[int(len(timings_ms) * 0.95) - 1] if len(timings_ms) > 1 else timings_ms[0]
+        self.stdout.write(
+            "%-6s %-5s mean %.3f ms, median %.3f ms, p95 %.3f ms"
+            % (variant, usecase, statistics.mean(timings_ms), statistics.median(timings_ms), p95)
+        )
@@ -0,0 +1,68 @@
+import time
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from app.models import User, Ticket, Review, UserFollows
+from app import feed as feed_tools
+from app import fragment_cache, metrics
+from app.streaming import render_entries
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the time spent rendering feed pages with and without the post fragments cache"
+        " (see POST_FRAGMENT_CACHE), for readers following the same authors."
+        " The synthetic data is rolled back when the benchmark ends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=50, help="Number of readers viewing their feed.")
+        parser.add_argument("--authors", type=int, default=10, help="Number of authors followed by every reader.")
+        parser.add_argument("--posts", type=int, default=10, help="Tickets and reviews posted by each author.")
+        parser.add_argument("--repeat", type=int, default=5, help="Rounds rendering all pages, the best one is reported.")
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            readers = self._populate(kwargs["readers"], kwargs["authors"], kwargs["posts"])
+            pages = [(x, feed_tools.prepared_page(x)[0]) for x in readers]
+            timings = {False: [], True: []}
+            for _ in range(kwargs["repeat"]):
+                for enabled in timings:
+                    cache.clear()
+                    metrics.reset()
+                    with override_settings(POST_FRAGMENT_CACHE=enabled):
+                        timings[enabled].append(self._render(pages))
+            # the hit rate of the last round, starting from an empty cache
+            hit_rate = fragment_cache.stats()["hit_rate"]
+            for enabled, elapsed in timings.items():
+                best = min(elapsed)
+                self.stdout.write(
+                    "cache %-3s %d pages: %.1f ms, %.2f ms per page"
+                    % ("on" if enabled else "off", len(pages), best * 1000, best * 1000 / len(pages))
+                )
+            self.stdout.write("hit rate %.2f" % hit_rate)
+            transaction.set_rollback(True)
+
+    def _populate(self, n_readers: int, n_authors: int, n_posts: int) -> list[User]:
+        users = User.objects.bulk_create(
+            [User(username=f"bench_{i}", password="!") for i in range(n_readers + n_authors)]
+        )
+        readers, authors = users[:n_readers], users[n_readers:]
+        for author in authors:
+            for i in range(n_posts):
+                ticket = Ticket.objects.create(user=author, title=f"Ticket {i}", description="bench " * 20)
+                Review.objects.create(user=author, ticket=ticket, rating=3, headline=f"Review {i}", body="bench " * 40)
+        for reader in readers:
+            for author in authors:
+                UserFollows.objects.create(user=reader, followed_user=author)
+        return readers
+
+    def _render(self, pages) -> float:
+        factory = RequestFactory()
+        start = time.perf_counter()
+        for reader, entries in pages:
+            request = factory.get("/feed")
+            request.user = reader
+            "".join(render_entries(request, entries))
+        return time.perf_counter() - start
@@ -0,0 +1,75 @@
+import random
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from app.suggestions import FollowGraph, SUGGESTIONS_PER_USER
+
+
+def _naive_suggest(user_id: int, following: dict[int, set[int]], k: int) -> list[tuple[int, int]]:
+    """Friends of friends counted with dicts of sets, the straightforward way. Kept as a reference."""
+    counts = {}
+    own = following.get(user_id, set())
+    for followed_user_id in own:
+        for candidate in following.get(followed_user_id, ()):
+            if candidate != user_id and candidate not in own:
+                counts[candidate] = counts.get(candidate, 0) + 1
+    return sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:k]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the memory and time used to compute follow suggestions (see app.suggestions)"
+        " on a synthetic follow graph, held in CSR arrays and in dicts of sets."
+        " Popular users are followed more often than others. Nothing is written to the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000, help="Number of users.")
+        parser.add_argument("--edges", type=int, default=2_000_000, help="Number of subscriptions.")
+
+    def handle(self, *args, **kwargs):
+        n_users, n_edges = kwargs["users"], kwargs["edges"]
+        edges = self._edges(n_users, n_edges)
+        self.stdout.write("%d users, %d subscriptions" % (n_users, len(edges)))
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        graph = FollowGraph.from_edges(edges, n_users - 1)
+        elapsed = time.perf_counter() - start
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write("csr graph:  built in %.2fs, %.1f MiB" % (elapsed, size / 2**20))
+
+        tracemalloc.start()
+        following = {}
+        for user_id, followed_user_id in edges:
+            following.setdefault(user_id, set()).add(followed_user_id)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write("sets graph: %.1f MiB" % (size / 2**20))
+
+        start = time.perf_counter()
+        total = sum(1 for x in graph.suggest_all(SUGGESTIONS_PER_USER))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            "csr:   %d suggestions for all users in %.2fs, %.1f µs per user"
+            % (total, elapsed, elapsed * 1e6 / n_users)
+        )
+        start = time.perf_counter()
+        total = sum(len(_naive_suggest(x, following, SUGGESTIONS_PER_USER)) for x in range(n_users))
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            "naive: %d suggestions for all users in %.2fs, %.1f µs per user"
+            % (total, elapsed, elapsed * 1e6 / n_users)
+        )
+
+    def _edges(self, n_users: int, n_edges: int) -> list[tuple[int, int]]:
+        """Random subscriptions sorted by user, squaring a uniform draw skews followed users towards low ids."""
+        rng = random.Random(0)
+        edges = set()
+        while len(edges) < n_edges:
+            user_id = rng.randrange(n_users)
+            followed_user_id = int(n_users * rng.random() ** 2)
+            if user_id != followed_user_id:
+                edges.add((user_id, followed_user_id))
+        return sorted(edges)
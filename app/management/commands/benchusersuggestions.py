@@ -0,0 +1,65 @@
+import random
+import statistics
+import string
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.models import User, UserFollows
+from app.subscriptions import username_suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency of username suggestions (see app.subscriptions.username_suggestions)"
+        " on a synthetic user base, compared to a case-insensitive LIKE query on usernames."
+        " The synthetic users are rolled back when the benchmark ends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000, help="Number of users.")
+        parser.add_argument("--following", type=int, default=200, help="Number of users followed by the reader.")
+        parser.add_argument("--queries", type=int, default=200, help="Number of prefixes to complete.")
+
+    def handle(self, *args, **kwargs):
+        rng = random.Random(0)
+        with transaction.atomic():
+            reader, usernames = self._populate(rng, kwargs["users"], kwargs["following"])
+            # prefixes of 1 to 4 characters taken from actual usernames
+            prefixes = [rng.choice(usernames)[: rng.randint(1, 4)] for i in range(kwargs["queries"])]
+            self._measure("username_key range", prefixes, lambda x: username_suggestions(reader, x))
+            self._measure(
+                "username LIKE",
+                prefixes,
+                lambda x: list(
+                    User.objects.filter(username__istartswith=x)
+                    .exclude(pk=reader.pk)
+                    .exclude(followed_by__user=reader)
+                    .order_by("username")
+                    .values_list("username", flat=True)[:10]
+                ),
+            )
+            transaction.set_rollback(True)
+
+    def _populate(self, rng: random.Random, n_users: int, n_following: int) -> tuple[User, list[str]]:
+        alphabet = string.ascii_letters + string.digits
+        usernames = list({"".join(rng.choices(alphabet, k=rng.randint(5, 12))) for i in range(n_users)})
+        reader = User.objects.create(username="bench_reader", password="!")
+        users = User.objects.bulk_create(
+            (User(username=x, password="!") for x in usernames), batch_size=5000
+        )
+        UserFollows.objects.bulk_create([UserFollows(user=reader, followed_user=x) for x in rng.sample(users, n_following)])
+        self.stdout.write("%d users, the reader follows %d of them" % (len(usernames), n_following))
+        return reader, usernames
+
+    def _measure(self, variant: str, prefixes: list[str], suggest):
+        suggest(prefixes[0])
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            suggest(prefix)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            "%-18s %d queries: median %.2f ms, p95 %.2f ms, max %.2f ms"
+            % (variant, len(timings), statistics.median(timings), timings[int(len(timings) * 0.95) - 1], timings[-1])
+        )
@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand, CommandError
-from app.models import User, Ticket, Review, UserFollows
+from app.models import User, Ticket, Review, UserFollows, FeedEntry
 from django.db import connection
 from django.db.models import Model
 
@@ -10,7 +10,7 @@ class Command(BaseCommand):
     )
 
     def handle(self, *args, **kwargs):
-        model_list: list[Model] = reversed([User, Ticket,  Review, UserFollows])
+        model_list: list[Model] = reversed([User, Ticket,  Review, UserFollows, FeedEntry])
         try:
             connection.cursor()
             with connection.cursor() as cursor:
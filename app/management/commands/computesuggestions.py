@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.suggestions import compute_suggestions, SUGGESTIONS_PER_USER
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the follow suggestions of all users from the follow graph (see app.suggestions)."
+        " Meant to run periodically, for instance from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count", type=int, default=SUGGESTIONS_PER_USER, help="Number of suggestions stored for each user."
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            total = compute_suggestions(kwargs["count"])
+        except Exception as e:
+            raise CommandError("Failed to compute the suggestions: %s" % str(e))
+        self.stdout.write(self.style.SUCCESS("Succesfully stored %d suggestions." % total))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the materialized feeds of all users from existing posts and subscriptions. Use this after a loaddata."
+    )
+
+    def handle(self, *args, **kwargs):
+        try:
+            total = rebuild_feeds()
+        except Exception as e:
+            raise CommandError("Failed to rebuild the feeds: %s" % str(e))
+        self.stdout.write(
+            self.style.SUCCESS("Succesfully rebuilt the feeds: %d entries written." % total)
+        )
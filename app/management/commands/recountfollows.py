@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.subscriptions import recount_follows
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the following and followers counters of all users from the subscriptions found in the database."
+    )
+
+    def handle(self, *args, **kwargs):
+        try:
+            total = recount_follows()
+        except Exception as e:
+            raise CommandError("Failed to recount the subscriptions: %s" % str(e))
+        self.stdout.write(
+            self.style.SUCCESS("Succesfully recounted the subscriptions of %d users." % total)
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.posts import recount_reviews
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the review counter of all tickets from the reviews found in the database."
+    )
+
+    def handle(self, *args, **kwargs):
+        try:
+            total = recount_reviews()
+        except Exception as e:
+            raise CommandError("Failed to recount the reviews: %s" % str(e))
+        self.stdout.write(
+            self.style.SUCCESS("Succesfully recounted the reviews of %d tickets." % total)
+        )
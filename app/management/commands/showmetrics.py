@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from app import metrics
+from app.api import metrics_report
+
+
+class Command(BaseCommand):
+    help = (
+        "Display the app's counters, such as the feed cache and post fragments cache hits and misses. "
+        "Counters are read from Django's cache: this command requires a cache backend shared with the workers, "
+        "the api/metrics endpoint serves the counters of a single worker otherwise."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset all counters after display.")
+
+    def handle(self, *args, **kwargs):
+        if not metrics.shared():
+            raise CommandError(
+                "The cache backend is private to each process, this command cannot read the workers' counters: "
+                "configure a shared backend (see CACHES in settings.py), or request %s as a staff user."
+                % reverse("api_metrics")
+            )
+        for name, value in metrics_report().items():
+            self.stdout.write("%s: %s" % (name, "%.2f" % value if name.endswith("_rate") else value))
+        if kwargs["reset"]:
+            metrics.reset()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
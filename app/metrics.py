@@ -0,0 +1,110 @@
+"""Lightweight counters, stored in Django's cache so they are shared by all workers
+when a shared cache backend is configured (see CACHES in settings.py).
+With a process-local backend, each worker counts its own requests: read them from
+the worker itself, through the staff-only api/metrics endpoint (see app.api).
+
+Counters are declared with counter() when a module is imported,
+snapshot() then reads all declared counters at once.
+
+Version tokens are kept in Django's cache as well: caches key their entries on a token,
+replacing it with new_versions() drops all these entries at once, in all workers
+sharing the cache backend.
+"""
+
+import uuid
+from typing import Iterable
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+KEY_PREFIX = "metrics:"
+
+_counters: list[str] = []
+
+
+def counter(name: str) -> str:
+    """Declares a counter and returns its name."""
+    if name not in _counters:
+        _counters.append(name)
+    return name
+
+
+def incr(name: str, delta: int = 1):
+    """Increments a counter."""
+    key = KEY_PREFIX + name
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # first increment, or evicted: add() is a no-op if another worker created it in between
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+async def aincr(name: str, delta: int = 1):
+    """Same as incr(), with the async cache API."""
+    key = KEY_PREFIX + name
+    try:
+        await cache.aincr(key, delta)
+    except ValueError:
+        if not await cache.aadd(key, delta, timeout=None):
+            await cache.aincr(key, delta)
+
+
+def snapshot() -> dict[str, int]:
+    """Reads the current value of all declared counters."""
+    values = cache.get_many([KEY_PREFIX + x for x in _counters])
+    return {x: values.get(KEY_PREFIX + x, 0) for x in _counters}
+
+
+def values(*names: str) -> list[int]:
+    """Reads the current value of some counters."""
+    found = cache.get_many([KEY_PREFIX + x for x in names])
+    return [found.get(KEY_PREFIX + x, 0) for x in names]
+
+
+def hit_stats(hits: str, misses: str) -> dict[str, int | float]:
+    """Values of a hits and a misses counter, and the hit rate."""
+    hits, misses = values(hits, misses)
+    return {"hits": hits, "misses": misses, "hit_rate": ratio(hits, misses)}
+
+
+def reset():
+    """Resets all declared counters."""
+    cache.delete_many([KEY_PREFIX + x for x in _counters])
+
+
+def version(key: str) -> str:
+    """The version token stored under key, created on first use."""
+    token = cache.get(key)
+    if token is None:
+        token = uuid.uuid4().hex
+        # another worker may have set the token in between
+        if not cache.add(key, token, timeout=None):
+            token = cache.get(key, token)
+    return token
+
+
+async def aversion(key: str) -> str:
+    """Same as version(), with the async cache API."""
+    token = await cache.aget(key)
+    if token is None:
+        token = uuid.uuid4().hex
+        if not await cache.aadd(key, token, timeout=None):
+            token = await cache.aget(key, token)
+    return token
+
+
+def new_versions(keys: Iterable[str]):
+    """Replaces the version tokens stored under keys."""
+    cache.set_many({x: uuid.uuid4().hex for x in keys}, timeout=None)
+
+
+def shared() -> bool:
+    """Tells if counters are shared between processes: False with a process-local cache backend."""
+    return not isinstance(caches["default"], (LocMemCache, DummyCache))
+
+
+def ratio(hits: int, misses: int) -> float:
+    """Hit rate, between 0 and 1."""
+    total = hits + misses
+    return hits / total if total else 0.0
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:14
+
+import app.models
+import django.db.models.deletion
+from django.conf import settings
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def fill_feeds(apps, schema_editor):
+    """Writes the feed entries of existing posts, as app.feed.rebuild_feeds() does."""
+    FeedEntry = apps.get_model("app", "FeedEntry")
+    Ticket = apps.get_model("app", "Ticket")
+    Review = apps.get_model("app", "Review")
+    UserFollows = apps.get_model("app", "UserFollows")
+    followers = defaultdict(set)
+    for user_id, followed_user_id in UserFollows.objects.values_list("user_id", "followed_user_id"):
+        followers[followed_user_id].add(user_id)
+
+    def entries():
+        for pk, user_id, time_created in Ticket.objects.values_list("pk", "user_id", "time_created").iterator():
+            for owner_id in followers[user_id] | {user_id}:
+                yield FeedEntry(owner_id=owner_id, time_created=time_created, content_type="TICKET", ticket_id=pk)
+        reviews = Review.objects.values_list("pk", "user_id", "time_created", "ticket__user_id")
+        for pk, user_id, time_created, ticket_user_id in reviews.iterator():
+            for owner_id in followers[user_id] | {user_id, ticket_user_id}:
+                yield FeedEntry(owner_id=owner_id, time_created=time_created, content_type="REVIEW", review_id=pk)
+
+    FeedEntry.objects.bulk_create(entries(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_alter_user_managers_remove_user_display_name'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', app.models.CustomUserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time_created', models.DateTimeField()),
+                ('content_type', models.CharField(max_length=6)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+                ('review', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.review')),
+                ('ticket', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.ticket')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-time_created'], name='feedentry_owner_time_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'ticket'), name='feedentry_unique_ticket'), models.UniqueConstraint(fields=('owner', 'review'), name='feedentry_unique_review')],
+            },
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
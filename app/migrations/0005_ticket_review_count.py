@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_reviews(apps, schema_editor):
+    Ticket = apps.get_model("app", "Ticket")
+    Review = apps.get_model("app", "Review")
+    total = (
+        Review.objects.filter(ticket_id=OuterRef("pk"))
+        .values("ticket_id")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Ticket.objects.update(review_count=Coalesce(Subquery(total), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_feed_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_reviews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:31
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def init_updated_at(apps, schema_editor):
+    for model_name in ("Ticket", "Review"):
+        apps.get_model("app", model_name).objects.update(updated_at=F("time_created"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_ticket_review_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(init_updated_at, migrations.RunPython.noop),
+    ]
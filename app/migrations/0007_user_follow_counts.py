@@ -0,0 +1,52 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_follows(apps, schema_editor):
+    User = apps.get_model("app", "User")
+    UserFollows = apps.get_model("app", "UserFollows")
+
+    def total(field):
+        return Coalesce(
+            Subquery(
+                UserFollows.objects.filter(**{field: OuterRef("pk")})
+                .values(field)
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            0,
+        )
+
+    User.objects.update(following_count=total("user_id"), followers_count=total("followed_user_id"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='userfollows',
+            index=models.Index(fields=['user', '-id'], name='userfollows_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userfollows',
+            index=models.Index(fields=['followed_user', '-id'], name='userfollows_followed_id_idx'),
+        ),
+        migrations.RunPython(count_follows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-16 22:56
+
+from django.db import migrations, models
+
+
+def set_username_keys(apps, schema_editor):
+    User = apps.get_model("app", "User")
+    users = []
+    for user in User.objects.only("pk", "username").iterator(chunk_size=1000):
+        # same as User.save(): Python's lower() folds all cases, SQLite's LOWER() only ASCII
+        user.username_key = user.username.lower()
+        users.append(user)
+        if len(users) == 1000:
+            User.objects.bulk_update(users, ["username_key"])
+            users = []
+    User.objects.bulk_update(users, ["username_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_user_follow_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='username_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=150),
+        ),
+        migrations.RunPython(set_username_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-16 23:23
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def set_missing_username_keys(apps, schema_editor):
+    """Users inserted without User.save(), by bulk_create() for instance, may have no username key."""
+    User = apps.get_model("app", "User")
+    users = list(User.objects.filter(username_key="").only("pk", "username"))
+    for user in users:
+        user.username_key = user.username.lower()
+    User.objects.bulk_update(users, ["username_key"], batch_size=1000)
+    duplicates = list(
+        User.objects.values("username_key").annotate(total=Count("pk")).filter(total__gt=1).values_list("username_key", flat=True)
+    )
+    if duplicates:
+        raise ValueError("Usernames differing only by case must be renamed first: %s" % ", ".join(duplicates))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_followsuggestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_missing_username_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='username_key',
+            field=models.CharField(default='', editable=False, max_length=150, unique=True),
+        ),
+    ]
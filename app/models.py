@@ -3,13 +3,21 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import AbstractUser, UserManager
-from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
+from .helpers import reverse_id
 
 
 class CustomUserManager(UserManager):
     def get_by_natural_key(self, username: str) -> Any:
-        return self.get(username__iexact=username)
+        # username_key is indexed: username__iexact is a LIKE, which scans the user table
+        return self.get(username_key=username.lower())
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Sets the username_key of each user, like User.save()."""
+        objs = list(objs)
+        for user in objs:
+            user.username_key = user.username.lower()
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class User(AbstractUser):
@@ -19,12 +27,27 @@ class User(AbstractUser):
     Custom behaviour: username is case-insensitive
     """
     objects = CustomUserManager()
+    # lowercased username, set on save: case-insensitive lookups and prefix searches by index range,
+    # its unique index keeps usernames unique ignoring case
+    username_key = models.CharField(max_length=150, unique=True, editable=False, default="")
+    # number of users followed and following, updated when a subscription is created or deleted
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.username_key = self.username.lower()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "username" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "username_key"}
+        super().save(*args, **kwargs)
 
 
 class Ticket(models.Model):
     """A user posts a ticket to request a review on an article or a book."""
     user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     time_created = models.DateTimeField(auto_now_add=True)
+    # last edit, versions the cached rendering of the post (see app/fragment_cache.py)
+    updated_at = models.DateTimeField(auto_now=True)
     title = models.CharField(verbose_name=_("title"), max_length=128)
     description = models.TextField(
         verbose_name=_("description"), max_length=2048, blank=True
@@ -35,14 +58,25 @@ class Ticket(models.Model):
         blank=True,
         upload_to="uploads/tickets/%Y/%m/%d/",
     )
+    # number of reviews posted for this ticket, updated when a review is created or deleted
+    review_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = _("ticket")
         verbose_name_plural = _("tickets")
-
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-        self._total_reviews: int = 0
+        indexes = [
+            # a user's tickets, most recent first: feeds and posts page
+            models.Index(fields=["user", "-time_created"], name="ticket_user_time_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # review_count is only changed by app.posts.add_review_count(): saving an instance
+        # loaded before a review was posted must not write back its stale count
+        if not self._state.adding and not kwargs.get("force_insert") and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                x.name for x in self._meta.concrete_fields if not x.primary_key and x.name != "review_count"
+            ]
+        super().save(*args, **kwargs)
 
     @property
     def content_type(self) -> str:
@@ -50,30 +84,24 @@ class Ticket(models.Model):
 
     @property
     def edit_url(self) -> str:
-        return reverse("edit_ticket", kwargs={"ticket_id": self.pk})
+        return reverse_id("edit_ticket", "ticket_id", self.pk)
 
     @property
     def delete_url(self) -> str:
-        return reverse("delete_ticket", kwargs={"ticket_id": self.pk})
+        return reverse_id("delete_ticket", "ticket_id", self.pk)
 
     @property
     def total_reviews(self):
         """The number of reviews posted for this ticket."""
-        return self._total_reviews
-
-    @total_reviews.setter
-    def total_reviews(self, value: int):
-        """Sets the total number of reviews posted for this ticket.
-        Most likely set by an annotation."""
-        self._total_reviews = value
+        return self.review_count
 
     @property
     def can_review(self) -> bool:
-        return self.total_reviews == 0
+        return self.review_count == 0
 
     @property
     def review_url(self) -> str:
-        return reverse("review_for_ticket", kwargs={"ticket_id": self.pk})
+        return reverse_id("review_for_ticket", "ticket_id", self.pk)
 
     def __str__(self):
         return self.title
@@ -85,6 +113,8 @@ class Review(models.Model):
     """
     user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     time_created = models.DateTimeField(auto_now_add=True)
+    # last edit, versions the cached rendering of the post (see app/fragment_cache.py)
+    updated_at = models.DateTimeField(auto_now=True)
     ticket = models.ForeignKey(to=Ticket, on_delete=models.CASCADE)
     rating = models.PositiveSmallIntegerField(
         verbose_name=_("rating"),
@@ -97,6 +127,12 @@ class Review(models.Model):
     class Meta:
         verbose_name = _("review")
         verbose_name_plural = _("reviews")
+        indexes = [
+            # a user's reviews, most recent first: feeds and posts page
+            models.Index(fields=["user", "-time_created"], name="review_user_time_idx"),
+            # reviews of a ticket and their authors: feed visibility and review counts
+            models.Index(fields=["ticket", "user"], name="review_ticket_user_idx"),
+        ]
 
     @property
     def content_type(self) -> str:
@@ -104,11 +140,11 @@ class Review(models.Model):
 
     @property
     def edit_url(self) -> str:
-        return reverse("edit_review", kwargs={"review_id": self.pk})
+        return reverse_id("edit_review", "review_id", self.pk)
 
     @property
     def delete_url(self) -> str:
-        return reverse("delete_review", kwargs={"review_id": self.pk})
+        return reverse_id("delete_review", "review_id", self.pk)
 
     def __str__(self) -> str:
         return self.headline
@@ -130,3 +166,68 @@ class UserFollows(models.Model):
         # ensures we don't get multiple UserFollows instances
         # for unique user-user_followed pairs
         unique_together = ("user", "followed_user")
+        indexes = [
+            # the unique constraint above covers "who do I follow",
+            # this one covers "who follows X"
+            models.Index(fields=["followed_user", "user"], name="userfollows_followed_idx"),
+            # pages of subscriptions and followers, most recent first
+            models.Index(fields=["user", "-id"], name="userfollows_user_id_idx"),
+            models.Index(fields=["followed_user", "-id"], name="userfollows_followed_id_idx"),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Materialized feed: a post displayed in the owner's feed.
+    Entries are written when a post is created, see app.feed.
+    Exactly one of ticket or review is set, depending on content_type.
+    """
+
+    owner = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+    # copied from the post, so a feed page is a range scan on (owner, time_created)
+    time_created = models.DateTimeField()
+    content_type = models.CharField(max_length=6)
+    ticket = models.ForeignKey(
+        to=Ticket, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+    review = models.ForeignKey(
+        to=Review, on_delete=models.CASCADE, null=True, blank=True, related_name="+"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "-time_created"], name="feedentry_owner_time_idx"),
+        ]
+        # a post appears at most once in a feed
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "ticket"], name="feedentry_unique_ticket"),
+            models.UniqueConstraint(fields=["owner", "review"], name="feedentry_unique_review"),
+        ]
+
+    @property
+    def post(self) -> Ticket | Review:
+        return self.review if self.content_type == "REVIEW" else self.ticket
+
+
+class FollowSuggestion(models.Model):
+    """A user suggested to another user, ranked by the number of mutual follows.
+    Suggestions are computed in batch, see app.suggestions."""
+
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="follow_suggestions"
+    )
+    suggested_user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    # number of users followed by user who follow suggested_user
+    mutual_count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            # a user's best suggestions first: subscriptions page
+            models.Index(fields=["user", "-mutual_count"], name="suggestion_user_mutual_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "suggested_user"], name="suggestion_unique_user"),
+        ]
@@ -1,51 +1,439 @@
 """Helpers to display posts entries in feeds
 """
 
-from .models import Ticket, Review, User
-from django.db.models import QuerySet, Q, Count
+import asyncio
+import base64
+import heapq
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, NamedTuple
+from django.conf import settings
+from .models import Ticket, Review, User, UserFollows
+from . import graph_cache
+from .entries import EntryMap, UserEntry, TicketEntry, ReviewEntry, TICKET_FIELDS, REVIEW_FIELDS, row_key
+from django.db.models import QuerySet, Q, Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 
+# number of entries displayed on a single feed page
+FEED_PAGE_SIZE = 20
+# feed queries inline the cached ids of followed users up to this number, and use a subquery above
+INLINE_FOLLOWED_IDS = 500
 
-def own_or_followed_reviews(user: User) -> QuerySet[Review]:
+
+def own_or_followed_reviews(user: User, posted_since: datetime = None) -> QuerySet[Review]:
     """Finds reviews to display in a user's feed:
     owned by user, followed by user, or posted in reply to a ticket owned by user.
+
+    The query shape is selected by the FEED_REVIEWS_QUERY setting:
+    - "or": a single query OR-ing the three predicates,
+    - "union": the ids found by three separately indexed subqueries, merged by a UNION.
+    Both return the same rows, without duplicates.
+
+    - posted_since: only finds reviews posted at or after this time. The "union" shape is then
+        always used, as it bounds each subquery with an index range.
+    """
+    if posted_since is not None or settings.FEED_REVIEWS_QUERY == "union":
+        reviews = _own_or_followed_reviews_union(user, posted_since)
+    else:
+        reviews = _own_or_followed_reviews_or(user)
+    return (
+        reviews.select_related("user")
+        .select_related("ticket")
+        .select_related("ticket__user")
+    )
+
+
+def _own_or_followed_reviews_or(user: User) -> QuerySet[Review]:
+    """Each predicate is an indexed lookup on the review table,
+    so SQLite runs the query as a multi-index OR."""
+    own = Q(user_id=user.pk)
+    followed = Q(user_id__in=_followed_user_ids(user))
+    to_own_tickets = Q(ticket_id__in=_own_ticket_ids(user))
+    return Review.objects.filter(own | followed | to_own_tickets)
+
+
+def _own_or_followed_reviews_union(user: User, posted_since: datetime = None) -> QuerySet[Review]:
+    """Selects reviews by id from the UNION of three indexed subqueries."""
+    reviews = Review.objects.all()
+    if posted_since is not None:
+        reviews = reviews.filter(time_created__gte=posted_since)
+    own = reviews.filter(user_id=user.pk).values("pk")
+    followed = reviews.filter(user_id__in=_followed_user_ids(user)).values("pk")
+    to_own_tickets = reviews.filter(ticket_id__in=_own_ticket_ids(user)).values("pk")
+    return Review.objects.filter(pk__in=own.union(followed, to_own_tickets))
+
+
+def own_or_followed_tickets(user: User, posted_since: datetime = None) -> QuerySet[Ticket]:
+    """Find tickets own ofr followed by user.
+
+    - posted_since: only finds tickets posted at or after this time.
     """
+    followed = Q(user_id__in=_followed_user_ids(user))
     own = Q(user_id=user.pk)
-    followed = Q(user__followed_by__user_id=user.pk)
-    to_own_tickets = Q(ticket__user_id=user.pk)
+    tickets = Ticket.objects.select_related("user").filter(followed | own)
+    if posted_since is not None:
+        tickets = tickets.filter(time_created__gte=posted_since)
+    return tickets
+
+
+def own_tickets(user: User) -> QuerySet[Ticket]:
+    """Tickets posted by user."""
+    return Ticket.objects.select_related("user").filter(user_id=user.pk)
+
+
+def own_reviews(user: User) -> QuerySet[Review]:
+    """Reviews posted by user."""
     return (
         Review.objects.select_related("user")
         .select_related("ticket")
         .select_related("ticket__user")
-        .filter(own | followed | to_own_tickets)
-        .distinct()
+        .filter(user_id=user.pk)
     )
 
 
-def own_or_followed_tickets(user: User) -> QuerySet[Ticket]:
-    """Find tickets own ofr followed by user."""
-    followed = Q(user__followed_by__user_id=user.pk)
-    own = Q(user_id=user.pk)
-    return Ticket.objects.select_related("user").filter(followed | own).annotate(total_reviews=Count("review"))
+def add_review_count(ticket_id: int, delta: int):
+    """Atomically adds delta to the review counter of a ticket.
+    The counter never goes below zero."""
+    Ticket.objects.filter(pk=ticket_id, review_count__gte=-delta).update(
+        review_count=F("review_count") + delta
+    )
+
+
+def recount_reviews(tickets: QuerySet[Ticket] = None) -> int:
+    """Recomputes the review counter of tickets from the reviews table, in a single statement.
+    Recomputes all tickets by default.
+
+    Returns the number of tickets updated."""
+    tickets = Ticket.objects.all() if tickets is None else tickets
+    total = (
+        Review.objects.filter(ticket_id=OuterRef("pk"))
+        .values("ticket_id")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return tickets.update(review_count=Coalesce(Subquery(total), 0))
+
+
+def _followed_user_ids(user: User) -> list[int] | QuerySet[UserFollows]:
+    """The ids of users followed by user, from the graph cache (see app.graph_cache),
+    or a subquery selecting them when they are too many or in an async context."""
+    if _in_event_loop():
+        # reading the set's version from a shared cache backend would block the event loop
+        return UserFollows.objects.filter(user_id=user.pk).values("followed_user_id")
+    followed = graph_cache.followed_ids(user.pk)
+    if len(followed) > INLINE_FOLLOWED_IDS:
+        return UserFollows.objects.filter(user_id=user.pk).values("followed_user_id")
+    return sorted(followed)
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _own_ticket_ids(user: User) -> QuerySet[Ticket]:
+    """Subquery selecting the ids of tickets posted by user."""
+    return Ticket.objects.filter(user_id=user.pk).values("pk")
+
+
+class FeedPage(NamedTuple):
+    """A single page of a feed: entries are sorted by most recent first.
+    next_cursor is None on the last page."""
+    entries: list[Ticket | Review | TicketEntry | ReviewEntry]
+    next_cursor: str | None
+
+
+def feed_page(user: User, cursor: str = None, page_size: int = FEED_PAGE_SIZE) -> FeedPage:
+    """Loads a single page of a user's feed.
+
+    Tickets and reviews are merged in the order of the key (time_created, content_type, id),
+    most recent first. Each post type is queried with an ordered and limited query starting
+    after the cursor, so a page never loads more than page_size + 1 rows of each type.
+
+    - cursor: the next_cursor of the previous page, or None to load the first page.
+    - Raises ValueError if the cursor is invalid.
+    """
+    return merged_page(own_or_followed_tickets(user), own_or_followed_reviews(user), cursor, page_size)
+
+
+def feed_since(user: User, since: str, page_size: int = FEED_PAGE_SIZE) -> FeedPage:
+    """Loads the entries of a user's feed newer than the since cursor, as post entries,
+    see entries_since(). Posts are found by index range scans starting at the cursor's time.
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    time_created, _, _ = decode_cursor(since)
+    return entries_since(
+        own_or_followed_tickets(user, posted_since=time_created),
+        own_or_followed_reviews(user, posted_since=time_created),
+        since,
+        page_size=page_size,
+    )
+
+
+def merged_page(
+    tickets: QuerySet[Ticket],
+    reviews: QuerySet[Review],
+    cursor: str = None,
+    page_size: int = FEED_PAGE_SIZE,
+    key: Callable = None,
+) -> FeedPage:
+    """Loads a single page of tickets and reviews merged in feed order, starting after the cursor.
+    Querysets may select model instances or .values() rows, ordered by key.
+
+    - key: the key ordering entries in a feed, feed_sort_key() by default.
+    - Raises ValueError if the cursor is invalid.
+    """
+    tickets, reviews = _page_queries(tickets, reviews, cursor, page_size)
+    return _merge_page(tickets, reviews, page_size, key or feed_sort_key)
+
+
+async def amerged_page(
+    tickets: QuerySet[Ticket],
+    reviews: QuerySet[Review],
+    cursor: str = None,
+    page_size: int = FEED_PAGE_SIZE,
+    key: Callable = None,
+) -> FeedPage:
+    """Same as merged_page(), with the async ORM: tickets and reviews are queried concurrently."""
+    tickets, reviews = _page_queries(tickets, reviews, cursor, page_size)
+    tickets, reviews = await asyncio.gather(alist(tickets), alist(reviews))
+    return _merge_page(tickets, reviews, page_size, key or feed_sort_key)
 
 
-def prepare_post_entry(entry: Review | Ticket, with_commands: list = None) -> dict:
-    """Serialize a Review or Ticket as a dictionnary. Related objects are serialized as well.
+def _page_queries(
+    tickets: QuerySet[Ticket], reviews: QuerySet[Review], cursor: str | None, page_size: int
+) -> tuple[QuerySet[Ticket], QuerySet[Review]]:
+    """Ordered and limited queries of the tickets and reviews of a page, starting after the cursor."""
+    if cursor:
+        position = decode_cursor(cursor)
+        tickets = tickets.filter(_after_cursor("TICKET", position))
+        reviews = reviews.filter(_after_cursor("REVIEW", position))
+    ordering = ["-time_created", "-pk"]
+    return tickets.order_by(*ordering)[: page_size + 1], reviews.order_by(*ordering)[: page_size + 1]
+
+
+def _merge_page(tickets: Iterable, reviews: Iterable, page_size: int, key: Callable) -> FeedPage:
+    """Merges the tickets and reviews of a page, both ordered by key, most recent first."""
+    merged = heapq.merge(tickets, reviews, key=key, reverse=True)
+    entries = []
+    for entry in merged:
+        if len(entries) == page_size:
+            return FeedPage(entries, encode_position(key(entries[-1])))
+        entries.append(entry)
+    return FeedPage(entries, None)
+
+
+async def alist(queryset: QuerySet) -> list:
+    """Loads all results of a query with the async ORM:
+    results are fetched at once rather than chunk by chunk as with aiterator()."""
+    return [x async for x in queryset]
+
+
+def entries_page(
+    tickets: QuerySet[Ticket],
+    reviews: QuerySet[Review],
+    cursor: str = None,
+    page_size: int = FEED_PAGE_SIZE,
+    entry_map: EntryMap = None,
+) -> FeedPage:
+    """Loads a single page of tickets and reviews as post entries (see app.entries),
+    built from .values() rows.
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    entry_map = entry_map or EntryMap()
+    page = merged_page(ticket_values(tickets), review_values(reviews), cursor, page_size, key=row_key)
+    return FeedPage([entry_map.entry(x) for x in page.entries], page.next_cursor)
+
+
+async def aentries_page(
+    tickets: QuerySet[Ticket],
+    reviews: QuerySet[Review],
+    cursor: str = None,
+    page_size: int = FEED_PAGE_SIZE,
+    entry_map: EntryMap = None,
+) -> FeedPage:
+    """Same as entries_page(), with the async ORM: tickets and reviews are queried concurrently."""
+    entry_map = entry_map or EntryMap()
+    page = await amerged_page(ticket_values(tickets), review_values(reviews), cursor, page_size, key=row_key)
+    return FeedPage([entry_map.entry(x) for x in page.entries], page.next_cursor)
+
+
+def iter_entries(
+    tickets: QuerySet[Ticket], reviews: QuerySet[Review], chunk_size: int = 100
+) -> Iterable[TicketEntry | ReviewEntry]:
+    """Iterates lazily over tickets and reviews as post entries, in feed order.
+    Rows are loaded chunk_size at a time."""
+    entry_map = EntryMap(share_tickets=False)
+    ordering = ["-time_created", "-pk"]
+    rows = heapq.merge(
+        ticket_values(tickets).order_by(*ordering).iterator(chunk_size=chunk_size),
+        review_values(reviews).order_by(*ordering).iterator(chunk_size=chunk_size),
+        key=row_key,
+        reverse=True,
+    )
+    return (entry_map.entry(x) for x in rows)
+
+
+async def aiter_entries(
+    tickets: QuerySet[Ticket], reviews: QuerySet[Review], chunk_size: int = 100
+) -> AsyncIterator[TicketEntry | ReviewEntry]:
+    """Same as iter_entries(), with the async ORM."""
+    entry_map = EntryMap(share_tickets=False)
+    ordering = ["-time_created", "-pk"]
+    rows = amerge(
+        ticket_values(tickets).order_by(*ordering).aiterator(chunk_size=chunk_size),
+        review_values(reviews).order_by(*ordering).aiterator(chunk_size=chunk_size),
+        key=row_key,
+    )
+    async for row in rows:
+        yield entry_map.entry(row)
+
+
+async def amerge(first: AsyncIterator, second: AsyncIterator, key: Callable) -> AsyncIterator:
+    """Merges two async iterators ordered by key, greatest first, like heapq.merge(reverse=True).
+    Items must not be None."""
+    iterators = [first, second]
+    heads = [await anext(x, None) for x in iterators]
+    while heads[0] is not None or heads[1] is not None:
+        i = 0 if heads[1] is None or (heads[0] is not None and key(heads[0]) >= key(heads[1])) else 1
+        yield heads[i]
+        heads[i] = await anext(iterators[i], None)
+
+
+def entries_since(
+    tickets: QuerySet[Ticket],
+    reviews: QuerySet[Review],
+    since: str,
+    page_size: int = FEED_PAGE_SIZE,
+    entry_map: EntryMap = None,
+) -> FeedPage:
+    """Loads the tickets and reviews newer than the since cursor as post entries, most recent first.
+
+    At most page_size entries are loaded, the newest ones: when there are more,
+    next_cursor points to the next page of the feed, as usual.
+
+    - since: the cursor of the most recent entry already seen (see encode_cursor()).
+    - Raises ValueError if the cursor is invalid.
+    """
+    position = decode_cursor(since)
+    return entries_page(
+        tickets.filter(_before_cursor("TICKET", position)),
+        reviews.filter(_before_cursor("REVIEW", position)),
+        page_size=page_size,
+        entry_map=entry_map,
+    )
+
+
+async def aentries(tickets: QuerySet[Ticket], reviews: QuerySet[Review]) -> list[TicketEntry | ReviewEntry]:
+    """Loads all tickets and reviews as post entries in feed order, with the async ORM:
+    tickets and reviews are queried concurrently."""
+    entry_map = EntryMap()
+    ordering = ["-time_created", "-pk"]
+    tickets, reviews = await asyncio.gather(
+        alist(ticket_values(tickets).order_by(*ordering)),
+        alist(review_values(reviews).order_by(*ordering)),
+    )
+    return [entry_map.entry(x) for x in heapq.merge(tickets, reviews, key=row_key, reverse=True)]
+
+
+def ticket_values(tickets: QuerySet[Ticket]) -> QuerySet:
+    """Selects the fields of ticket entries as .values() rows."""
+    return tickets.annotate(content_type=Value("TICKET")).values("content_type", *TICKET_FIELDS)
+
+
+def review_values(reviews: QuerySet[Review]) -> QuerySet:
+    """Selects the fields of review entries as .values() rows."""
+    return reviews.annotate(content_type=Value("REVIEW")).values("content_type", *REVIEW_FIELDS)
+
+
+def feed_sort_key(entry: Ticket | Review | TicketEntry | ReviewEntry) -> tuple[datetime, str, int]:
+    """The key ordering entries in a feed."""
+    return (entry.time_created, entry.content_type, entry.pk)
+
+
+def encode_cursor(entry: Ticket | Review | TicketEntry | ReviewEntry) -> str:
+    """Encodes the position of an entry in a feed as an opaque, url-safe string."""
+    return encode_position(feed_sort_key(entry))
+
+
+def encode_position(position: tuple[datetime, str, int]) -> str:
+    """Encodes a (time_created, content_type, id) position in a feed as an opaque, url-safe string."""
+    time_created, content_type, pk = position
+    raw = f"{time_created.isoformat()}|{content_type}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str, int]:
+    """Decodes a cursor returned by encode_cursor().
+    Raises ValueError if the cursor is invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        time_created, content_type, pk = raw.split("|")
+        position = (datetime.fromisoformat(time_created), content_type, int(pk))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid feed cursor") from e
+    if content_type not in ("TICKET", "REVIEW"):
+        raise ValueError("Invalid feed cursor")
+    return position
+
+
+def _after_cursor(content_type: str, position: tuple[datetime, str, int]) -> Q:
+    """Filters entries of a given type coming after a position in the feed,
+    ie entries with a lower (time_created, content_type, id) key."""
+    time_created, cursor_type, pk = position
+    after = Q(time_created__lt=time_created)
+    if content_type < cursor_type:
+        after |= Q(time_created=time_created)
+    elif content_type == cursor_type:
+        after |= Q(time_created=time_created, pk__lt=pk)
+    return after
+
+
+def _before_cursor(content_type: str, position: tuple[datetime, str, int]) -> Q:
+    """Filters entries of a given type coming before a position in the feed,
+    ie entries with a greater (time_created, content_type, id) key."""
+    time_created, cursor_type, pk = position
+    before = Q(time_created__gt=time_created)
+    if content_type > cursor_type:
+        before |= Q(time_created=time_created)
+    elif content_type == cursor_type:
+        before |= Q(time_created=time_created, pk__gt=pk)
+    return before
+
+
+def prepare_post_entry(
+    entry: Review | Ticket | ReviewEntry | TicketEntry, with_commands: list = None, entry_map: EntryMap = None
+) -> ReviewEntry | TicketEntry | None:
+    """Prepares a post entry for display (see app.entries).
+    Model instances are converted to entries, related objects are converted as well.
 
     Optionnaly set commands allowed for this entry.
     """
-    entry_dict = {}
-    if entry.content_type == "TICKET":
-        entry_dict = ticket_dict(entry)
-    elif entry.content_type == "REVIEW":
-        entry_dict = review_dict(entry)
-    else:
-        return {}
+    if entry.content_type not in ("TICKET", "REVIEW"):
+        return None
+    if isinstance(entry, (Ticket, Review)):
+        entry = (entry_map or EntryMap()).from_instance(entry)
     if with_commands:
-        entry_dict["commands"] = []
+        entry.commands = []
         for cmd in with_commands:
             args = {"cmd_name": cmd} if isinstance(cmd, str) else cmd
-            entry_dict["commands"].append(make_command(entry, **args))
-    return entry_dict
+            entry.commands.append(make_command(entry, **args))
+    return entry
+
+
+def entry_dict(entry: ReviewEntry | TicketEntry) -> dict:
+    """Serialize a post entry as a dictionnary, with its commands if any."""
+    if entry.content_type == "TICKET":
+        data = ticket_dict(entry)
+    else:
+        data = review_dict(entry)
+    if entry.commands:
+        data["commands"] = entry.commands
+    return data
 
 
 def make_command(entry, cmd_name: str, **kwargs):
@@ -72,14 +460,14 @@ def make_command(entry, cmd_name: str, **kwargs):
     return {"cmd_name": cmd_name} | cmd_defaults | kwargs
 
 
-def user_dict(obj: User) -> dict:
+def user_dict(obj: User | UserEntry) -> dict:
     return {
         "id": obj.pk,
         "username": obj.username,
     }
 
 
-def ticket_dict(obj: Ticket) -> dict:
+def ticket_dict(obj: Ticket | TicketEntry) -> dict:
     return {
         "id": obj.pk,
         "content_type": obj.content_type,
@@ -91,7 +479,7 @@ def ticket_dict(obj: Ticket) -> dict:
     }
 
 
-def review_dict(obj: Review) -> dict:
+def review_dict(obj: Review | ReviewEntry) -> dict:
     return {
         "content_type": obj.content_type,
         "user": user_dict(obj.user),
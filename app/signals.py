@@ -0,0 +1,86 @@
+"""Keeps data derived from posts and subscriptions up to date.
+Receivers are connected when the app is ready, see app.apps.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import User, Ticket, Review, UserFollows
+from . import events, feed, feed_cache, graph_cache
+from . import posts as post_tools
+from . import subscriptions as subscription_tools
+from my_auth.backends import invalidate_users
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_save, sender=Review)
+def post_created(sender, instance: Ticket | Review, created: bool, raw: bool, **kwargs):
+    """Writes a new post to the feeds of its readers, and pushes it to the connected ones when committed.
+    Fixtures are skipped: feeds are rebuilt once they are loaded (see the rebuildfeed command)."""
+    if created and not raw:
+        readers = feed.fan_out(instance)
+        transaction.on_commit(lambda: events.publish_post(instance, readers))
+
+
+@receiver(post_save, sender=Review)
+def review_created(sender, instance: Review, created: bool, raw: bool, **kwargs):
+    """Counts a new review on its ticket."""
+    if raw:
+        # fixtures may already hold the review count of the ticket: recount
+        post_tools.recount_reviews(Ticket.objects.filter(pk=instance.ticket_id))
+    elif created:
+        post_tools.add_review_count(instance.ticket_id, 1)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance: Review, **kwargs):
+    """Discounts a deleted review from its ticket."""
+    post_tools.add_review_count(instance.ticket_id, -1)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Ticket)
+@receiver(post_delete, sender=Review)
+def post_changed(sender, instance: Ticket | Review, **kwargs):
+    """Drops the cached feeds displaying a post created, updated or deleted."""
+    feed_cache.invalidate(feed_cache.post_readers(instance))
+
+
+@receiver(post_save, sender=UserFollows)
+@receiver(post_delete, sender=UserFollows)
+def subscription_changed(sender, instance: UserFollows, **kwargs):
+    """Drops the cached feed and followed users of a user following or unfollowing another user."""
+    feed_cache.invalidate([instance.user_id])
+    graph_cache.invalidate([instance.user_id])
+
+
+@receiver(post_save, sender=UserFollows)
+def subscription_created(sender, instance: UserFollows, created: bool, raw: bool, **kwargs):
+    """Adds the posts of a newly followed user to the follower's feed, except for fixtures, as post_created()."""
+    if created and not raw:
+        feed.backfill(instance.user, instance.followed_user_id)
+
+
+@receiver(post_delete, sender=UserFollows)
+def subscription_deleted(sender, instance: UserFollows, **kwargs):
+    """Removes the posts of a user no longer followed from the follower's feed."""
+    feed.prune(instance.user, instance.followed_user_id)
+
+
+@receiver(post_save, sender=UserFollows)
+def follow_created(sender, instance: UserFollows, created: bool, raw: bool, **kwargs):
+    """Counts a new subscription on both users, drops the cached users holding the old counters."""
+    if raw:
+        # fixtures may already hold the counters of the users: recount
+        subscription_tools.recount_follows(User.objects.filter(pk__in=[instance.user_id, instance.followed_user_id]))
+    elif created:
+        subscription_tools.add_follow_counts(instance.user_id, instance.followed_user_id, 1)
+    invalidate_users([instance.user_id, instance.followed_user_id])
+
+
+@receiver(post_delete, sender=UserFollows)
+def follow_deleted(sender, instance: UserFollows, **kwargs):
+    """Discounts a deleted subscription from both users, drops the cached users."""
+    subscription_tools.add_follow_counts(instance.user_id, instance.followed_user_id, -1)
+    invalidate_users([instance.user_id, instance.followed_user_id])
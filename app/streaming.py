@@ -0,0 +1,68 @@
+"""Streaming HTML pages: the page layout is sent straight away,
+then entries are rendered and sent one by one as they are loaded.
+
+Async views stream from an async iterator of entries loaded with the async ORM:
+ASGI handlers send a sync iterator only once it is fully consumed.
+"""
+
+from typing import AsyncIterable, Iterable
+from django.http import HttpRequest, StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+# placeholder rendered by page templates where the streamed entries belong
+STREAM_MARKER = mark_safe("<!-- stream entries -->")
+
+ENTRY_TEMPLATES = {
+    "TICKET": ("app/components/ticket_request_view.html", "ticket"),
+    "REVIEW": ("app/components/review_view.html", "review"),
+}
+
+
+def stream_page(
+    request: HttpRequest, template_name: str, context: dict, entries: Iterable
+) -> StreamingHttpResponse:
+    """Renders a page template and streams the entries in place of its stream marker.
+
+    - entries: post entries (see app.entries) as prepared by app.posts.prepare_post_entry(),
+        preferably loaded lazily.
+    """
+    page = render_to_string(template_name, context | {"stream_marker": STREAM_MARKER}, request)
+    head, tail = page.split(STREAM_MARKER, 1)
+
+    def content():
+        yield head
+        yield from render_entries(request, entries)
+        yield tail
+
+    return StreamingHttpResponse(content())
+
+
+def astream_page(
+    request: HttpRequest, template_name: str, context: dict, entries: AsyncIterable
+) -> StreamingHttpResponse:
+    """Same as stream_page(), for async views: entries are an async iterator."""
+    page = render_to_string(template_name, context | {"stream_marker": STREAM_MARKER}, request)
+    head, tail = page.split(STREAM_MARKER, 1)
+
+    async def content():
+        yield head
+        templates = _entry_templates()
+        async for entry in entries:
+            template, var = templates[entry.content_type]
+            yield template.render({var: entry}, request)
+        yield tail
+
+    return StreamingHttpResponse(content())
+
+
+def render_entries(request: HttpRequest, entries: Iterable) -> Iterable[str]:
+    """Renders post entries one by one."""
+    templates = _entry_templates()
+    for entry in entries:
+        template, var = templates[entry.content_type]
+        yield template.render({var: entry}, request)
+
+
+def _entry_templates() -> dict:
+    return {k: (get_template(name), var) for k, (name, var) in ENTRY_TEMPLATES.items()}
@@ -1,6 +1,26 @@
 """Toolbox to follow / drop other users"""
+from typing import Iterable, NamedTuple
 from .models import User, UserFollows
-from django.db.models import QuerySet
+from .posts import alist
+from . import feed, feed_cache, graph_cache
+from django.db import IntegrityError, transaction
+from my_auth.backends import invalidate_users
+from django.db.models import Count, Exists, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+
+# number of users displayed on a single page of subscriptions or followers
+SUBSCRIPTIONS_PAGE_SIZE = 50
+# max number of usernames suggested to complete a username
+SUGGESTIONS_LIMIT = 10
+# rows inserted per statement by bulk_follow()
+BULK_BATCH_SIZE = 500
+
+
+class UsersPage(NamedTuple):
+    """A single page of followed users or followers, most recent subscription first.
+    Users are dicts with "pk" and "username" keys, next_cursor is None on the last page."""
+    users: list[dict]
+    next_cursor: int | None
 
 
 def followed_users(user: User) -> QuerySet[User]:
@@ -15,18 +35,71 @@ def followers(user: User) -> QuerySet[User]:
     return User.objects.filter(following__followed_user=user.pk)
 
 
+def followed_users_page(
+    user: User, cursor: str = None, page_size: int = SUBSCRIPTIONS_PAGE_SIZE
+) -> UsersPage:
+    """Loads a single page of the users followed by user.
+    The page to load is set by the cursor: the next_cursor of the previous page.
+
+    - Raises ValueError if the cursor is invalid.
+    """
+    return _users_page(list(_followed_rows(user, cursor, page_size)), page_size)
+
+
+def followers_page(user: User, cursor: str = None, page_size: int = SUBSCRIPTIONS_PAGE_SIZE) -> UsersPage:
+    """Loads a single page of the users following user, see followed_users_page()."""
+    return _users_page(list(_follower_rows(user, cursor, page_size)), page_size)
+
+
+async def afollowed_users_page(
+    user: User, cursor: str = None, page_size: int = SUBSCRIPTIONS_PAGE_SIZE
+) -> UsersPage:
+    """Same as followed_users_page(), with the async ORM."""
+    return _users_page(await alist(_followed_rows(user, cursor, page_size)), page_size)
+
+
+async def afollowers_page(user: User, cursor: str = None, page_size: int = SUBSCRIPTIONS_PAGE_SIZE) -> UsersPage:
+    """Same as followers_page(), with the async ORM."""
+    return _users_page(await alist(_follower_rows(user, cursor, page_size)), page_size)
+
+
+def username_suggestions(user: User, prefix: str, limit: int = SUGGESTIONS_LIMIT) -> list[str]:
+    """Usernames starting with prefix, ignoring case, in alphabetical order:
+    suggestions to complete the username of a user to follow.
+    Users already followed by user, and user, are left out.
+
+    Usernames are found by a range scan on the username_key index, each candidate is checked
+    against the user's subscriptions by a lookup on the (user, followed_user) unique index.
+    """
+    key = prefix.strip().lower()
+    if not key:
+        return []
+    followed = UserFollows.objects.filter(user_id=user.pk, followed_user_id=OuterRef("pk"))
+    candidates = User.objects.filter(username_key__gte=key)
+    if ord(key[-1]) < 0x10FFFF:
+        # keys starting with prefix sort before prefix with its last character incremented
+        candidates = candidates.filter(username_key__lt=key[:-1] + chr(ord(key[-1]) + 1))
+    else:
+        candidates = candidates.filter(username_key__startswith=key)
+    candidates = candidates.exclude(pk=user.pk).exclude(Exists(followed))
+    return list(candidates.order_by("username_key").values_list("username", flat=True)[:limit])
+
+
 def subscribe_to_user(user: User, follow_username: str) -> User:
     """Try to follow another user.
 
-    - follow_username must be the exact username of a user not already followed.
+    - follow_username must be the username of a user not already followed, ignoring case.
     - Raises DoesNotExist if the user to follow is not found.
 
     Returns the followed user if successful.
     """
-    not_followed = User.objects.exclude(followed_by__user=user).exclude(pk=user.pk)
-    follow_user = not_followed.get(username=follow_username)
-    follow = UserFollows.objects.create(user=user, followed_user=follow_user)
-    follow.save()
+    follow_user = User.objects.exclude(pk=user.pk).only("pk", "username").get(username_key=follow_username.lower())
+    try:
+        # the unique (user, followed_user) constraint rejects a subscription that already exists
+        with transaction.atomic():
+            UserFollows.objects.create(user=user, followed_user=follow_user)
+    except IntegrityError:
+        raise User.DoesNotExist("%s is already followed" % follow_username)
     return follow_user
 
 
@@ -37,3 +110,107 @@ def cancel_subscription(user: User, followed_user_id: int):
     """
     followed = UserFollows.objects.get(user=user, followed_user=followed_user_id)
     return followed.delete()
+
+
+def bulk_follow(user: User, usernames: Iterable[str]) -> list[dict]:
+    """Follows many users at once, found by username ignoring case.
+    Unknown usernames, the user and users already followed are skipped.
+
+    Subscriptions are inserted by a single INSERT ... ON CONFLICT DO NOTHING, without signals:
+    counters, feeds and cached pages are then updated in bulk, as app.signals does for a single subscription.
+
+    Returns the newly followed users as dicts with "pk" and "username" keys, in alphabetical order.
+    """
+    candidates = User.objects.filter(username_key__in={x.lower() for x in usernames}).exclude(pk=user.pk)
+    candidates = candidates.exclude(Exists(UserFollows.objects.filter(user_id=user.pk, followed_user_id=OuterRef("pk"))))
+    followed = list(candidates.order_by("username_key").values("pk", "username"))
+    if not followed:
+        return []
+    followed_ids = [x["pk"] for x in followed]
+    with transaction.atomic():
+        UserFollows.objects.bulk_create(
+            [UserFollows(user_id=user.pk, followed_user_id=x) for x in followed_ids],
+            batch_size=BULK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        _subscriptions_changed(user, followed_ids)
+        feed.backfill(user, *followed_ids)
+    return followed
+
+
+def bulk_unfollow(user: User, followed_user_ids: Iterable[int]) -> int:
+    """Cancels many subscriptions at once, by a single DELETE statement.
+    Counters, feeds and cached pages are updated in bulk, as for bulk_follow().
+
+    Returns the number of subscriptions canceled."""
+    subscriptions = UserFollows.objects.filter(user_id=user.pk, followed_user_id__in=set(followed_user_ids))
+    with transaction.atomic():
+        canceled = list(subscriptions.values_list("followed_user_id", flat=True))
+        if not canceled:
+            return 0
+        # a single DELETE, without the signals QuerySet.delete() would send for each subscription:
+        # the receivers of app.signals would update counters, feeds and caches one subscription at a time,
+        # _subscriptions_changed() and feed.prune() do it in bulk
+        total = subscriptions._raw_delete(subscriptions.db)
+        _subscriptions_changed(user, canceled)
+        feed.prune(user, *canceled)
+    return total
+
+
+def _subscriptions_changed(user: User, user_ids: list[int]):
+    """Does in bulk what the receivers of app.signals do for each subscription, for bulk inserts and deletes
+    that send no signals: recounts the subscriptions of user and the followers of user_ids, drops the cached users,
+    and the user's cached feed pages and followed users."""
+    recount_follows(User.objects.filter(pk__in=[user.pk, *user_ids]))
+    invalidate_users([user.pk, *user_ids])
+    feed_cache.invalidate([user.pk])
+    graph_cache.invalidate([user.pk])
+
+
+def add_follow_counts(user_id: int, followed_user_id: int, delta: int):
+    """Atomically adds delta to the following counter of a user and the followers counter of the followed user.
+    Counters never go below zero."""
+    User.objects.filter(pk=user_id, following_count__gte=-delta).update(
+        following_count=F("following_count") + delta
+    )
+    User.objects.filter(pk=followed_user_id, followers_count__gte=-delta).update(
+        followers_count=F("followers_count") + delta
+    )
+
+
+def recount_follows(users: QuerySet[User] = None) -> int:
+    """Recomputes the following and followers counters of users from the subscriptions table,
+    in a single statement. Recomputes all users by default.
+
+    Returns the number of users updated."""
+    users = User.objects.all() if users is None else users
+
+    def total(field: str):
+        subscriptions = UserFollows.objects.filter(**{field: OuterRef("pk")})
+        return Coalesce(Subquery(subscriptions.values(field).annotate(total=Count("pk")).values("total")), 0)
+
+    return users.update(following_count=total("user_id"), followers_count=total("followed_user_id"))
+
+
+def _followed_rows(user: User, cursor: str | None, page_size: int) -> QuerySet[UserFollows]:
+    rows = _after_cursor(UserFollows.objects.filter(user_id=user.pk), cursor)
+    return rows.values("pk", user_pk=F("followed_user_id"), username=F("followed_user__username"))[: page_size + 1]
+
+
+def _follower_rows(user: User, cursor: str | None, page_size: int) -> QuerySet[UserFollows]:
+    rows = _after_cursor(UserFollows.objects.filter(followed_user_id=user.pk), cursor)
+    return rows.values("pk", user_pk=F("user_id"), username=F("user__username"))[: page_size + 1]
+
+
+def _after_cursor(subscriptions: QuerySet[UserFollows], cursor: str | None) -> QuerySet[UserFollows]:
+    """Subscriptions older than the cursor, most recent first: a range scan on (user, -id) or (followed_user, -id).
+    The cursor is the id of the last subscription of the previous page."""
+    if cursor:
+        subscriptions = subscriptions.filter(pk__lt=int(cursor))
+    return subscriptions.order_by("-pk")
+
+
+def _users_page(rows: list[dict], page_size: int) -> UsersPage:
+    users = [{"pk": x["user_pk"], "username": x["username"]} for x in rows[:page_size]]
+    next_cursor = rows[page_size - 1]["pk"] if len(rows) > page_size else None
+    return UsersPage(users, next_cursor)
@@ -0,0 +1,131 @@
+"""Follow suggestions: "people you may know", ranked by number of mutual follows.
+
+A user is suggested the users followed by the users they follow (friends of friends),
+ranked by the number of users they follow who follow the candidate.
+
+Suggestions are computed in batch by the computesuggestions command, meant to run periodically,
+and stored in the FollowSuggestion table read by the subscriptions page.
+The follow graph is loaded once in compact CSR arrays (see FollowGraph):
+counting the friends of friends of a user is then a C-level Counter update over array slices,
+instead of a join over UserFollows per user.
+"""
+
+import heapq
+from array import array
+from collections import Counter
+from itertools import chain, islice
+from typing import Iterable, Iterator
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, QuerySet
+from .models import User, UserFollows, FollowSuggestion
+from .posts import alist
+
+# number of suggestions stored for each user
+SUGGESTIONS_PER_USER = 10
+# rows inserted per statement when storing suggestions
+BATCH_SIZE = 1000
+
+
+class FollowGraph:
+    """The follow graph in compressed sparse row (CSR) form:
+    the users followed by user id u are targets[offsets[u]:offsets[u + 1]], sorted by id.
+    Arrays are indexed by user id, so they are sized by the highest id rather than the number of users."""
+
+    def __init__(self, offsets: array, targets: array):
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[tuple[int, int]], max_user_id: int) -> "FollowGraph":
+        """Builds the graph from (user id, followed user id) pairs, sorted by user id then followed user id."""
+        offsets = array("q", [0]) * (max_user_id + 2)
+        targets = array("q")
+        for user_id, followed_user_id in edges:
+            targets.append(followed_user_id)
+            offsets[user_id + 1] += 1
+        for i in range(1, len(offsets)):
+            offsets[i] += offsets[i - 1]
+        return cls(offsets, targets)
+
+    @classmethod
+    def load(cls) -> "FollowGraph":
+        """Loads the follow graph from the database, streaming the subscriptions."""
+        max_user_id = User.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        edges = (
+            UserFollows.objects.order_by("user_id", "followed_user_id")
+            .values_list("user_id", "followed_user_id")
+            .iterator(chunk_size=10000)
+        )
+        return cls.from_edges(edges, max_user_id)
+
+    @property
+    def max_user_id(self) -> int:
+        return len(self.offsets) - 2
+
+    def following(self, user_id: int) -> array:
+        return self.targets[self.offsets[user_id]:self.offsets[user_id + 1]]
+
+    def suggest(self, user_id: int, k: int = SUGGESTIONS_PER_USER) -> list[tuple[int, int]]:
+        """The top-k (suggested user id, mutual follows) of a user,
+        by most mutual follows first then lowest id."""
+        following = self.following(user_id)
+        if not following:
+            return []
+        offsets, targets = self.offsets, self.targets
+        counts = Counter(chain.from_iterable(targets[offsets[x]:offsets[x + 1]] for x in following))
+        counts.pop(user_id, None)
+        for x in following:
+            counts.pop(x, None)
+        # the k-th highest count: candidates above it are all kept, ties on it are broken by lowest id
+        threshold = heapq.nlargest(k, counts.values())[-1] if len(counts) > k else 0
+        top = sorted(((x, n) for x, n in counts.items() if n > threshold), key=lambda x: (-x[1], x[0]))
+        if threshold:
+            ties = heapq.nsmallest(k - len(top), (x for x, n in counts.items() if n == threshold))
+            top.extend((x, threshold) for x in ties)
+        return top
+
+    def suggest_all(self, k: int = SUGGESTIONS_PER_USER) -> Iterator[tuple[int, int, int]]:
+        """Iterates over the (user id, suggested user id, mutual follows) of all users."""
+        offsets = self.offsets
+        for user_id in range(self.max_user_id + 1):
+            if offsets[user_id] != offsets[user_id + 1]:
+                for suggested_user_id, mutual in self.suggest(user_id, k):
+                    yield user_id, suggested_user_id, mutual
+
+
+def compute_suggestions(k: int = SUGGESTIONS_PER_USER) -> int:
+    """Recomputes the suggestions of all users from scratch.
+    Returns the number of suggestions stored."""
+    graph = FollowGraph.load()
+    suggestions = (
+        FollowSuggestion(user_id=user_id, suggested_user_id=suggested_user_id, mutual_count=mutual)
+        for user_id, suggested_user_id, mutual in graph.suggest_all(k)
+    )
+    total = 0
+    with transaction.atomic():
+        FollowSuggestion.objects.all().delete()
+        # inserted batch by batch: bulk_create() would build all the suggestions in memory first
+        while batch := list(islice(suggestions, BATCH_SIZE)):
+            total += len(FollowSuggestion.objects.bulk_create(batch))
+    return total
+
+
+def suggested_users(user: User, limit: int = 5) -> list[dict]:
+    """The stored suggestions of a user, best first, as dicts with "pk", "username" and "mutual_count" keys.
+    Users followed since the suggestions were computed are left out."""
+    return list(_suggestions(user, limit))
+
+
+async def asuggested_users(user: User, limit: int = 5) -> list[dict]:
+    """Same as suggested_users(), with the async ORM."""
+    return await alist(_suggestions(user, limit))
+
+
+def _suggestions(user: User, limit: int) -> QuerySet[FollowSuggestion]:
+    followed = UserFollows.objects.filter(user_id=user.pk, followed_user_id=OuterRef("suggested_user_id"))
+    suggestions = (
+        FollowSuggestion.objects.filter(user_id=user.pk)
+        .exclude(Exists(followed))
+        .order_by("-mutual_count", "suggested_user_id")
+    )
+    return suggestions.values("mutual_count", pk=F("suggested_user_id"), username=F("suggested_user__username"))[:limit]
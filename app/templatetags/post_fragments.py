@@ -0,0 +1,19 @@
+from django import template
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from app import fragment_cache
+
+register = template.Library()
+
+BODY_TEMPLATES = {
+    "TICKET": ("app/components/ticket_body.html", "ticket"),
+    "REVIEW": ("app/components/review_body.html", "review"),
+}
+
+
+@register.simple_tag
+def post_body(post) -> str:
+    """Renders the body of a post, through the fragment cache (see app.fragment_cache).
+    The body must not depend on the viewer."""
+    template_name, var = BODY_TEMPLATES[post.content_type]
+    return mark_safe(fragment_cache.get_or_render(post, lambda: render_to_string(template_name, {var: post})))
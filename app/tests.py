@@ -1,14 +1,47 @@
-from django.test import TestCase
-from app.models import User, UserFollows, Ticket, Review
-from app.posts import own_or_followed_reviews, own_or_followed_tickets
-from app.subscriptions import followed_users, followers
-from django.db import models
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from app.models import User, UserFollows, Ticket, Review, FeedEntry
+from app.posts import own_or_followed_reviews, own_or_followed_tickets, feed_page, feed_sort_key, recount_reviews
+from app.subscriptions import (
+    followed_users, followers, subscribe_to_user, cancel_subscription, followed_users_page, followers_page, recount_follows,
+    username_suggestions, bulk_follow, bulk_unfollow,
+)
+from app import access, async_views, events, feed, suggestions, feed_cache, fragment_cache, graph_cache, metrics, posts
+from app.urls import app_patterns
+from app.helpers import add_next_url, reverse_id
+from my_auth.forms import RegisterForm
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import models, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from unittest import skipUnless
+from unittest.mock import patch
+from django.urls import reverse, path, include
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.utils.module_loading import import_string
+from asgiref.sync import sync_to_async
+from importlib import import_module
 from itertools import chain
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import time
 
 
-class UserFollowsTestCase(TestCase):
+class FixturesTestCase(TestCase):
+    """Loads the test fixtures, then builds the feeds as the rebuildfeed command does after a loaddata."""
     fixtures = ["tests.yaml"]
 
+    @classmethod
+    def setUpTestData(cls):
+        feed.rebuild_feeds()
+
+
+class UserFollowsTestCase(FixturesTestCase):
+
     def test_followed_users(self):
         """Finds who follows who"""
         expectations = [
@@ -46,8 +79,7 @@ class UserFollowsTestCase(TestCase):
             )
 
 
-class TicketUserManagerTestCase(TestCase):
-    fixtures = ["tests.yaml"]
+class TicketUserManagerTestCase(FixturesTestCase):
 
     def test_find_tickets_by_author(self):
         """Finds all tickets for each user"""
@@ -91,8 +123,7 @@ class TicketUserManagerTestCase(TestCase):
             )
 
 
-class ReviewUserManagerTestCase(TestCase):
-    fixtures = ["tests.yaml"]
+class ReviewUserManagerTestCase(FixturesTestCase):
 
     def test_find_reviews_by_author(self):
         """Finds all tickets for each user"""
@@ -220,3 +251,1004 @@ class UserFeedTestCase(TestCase):
         self.assertNotIn(alice_review, cecile_feed)
         self.assertIn(bob_ticket, bob_feed)
         self.assertIn(alice_review, bob_feed)
+
+
+class FeedPageTestCase(FixturesTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_match_full_feed(self):
+        """Walking through the feed page by page yields the whole feed, most recent first."""
+        for user in User.objects.all():
+            expected = sorted(
+                chain(own_or_followed_tickets(user), own_or_followed_reviews(user)),
+                key=feed_sort_key,
+                reverse=True,
+            )
+            found = []
+            cursor = None
+            while True:
+                page = feed_page(user, cursor=cursor, page_size=2)
+                self.assertLessEqual(len(page.entries), 2)
+                found.extend(page.entries)
+                if page.next_cursor is None:
+                    break
+                cursor = page.next_cursor
+            self.assertListEqual(
+                [feed_sort_key(x) for x in found],
+                [feed_sort_key(x) for x in expected],
+                f"Feed pages don't match the full feed for user #{user.pk} {user}",
+            )
+
+    def test_feed_view_pagination(self):
+        """The feed view links to the next page with a cursor."""
+        user = User.objects.get(pk=2)
+        self.client.force_login(user)
+        first = self.client.get(reverse("feed"), {"cursor": ""})
+        self.assertEqual(first.status_code, 200)
+        self.assertIsNone(first.context["next_cursor"])
+        self.assertEqual(len(first.context["feed_entries"]), 7)
+        self.assertEqual(self.client.get(reverse("feed"), {"cursor": "garbage"}).status_code, 404)
+
+    def test_invalid_cursor(self):
+        """Garbage cursors are rejected."""
+        user = User.objects.get(pk=2)
+        for cursor in ["garbage", "Zm9vfGJhcnwx"]:
+            with self.assertRaises(ValueError):
+                feed_page(user, cursor=cursor)
+
+
+class MaterializedFeedTestCase(FixturesTestCase):
+
+    def assertFeedsMatch(self):
+        """The materialized feed of each user matches the feed queried from the posts."""
+        for user in User.objects.all():
+            expected = feed_page(user, page_size=100).entries
+            found = feed.feed_page(user, page_size=100).entries
+            self.assertListEqual(
+                [(feed_sort_key(x), getattr(x, "can_review", None)) for x in found],
+                [(feed_sort_key(x), getattr(x, "can_review", None)) for x in expected],
+                f"Materialized feed doesn't match for user #{user.pk} {user}",
+            )
+
+    def test_rebuild_feeds(self):
+        """Rebuilding from scratch yields the same feeds."""
+        feed.rebuild_feeds()
+        self.assertFeedsMatch()
+
+    def test_migration_backfill(self):
+        """The migration creating the feeds fills them from existing posts, fixtures are skipped until then."""
+        Ticket.objects.all().delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        call_command("loaddata", "tests.yaml", verbosity=0)
+        self.assertTrue(Review.objects.exists())
+        self.assertFalse(FeedEntry.objects.exists())
+        import_module("app.migrations.0003_feedentry").fill_feeds(django_apps, None)
+        self.assertFeedsMatch()
+
+    def test_fan_out_on_write(self):
+        """New posts, deleted posts and subscription changes are reflected in the feeds."""
+        alix = User.objects.get(pk=2)
+        observer = User.objects.get(pk=5)
+        ticket = Ticket.objects.create(user=observer, title="Ubik")
+        Review.objects.create(user=alix, ticket=ticket, rating=4, headline="Great")
+        self.assertFeedsMatch()
+        subscribe_to_user(alix, "ObservEr")
+        self.assertFeedsMatch()
+        cancel_subscription(alix, observer.pk)
+        self.assertFeedsMatch()
+        cancel_subscription(alix, 3)
+        self.assertFeedsMatch()
+        ticket.delete()
+        Review.objects.get(pk=1).delete()
+        self.assertFeedsMatch()
+
+    def test_bulk_subscriptions(self):
+        """Bulk subscriptions and cancellations are reflected in the feeds."""
+        alix = User.objects.get(pk=2)
+        bulk_follow(alix, ["OBSERVER", "bob"])
+        self.assertFeedsMatch()
+        bulk_unfollow(alix, [3, 5, 6])
+        self.assertFeedsMatch()
+
+    def test_paginated_materialized_feed(self):
+        """Cursors from the materialized feed walk through the whole feed."""
+        user = User.objects.get(pk=2)
+        expected = [feed_sort_key(x) for x in feed.feed_page(user, page_size=100).entries]
+        found = []
+        page = feed.feed_page(user, page_size=3)
+        found.extend(feed_sort_key(x) for x in page.entries)
+        while page.next_cursor:
+            page = feed.feed_page(user, cursor=page.next_cursor, page_size=3)
+            found.extend(feed_sort_key(x) for x in page.entries)
+        self.assertListEqual(found, expected)
+
+
+class FeedCacheTestCase(FixturesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.alix = User.objects.get(pk=2)
+        self.client.force_login(self.alix)
+
+    def _feed_ids(self):
+        response = self.client.get(reverse("feed"))
+        return [(x.content_type, x.id) for x in response.context["feed_entries"]]
+
+    def test_hits_and_misses(self):
+        """Re-reading an unchanged feed is served from the cache."""
+        first = self._feed_ids()
+        self.assertEqual(feed_cache.stats()["misses"], 1)
+        self.assertListEqual(self._feed_ids(), first)
+        self.assertEqual(feed_cache.stats()["hits"], 1)
+        self.assertEqual(feed_cache.stats()["hit_rate"], 0.5)
+        metrics.reset()
+        self.assertEqual(feed_cache.stats()["hits"], 0)
+
+    async def test_async_cache_api(self):
+        """The async feed cache never calls the blocking cache API from the event loop."""
+
+        class AsyncOnly:
+            def __getattr__(self, name):
+                if name not in ("aget", "aset", "aadd", "aincr"):
+                    raise AssertionError(f"cache.{name}() called from the event loop")
+                return getattr(cache, name)
+
+        alix = await User.objects.aget(pk=2)
+        with patch.object(feed_cache, "cache", AsyncOnly()), patch.object(metrics, "cache", AsyncOnly()):
+            for i in range(2):
+                entries, _ = await feed_cache.aget_or_load(2, None, lambda: feed.aprepared_page(alix))
+        self.assertTrue(entries)
+        self.assertEqual(feed_cache.stats()["hits"], 1)
+
+    def test_metrics_endpoint(self):
+        """Counters of the serving worker are readable by staff users, showmetrics needs a shared cache."""
+        self._feed_ids()
+        self.assertEqual(self.client.get(reverse("api_metrics")).status_code, 403)
+        User.objects.filter(pk=self.alix.pk).update(is_staff=True)
+        cache.clear()
+        response = self.client.get(reverse("api_metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("feed_cache.hit_rate", response.json())
+        with self.assertRaisesMessage(CommandError, reverse("api_metrics")):
+            call_command("showmetrics")
+
+    def test_invalidation(self):
+        """Only changes visible in a feed drop the cached feed."""
+        self._feed_ids()
+        # Alix doesn't follow ObservEr
+        Ticket.objects.create(user=User.objects.get(pk=5), title="Unseen")
+        self._feed_ids()
+        self.assertEqual(feed_cache.stats()["hits"], 1)
+        # Alix follows Toto_23
+        ticket = Ticket.objects.create(user=User.objects.get(pk=3), title="Seen")
+        self.assertIn(("TICKET", ticket.pk), self._feed_ids())
+        ticket.title = "Edited"
+        ticket.save()
+        self._feed_ids()
+        cancel_subscription(self.alix, 3)
+        self.assertNotIn(("TICKET", ticket.pk), self._feed_ids())
+        self.assertEqual(feed_cache.stats(), {"hits": 1, "misses": 4, "hit_rate": 0.2})
+
+    def test_review_of_own_ticket(self):
+        """A review posted to one of the user's tickets drops the user's cached feed."""
+        self._feed_ids()
+        review = Review.objects.create(
+            user=User.objects.get(pk=5), ticket=Ticket.objects.get(pk=2), rating=3, headline="Fine"
+        )
+        self.assertIn(("REVIEW", review.pk), self._feed_ids())
+
+
+class GraphCacheTestCase(TransactionTestCase):
+    """Sets loaded inside a transaction are not cached: these tests run outside of one."""
+    fixtures = ["tests.yaml"]
+
+    def setUp(self):
+        cache.clear()
+        graph_cache.clear()
+        self.addCleanup(graph_cache.clear)
+        self.alix = User.objects.get(pk=2)
+
+    def test_cached_until_subscription_changes(self):
+        """Followed users are loaded once, and reloaded after a subscription changes."""
+        self.assertSetEqual(graph_cache.followed_ids(2), {3, 4})
+        with self.assertNumQueries(0):
+            self.assertSetEqual(graph_cache.followed_ids(2), {3, 4})
+        subscribe_to_user(self.alix, "ObservEr")
+        self.assertSetEqual(graph_cache.followed_ids(2), {3, 4, 5})
+        cancel_subscription(self.alix, 3)
+        self.assertSetEqual(graph_cache.followed_ids(2), {4, 5})
+        bulk_unfollow(self.alix, [4])
+        self.assertSetEqual(graph_cache.followed_ids(2), {5})
+        self.assertEqual(graph_cache.stats()["hits"], 1)
+
+    def test_lru_bound(self):
+        """The least recently used sets are dropped first."""
+        with override_settings(GRAPH_CACHE_SIZE=2):
+            for user_id in (2, 3, 2, 6):
+                graph_cache.followed_ids(user_id)
+            self.assertEqual(graph_cache.stats()["size"], 2)
+            self.assertIsNotNone(graph_cache.peek(2))
+            self.assertIsNone(graph_cache.peek(3))
+
+    def test_timeout(self):
+        """Sets expire, even if their version is unchanged: other workers may have missed the change."""
+        graph_cache.followed_ids(2)
+        UserFollows.objects.filter(user_id=2, followed_user_id=3).update(followed_user_id=5)
+        self.assertSetEqual(graph_cache.followed_ids(2), {3, 4})
+        with patch.object(graph_cache.time, "monotonic", return_value=time.monotonic() + settings.GRAPH_CACHE_TIMEOUT):
+            self.assertIsNone(graph_cache.peek(2))
+            self.assertSetEqual(graph_cache.followed_ids(2), {4, 5})
+
+    def test_stale_set_on_follow(self):
+        """Following relies on the unique constraint, not on a possibly stale cached set."""
+        graph_cache.followed_ids(2)
+        # unfollowed in another worker, whose invalidation this process missed
+        UserFollows.objects.filter(user_id=2, followed_user_id=3).update(followed_user_id=5)
+        self.assertEqual(subscribe_to_user(self.alix, "toto_23").pk, 3)
+        with self.assertRaises(User.DoesNotExist):
+            subscribe_to_user(self.alix, "ObservEr")
+
+    def test_not_cached_in_transaction(self):
+        with transaction.atomic():
+            self.assertSetEqual(graph_cache.followed_ids(2), {3, 4})
+        self.assertIsNone(graph_cache.peek(2))
+
+    def test_review_for_ticket(self):
+        """Replying to a ticket requires following its author."""
+        self.client.force_login(self.alix)
+        self.assertEqual(self.client.get(reverse("review_for_ticket", args=[3])).status_code, 200)
+        self.client.force_login(User.objects.get(pk=4))
+        self.assertEqual(self.client.get(reverse("review_for_ticket", args=[3])).status_code, 404)
+
+    def test_feed_queries(self):
+        """Feed queries inline the cached followed users instead of a subquery."""
+        graph_cache.followed_ids(2)
+        with CaptureQueriesContext(connection) as queries:
+            tickets = list(own_or_followed_tickets(self.alix).values_list("pk", flat=True))
+        self.assertCountEqual(tickets, [1, 2, 3, 4])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("app_userfollows", queries[0]["sql"])
+
+
+class AccessTestCase(FixturesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.alix = User.objects.get(pk=2)
+        self.toto = User.objects.get(pk=3)
+
+    def test_visible_tickets(self):
+        """Own tickets and tickets of followed users, each checked by a single query."""
+        for user_id, visible in ((2, [1, 2, 3, 4]), (4, [4])):
+            user = User.objects.get(pk=user_id)
+            for ticket_id in range(1, 5):
+                with self.assertNumQueries(1):
+                    found = access.visible_tickets(user).filter(pk=ticket_id).exists()
+                self.assertEqual(found, ticket_id in visible)
+
+    def test_reviewable_tickets(self):
+        """Tickets already reviewed cannot be reviewed again."""
+        self.assertListEqual(list(access.reviewable_tickets(self.alix).values_list("pk", flat=True)), [3])
+
+    def test_view_queries(self):
+        """Single post views load the post and check access with one query.
+        The session and the user are read from the cache, the user is loaded by the first request."""
+        self.client.force_login(self.alix)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse("review_for_ticket", args=[3])).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse("review_for_ticket", args=[1])).status_code, 404)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse("edit_review", args=[1])).status_code, 404)
+        self.client.force_login(self.toto)
+        self.client.get(reverse("posts"))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse("edit_review", args=[1])).status_code, 200)
+        # the review, then deleting it and updating its ticket's counter, feeds and cached pages
+        with self.assertNumQueries(5):
+            self.assertEqual(self.client.post(reverse("delete_review", args=[1])).status_code, 302)
+        self.assertFalse(Review.objects.filter(pk=1).exists())
+
+
+@skipUnless(connection.vendor == "sqlite", "query plans are checked on SQLite")
+class QueryPlanTestCase(FixturesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.get(pk=3)
+
+    def assertIndexedQueries(self, queries: list[dict]):
+        """Fails if the query plan of a query scans a whole table or index."""
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT"):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+            scans = [x for x in plan if x.startswith("SCAN ") and x != "SCAN CONSTANT ROW"]
+            self.assertListEqual(scans, [], f"Full scan in the query plan of: {sql}\n{plan}")
+
+    def test_feed_querysets(self):
+        """Feed, posts and subscription querysets use indexes."""
+        querysets = [
+            own_or_followed_tickets(self.user).order_by("-time_created", "-pk")[:21],
+            own_or_followed_reviews(self.user).order_by("-time_created", "-pk")[:21],
+            followed_users(self.user),
+            followers(self.user),
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            for qs in querysets:
+                list(qs)
+            feed_page(self.user, page_size=2)
+            cursor = feed.feed_page(self.user, page_size=2).next_cursor
+            feed.feed_page(self.user, cursor=cursor)
+            feed.entries_since(self.user, cursor)
+            posts.feed_since(self.user, cursor)
+            followed_users_page(self.user, cursor=followed_users_page(self.user, page_size=1).next_cursor)
+            followers_page(self.user, cursor=followers_page(self.user, page_size=1).next_cursor)
+            username_suggestions(self.user, "r")
+            suggestions.suggested_users(self.user)
+        self.assertIndexedQueries(ctx.captured_queries)
+
+    def test_username_lookups(self):
+        """Logins, registrations and subscriptions find users by the username_key index, ignoring case."""
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(User.objects.get_by_natural_key("toto_23").pk, 3)
+            self.assertFalse(RegisterForm({"username": "OBSERVER", "password": "x"}).is_valid())
+            self.assertEqual(subscribe_to_user(User.objects.get(pk=2), "observer").pk, 5)
+        self.assertIndexedQueries(ctx.captured_queries)
+        for query in ctx.captured_queries:
+            self.assertNotIn(" LIKE ", query["sql"])
+
+    def test_views(self):
+        """Feed, posts and subscriptions pages use indexes."""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            for view in ["feed", "posts", "subscriptions"]:
+                self.assertEqual(self.client.get(reverse(view)).status_code, 200)
+        self.assertIndexedQueries(ctx.captured_queries)
+
+
+class ReviewCountTestCase(FixturesTestCase):
+
+    def assertReviewCounts(self):
+        """Review counters match the number of reviews of each ticket."""
+        for ticket in Ticket.objects.all():
+            self.assertEqual(
+                ticket.review_count,
+                Review.objects.filter(ticket=ticket).count(),
+                f"Wrong review count for ticket #{ticket.pk}",
+            )
+
+    def test_counts_follow_reviews(self):
+        """Creating and deleting reviews updates the counters."""
+        self.assertReviewCounts()
+        ticket = Ticket.objects.create(user=User.objects.get(pk=2), title="Ubik")
+        self.assertTrue(ticket.can_review)
+        review = Review.objects.create(user=User.objects.get(pk=3), ticket=ticket, rating=2, headline="Meh")
+        ticket.refresh_from_db()
+        self.assertFalse(ticket.can_review)
+        self.assertReviewCounts()
+        review.delete()
+        Review.objects.get(pk=1).delete()
+        self.assertReviewCounts()
+
+    def test_review_views(self):
+        """Reviews created and deleted through the views update the counters."""
+        user = User.objects.get(pk=2)
+        self.client.force_login(user)
+        self.client.post(
+            reverse("create_review"),
+            {"action": "validate_review", "user": user.pk, "title": "Ubik", "rating": 4, "headline": "Great"},
+        )
+        review = Review.objects.get(headline="Great")
+        self.assertEqual(review.ticket.review_count, 1)
+        self.client.post(reverse("delete_review", kwargs={"review_id": review.pk}))
+        self.assertReviewCounts()
+
+    def test_stale_edit(self):
+        """Editing a ticket loaded before a review was posted keeps its counter."""
+        user = User.objects.get(pk=2)
+        ticket = Ticket.objects.create(user=user, title="Ubik")
+        stale = Ticket.objects.get(pk=ticket.pk)
+        Review.objects.create(user=User.objects.get(pk=3), ticket=ticket, rating=2, headline="Meh")
+        stale.title = "Ubik, edited"
+        stale.save()
+        self.client.force_login(user)
+        self.client.post(
+            reverse("edit_ticket", kwargs={"ticket_id": ticket.pk}),
+            {"action": "edit_ticket", "user": user.pk, "title": "Ubik, edited twice"},
+        )
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.title, "Ubik, edited twice")
+        self.assertFalse(ticket.can_review)
+        self.assertReviewCounts()
+
+    def test_recount(self):
+        """Counters are repaired in bulk."""
+        Ticket.objects.update(review_count=7)
+        self.assertEqual(recount_reviews(), Ticket.objects.count())
+        self.assertReviewCounts()
+
+
+class FollowCountTestCase(FixturesTestCase):
+
+    def assertFollowCounts(self):
+        """Counters match the number of subscriptions of each user."""
+        for user in User.objects.all():
+            self.assertEqual(user.following_count, followed_users(user).count(), f"Wrong following count for {user}")
+            self.assertEqual(user.followers_count, followers(user).count(), f"Wrong followers count for {user}")
+
+    def test_counts_follow_subscriptions(self):
+        """Subscribing, unsubscribing and deleting users updates the counters."""
+        self.assertFollowCounts()
+        alix = User.objects.get(pk=2)
+        subscribe_to_user(alix, "ObservEr")
+        self.assertFollowCounts()
+        cancel_subscription(alix, 3)
+        self.assertFollowCounts()
+        User.objects.get(pk=4).delete()
+        self.assertFollowCounts()
+
+    def test_subscribe_once(self):
+        """Following a user already followed, or oneself, fails without changing the counters."""
+        alix = User.objects.get(pk=2)
+        for username in ("Toto_23", "Alix"):
+            with self.assertRaises(User.DoesNotExist):
+                subscribe_to_user(alix, username)
+        self.assertFollowCounts()
+
+    def test_bulk(self):
+        """Users are followed once, unknown usernames are skipped."""
+        alix = User.objects.get(pk=2)
+        followed = bulk_follow(alix, ["OBSERVER", "toto_23", "alix", "nobody", "ObservEr"])
+        self.assertListEqual(followed, [{"pk": 5, "username": "ObservEr"}])
+        self.assertFollowCounts()
+        self.assertListEqual(bulk_follow(alix, ["observer"]), [])
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(bulk_unfollow(alix, [3, 5, 6, 42]), 2)
+        deletes = [x["sql"] for x in ctx.captured_queries if x["sql"].startswith("DELETE") and "app_userfollows" in x["sql"]]
+        self.assertEqual(len(deletes), 1)
+        self.assertFollowCounts()
+        self.assertEqual(bulk_unfollow(alix, [3]), 0)
+
+    def test_recount(self):
+        User.objects.update(following_count=7, followers_count=7)
+        self.assertEqual(recount_follows(), User.objects.count())
+        self.assertFollowCounts()
+
+
+class SubscriptionPagesTestCase(FixturesTestCase):
+
+    def test_pages_match_full_lists(self):
+        """Pages list all users, most recent subscription first."""
+        for user in User.objects.all():
+            for load_page, users in ((followed_users_page, followed_users(user)), (followers_page, followers(user))):
+                found, cursor = [], ""
+                while cursor is not None:
+                    page = load_page(user, cursor, page_size=2)
+                    found.extend(x["pk"] for x in page.users)
+                    cursor = page.next_cursor
+                expected = users.order_by("-following__pk" if load_page is followers_page else "-followed_by__pk")
+                self.assertListEqual(found, list(expected.values_list("pk", flat=True)))
+
+    def test_view(self):
+        """The page displays the totals from the counters, without counting subscriptions."""
+        user = User.objects.get(pk=1)
+        followed = User.objects.bulk_create([User(username=f"user_{i}", password="!") for i in range(52)])
+        UserFollows.objects.bulk_create([UserFollows(user=user, followed_user=x) for x in followed])
+        recount_follows()
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("subscriptions"))
+        self.assertFalse([x for x in ctx.captured_queries if "COUNT(" in x["sql"]])
+        self.assertContains(response, "Abonnements (52)")
+        self.assertEqual(len(response.context["following"]), 50)
+        cursor = response.context["following_next_cursor"]
+        response = self.client.get(reverse("subscriptions"), {"following": cursor})
+        self.assertListEqual([x["username"] for x in response.context["following"]], ["user_1", "user_0"])
+        self.assertIsNone(response.context["following_next_cursor"])
+        self.assertEqual(self.client.get(reverse("subscriptions"), {"followers": "x"}).status_code, 404)
+
+
+class UsernameSuggestionsTestCase(FixturesTestCase):
+
+    def test_suggestions(self):
+        """Usernames starting with a prefix, ignoring case, except the user and the users already followed."""
+        admin, alix, observer = (User.objects.get(pk=x) for x in (1, 2, 5))
+        self.assertListEqual(username_suggestions(admin, "r"), ["ReviewService"])
+        self.assertListEqual(username_suggestions(admin, "OBS"), ["ObservEr"])
+        self.assertListEqual(username_suggestions(alix, "t"), [])
+        self.assertListEqual(username_suggestions(observer, "ob"), [])
+        self.assertListEqual(username_suggestions(admin, " "), [])
+        User.objects.bulk_create([User(username=f"Ob_{i}", password="!") for i in range(12)])
+        self.assertListEqual(username_suggestions(admin, "ob", limit=3), ["Ob_0", "Ob_1", "Ob_10"])
+
+    def test_renamed_user(self):
+        user = User.objects.get(pk=6)
+        user.username = "Robert"
+        user.save(update_fields=["username"])
+        self.assertEqual(User.objects.get(pk=6).username_key, "robert")
+
+    def test_api(self):
+        url = reverse("api_username_suggestions")
+        self.assertEqual(self.client.get(url, {"q": "r"}).status_code, 401)
+        self.client.force_login(User.objects.get(pk=1))
+        self.assertDictEqual(self.client.get(url, {"q": "r"}).json(), {"usernames": ["ReviewService"]})
+        self.assertDictEqual(self.client.get(url, {"q": "r", "limit": 0}).json(), {"usernames": []})
+        self.assertEqual(self.client.get(url, {"q": "r", "limit": "x"}).status_code, 400)
+
+
+class FollowSuggestionsTestCase(FixturesTestCase):
+
+    def _expected(self, user_id: int, following: dict[int, set[int]], k: int = 10) -> list[tuple[int, int]]:
+        """Friends of friends ranked by mutual follows, computed the naive way."""
+        counts = {}
+        for followed_user_id in following.get(user_id, ()):
+            for candidate in following.get(followed_user_id, ()):
+                if candidate != user_id and candidate not in following[user_id]:
+                    counts[candidate] = counts.get(candidate, 0) + 1
+        return sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:k]
+
+    def test_graph(self):
+        """Suggestions computed on the CSR graph match a naive computation."""
+        rng = random.Random(0)
+        n_users = 200
+        following = {x: set(rng.sample(range(n_users), rng.randint(0, 15))) - {x} for x in range(n_users)}
+        edges = sorted((x, y) for x, targets in following.items() for y in targets)
+        graph = suggestions.FollowGraph.from_edges(edges, n_users - 1)
+        for user_id in range(n_users):
+            self.assertListEqual(graph.suggest(user_id, k=5), self._expected(user_id, following, k=5))
+
+    def test_compute_suggestions(self):
+        following = {}
+        for user_id, followed_user_id in UserFollows.objects.values_list("user_id", "followed_user_id"):
+            following.setdefault(user_id, set()).add(followed_user_id)
+        self.assertEqual(suggestions.compute_suggestions(), 2)
+        for user in User.objects.all():
+            expected = [{"pk": x, "username": User.objects.get(pk=x).username, "mutual_count": n}
+                        for x, n in self._expected(user.pk, following)]
+            self.assertListEqual(suggestions.suggested_users(user), expected)
+
+    def test_view(self):
+        """The subscriptions page displays suggestions, except users followed since they were computed."""
+        suggestions.compute_suggestions()
+        alix = User.objects.get(pk=2)
+        self.client.force_login(alix)
+        response = self.client.get(reverse("subscriptions"))
+        self.assertListEqual(response.context["suggestions"], [{"pk": 6, "username": "Bob", "mutual_count": 1}])
+        subscribe_to_user(alix, "Bob")
+        self.assertListEqual(self.client.get(reverse("subscriptions")).context["suggestions"], [])
+
+
+@override_settings(FEED_REVIEWS_QUERY="union")
+class UnionReviewsTestCase(ReviewUserManagerTestCase):
+    """Same expectations with the union shape of the feed reviews query."""
+
+
+@override_settings(FEED_REVIEWS_QUERY="union")
+class UnionQueryPlanTestCase(QueryPlanTestCase):
+    """Same query plan checks with the union shape of the feed reviews query."""
+
+
+def post_articles(html: str) -> list[str]:
+    """Post articles found in a page, ignoring whitespace and csrf tokens."""
+    html = re.sub(r'name="csrfmiddlewaretoken" value="\w+"', "", html)
+    segments = " ".join(html.split()).split('<article class="post')[1:]
+    return [x[: x.rfind("</article>")] for x in segments]
+
+
+class StreamingPagesTestCase(FixturesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.get(pk=2))
+
+    def test_streamed_pages_match(self):
+        """Streamed feed and posts pages display the same entries as the regular pages."""
+        for view in ["feed", "posts"]:
+            regular = self.client.get(reverse(view))
+            self.assertFalse(regular.streaming)
+            with override_settings(STREAM_PAGES=True):
+                streamed = self.client.get(reverse(view))
+            self.assertTrue(streamed.streaming)
+            chunks = [x.decode() for x in streamed.streaming_content]
+            self.assertIn("<header>", chunks[0])
+            self.assertNotIn('<article class="post', chunks[0])
+            self.assertListEqual(post_articles("".join(chunks)), post_articles(regular.content.decode()))
+
+    @override_settings(STREAM_PAGES=True, FEED_MATERIALIZED=False)
+    def test_streamed_feed_from_querysets(self):
+        """The feed is also streamed when it is not materialized."""
+        response = self.client.get(reverse("feed"))
+        html = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(post_articles(html)), 7 + 3)
+
+
+class JsonApiTestCase(FixturesTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.alix = User.objects.get(pk=2)
+        self.client.force_login(self.alix)
+
+    def _walk(self, view: str, **params) -> list[dict]:
+        """Loads all pages of a paginated endpoint."""
+        entries = []
+        cursor = ""
+        while cursor is not None:
+            response = self.client.get(reverse(view), params | {"cursor": cursor})
+            self.assertLessEqual(len(response.json()["entries"]), 20)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "application/json")
+            entries.extend(response.json()["entries"])
+            cursor = response.json()["next_cursor"]
+        return entries
+
+    def test_feed_and_posts(self):
+        """The feed and posts endpoints list all entries, page by page."""
+        for i in range(25):
+            Ticket.objects.create(user=self.alix, title=f"Ticket {i}")
+        expected = [(x.content_type, x.pk) for x in feed_page(self.alix, page_size=100).entries]
+        entries = self._walk("api_feed")
+        self.assertListEqual([(x["content_type"], x["id"]) for x in entries], expected)
+        review = next(x for x in entries if x["content_type"] == "REVIEW")
+        self.assertEqual(set(review["user"]), {"id", "username"})
+        self.assertIn("title", review["ticket"])
+        posts = self._walk("api_posts")
+        self.assertEqual(len(posts), 27)
+
+    def test_fields(self):
+        """Only the requested fields are returned."""
+        entries = self._walk("api_feed", fields="id,content_type")
+        self.assertTrue(all(set(x) == {"id", "content_type"} for x in entries))
+
+    def test_stdlib_serializer(self):
+        """The json module serializes the same data as orjson."""
+        response = self.client.get(reverse("api_feed"))
+        with patch("app.api.orjson", None):
+            self.assertEqual(self.client.get(reverse("api_feed")).json(), response.json())
+
+    def test_etag(self):
+        """Polling an unchanged feed returns a 304, until the feed changes."""
+        response = self.client.get(reverse("api_feed"))
+        etag = response["ETag"]
+        not_modified = self.client.get(reverse("api_feed"), headers={"If-None-Match": etag})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        Ticket.objects.create(user=User.objects.get(pk=3), title="Ubik")
+        changed = self.client.get(reverse("api_feed"), headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+
+    def _since(self, cursor: str):
+        return self.client.get(reverse("api_feed_since"), {"since": cursor})
+
+    def test_since(self):
+        """Polling returns the new entries only, or a 204 when nothing is new."""
+        latest = self.client.get(reverse("api_feed")).json()["latest_cursor"]
+        response = self._since(latest)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.content, b"")
+        # Alix follows Toto_23 but not ObservEr, who reviews one of Alix's tickets
+        ticket = Ticket.objects.create(user=User.objects.get(pk=3), title="New")
+        Ticket.objects.create(user=User.objects.get(pk=5), title="Unseen")
+        review = Review.objects.create(user=User.objects.get(pk=5), ticket=Ticket.objects.get(pk=1), rating=1, headline="New")
+        response = self._since(latest)
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            [(x["content_type"], x["id"]) for x in response.json()["entries"]],
+            [("REVIEW", review.pk), ("TICKET", ticket.pk)],
+        )
+        self.assertIsNone(response.json()["next_cursor"])
+        self.assertEqual(self._since(response.json()["latest_cursor"]).status_code, 204)
+
+    def test_since_positions(self):
+        """Entries since any entry of the feed are the entries above it, on both feed sources."""
+        for materialized in (True, False):
+            with self.settings(FEED_MATERIALIZED=materialized):
+                for user in User.objects.all():
+                    entries = feed.load_page(user, page_size=100).entries
+                    for i, entry in enumerate(entries):
+                        since = feed.load_since(user, posts.encode_cursor(entry), page_size=100).entries
+                        self.assertListEqual(
+                            [(x.content_type, x.pk) for x in since], [(x.content_type, x.pk) for x in entries[:i]]
+                        )
+
+    def test_subscriptions_batch(self):
+        url = reverse("api_subscriptions_batch")
+        response = self.client.post(url, {"follow": ["observer", "Bob"], "unfollow": [3]}, content_type="application/json")
+        self.assertDictEqual(
+            response.json(), {"followed": [{"pk": 6, "username": "Bob"}, {"pk": 5, "username": "ObservEr"}], "unfollowed": 1}
+        )
+        self.assertSetEqual(set(followed_users(self.alix).values_list("pk", flat=True)), {4, 5, 6})
+        self.assertEqual(self.client.post(url, "[1]", content_type="application/json").status_code, 400)
+        self.assertEqual(self.client.post(url, {"unfollow": ["x"]}, content_type="application/json").status_code, 400)
+        for data in ({"follow": "alix"}, {"unfollow": "45"}, {"follow": {"Bob": 1}}):
+            self.assertEqual(self.client.post(url, data, content_type="application/json").status_code, 400, data)
+        self.assertSetEqual(set(followed_users(self.alix).values_list("pk", flat=True)), {4, 5, 6})
+        with patch("app.api.BATCH_LIMIT", 1):
+            response = self.client.post(url, {"follow": ["observer", "Bob"]}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+    def test_errors(self):
+        """Invalid cursors and anonymous requests are rejected."""
+        self.assertEqual(self.client.get(reverse("api_feed_since")).status_code, 400)
+        self.assertEqual(self._since("garbage").status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_feed"), {"cursor": "garbage"}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("api_posts")).status_code, 401)
+
+
+class PostEntriesTestCase(FixturesTestCase):
+
+    def test_same_feed(self):
+        """Entries built from .values() rows match the model instances, on both feed sources."""
+        for user in User.objects.all():
+            expected = feed_page(user, page_size=100).entries
+            for found in (
+                feed.entries_page(user, page_size=100).entries,
+                posts.entries_page(own_or_followed_tickets(user), own_or_followed_reviews(user), page_size=100).entries,
+            ):
+                self.assertListEqual(
+                    [(x.content_type, x.pk, x.user.username, x.time_created) for x in found],
+                    [(x.content_type, x.pk, x.user.username, x.time_created) for x in expected],
+                )
+
+    def test_identity_map(self):
+        """Entries of a page share their users and reviewed tickets, ticket entries are their own."""
+        for user in User.objects.all():
+            entries = feed.entries_page(user, page_size=100).entries
+            users = {}
+            tickets = {}
+            for entry in entries:
+                self.assertIs(users.setdefault(entry.user.id, entry.user), entry.user)
+                if entry.content_type == "REVIEW":
+                    self.assertIs(tickets.setdefault(entry.ticket.id, entry.ticket), entry.ticket)
+            for entry in entries:
+                if entry.content_type == "TICKET":
+                    self.assertIsNot(tickets.get(entry.id), entry)
+
+    def test_commands_not_shared(self):
+        """Commands of a ticket entry are not displayed by the reviews of this ticket."""
+        user = User.objects.get(pk=2)
+        ticket = Ticket.objects.create(user=user, title="Ubik")
+        Review.objects.create(user=user, ticket=ticket, rating=4, headline="Great")
+        entries = posts.entries_page(posts.own_tickets(user), posts.own_reviews(user), page_size=100).entries
+        for entry in entries:
+            posts.prepare_post_entry(entry, ["edit", "delete"])
+        ticket_entry = next(x for x in entries if x.content_type == "TICKET" and x.id == ticket.pk)
+        review_entry = next(x for x in entries if x.content_type == "REVIEW" and x.ticket.id == ticket.pk)
+        self.assertTrue(ticket_entry.commands)
+        self.assertIsNone(review_entry.ticket.commands)
+
+
+class UrlHelpersTestCase(TestCase):
+    def test_reverse_id(self):
+        """Cached url templates build the same urls as reverse()."""
+        for view_name, kwarg in [
+            ("edit_ticket", "ticket_id"),
+            ("delete_ticket", "ticket_id"),
+            ("review_for_ticket", "ticket_id"),
+            ("edit_review", "review_id"),
+            ("delete_review", "review_id"),
+        ]:
+            for pk in (1, 42, 10**9):
+                self.assertEqual(reverse_id(view_name, kwarg, pk), reverse(view_name, kwargs={kwarg: pk}))
+
+    def test_add_next_url(self):
+        """The fast path for urls without a query matches the general case."""
+        request = RequestFactory().get("/posts")
+        self.assertEqual(add_next_url("/posts/tickets/edit/1", request, "posts"), "/posts/tickets/edit/1?next=posts")
+        self.assertEqual(add_next_url("/feed", request, "/a b?c=d"), "/feed?next=%2Fa+b%3Fc%3Dd")
+        self.assertEqual(add_next_url("/feed?next=x&page=2", request, "posts"), "/feed?next=posts&page=2")
+        self.assertEqual(add_next_url("/feed", request), "/feed")
+
+
+class PostFragmentsTestCase(FixturesTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _feed(self, user_id: int) -> str:
+        self.client.force_login(User.objects.get(pk=user_id))
+        return self.client.get(reverse("feed")).content.decode()
+
+    def test_shared_between_feeds(self):
+        """Post bodies rendered for one feed are reused by the other feeds."""
+        self._feed(2)
+        stats = fragment_cache.stats()
+        self.assertGreater(stats["misses"], 0)
+        # Alix and Bob both follow Toto_23 and ReviewService
+        self._feed(6)
+        self.assertGreater(fragment_cache.stats()["hits"], stats["hits"])
+
+    def test_edited_post(self):
+        """An edited post is rendered again."""
+        self.assertIn("Le Vieil Homme et La Mer", self._feed(2))
+        ticket = Ticket.objects.get(pk=3)
+        ticket.title = "The Old Man and the Sea"
+        ticket.save()
+        content = self._feed(2)
+        self.assertIn("The Old Man and the Sea", content)
+        self.assertNotIn("Le Vieil Homme et La Mer", content)
+
+    def test_commands_per_viewer(self):
+        """Commands are rendered for each viewer, around the cached bodies."""
+        self._feed(3)
+        self.client.force_login(User.objects.get(pk=2))
+        content = self.client.get(reverse("posts")).content.decode()
+        self.assertIn(reverse("edit_ticket", kwargs={"ticket_id": 1}), content)
+        self.assertGreater(fragment_cache.stats()["hits"], 0)
+
+    @override_settings(POST_FRAGMENT_CACHE=False)
+    def test_disabled(self):
+        self._feed(2)
+        self.assertEqual(fragment_cache.stats(), {"hits": 0, "misses": 0, "hit_rate": 0.0})
+
+
+class AsyncViewsTestCase(FixturesTestCase):
+
+    class async_urls:
+        """The project's urlconf, serving the async views."""
+        urlpatterns = [path("litrevu/", include(app_patterns(async_views)))]
+
+    def setUp(self):
+        cache.clear()
+
+    async def _get(self, user_id: int, url: str, data: dict = None):
+        """Requests a page from the sync views, then from the async views."""
+        user = await User.objects.aget(pk=user_id)
+        await sync_to_async(self.client.force_login)(user)
+        await self.async_client.aforce_login(user)
+        sync_response = await sync_to_async(self.client.get)(url, data)
+        with override_settings(ROOT_URLCONF=self.async_urls):
+            async_response = await self.async_client.get(url, data)
+        self.assertEqual(async_response.status_code, 200)
+        return sync_response, async_response
+
+    async def test_feed(self):
+        """The async feed displays the same pages as the sync feed."""
+        for user_id in (2, 3, 5, 6):
+            cursor = ""
+            while cursor is not None:
+                sync_response, async_response = await self._get(user_id, reverse("feed"), {"cursor": cursor})
+                expected = [(x.content_type, x.pk) for x in sync_response.context["feed_entries"]]
+                found = [(x.content_type, x.pk) for x in async_response.context["feed_entries"]]
+                self.assertListEqual(found, expected)
+                cursor = async_response.context["next_cursor"]
+
+    @override_settings(FEED_MATERIALIZED=False)
+    async def test_feed_from_posts(self):
+        await self.test_feed()
+
+    async def test_posts_and_subscriptions(self):
+        sync_response, async_response = await self._get(2, reverse("posts"))
+        self.assertListEqual(
+            [(x.content_type, x.pk, x.commands) for x in async_response.context["posts"]],
+            [(x.content_type, x.pk, x.commands) for x in sync_response.context["posts"]],
+        )
+        sync_response, async_response = await self._get(3, reverse("subscriptions"))
+        for key in ("following", "followers"):
+            self.assertListEqual(list(async_response.context[key]), list(sync_response.context[key]))
+
+    async def test_streamed_pages(self):
+        """Async views stream pages from an async iterator, with the same entries as the sync views."""
+        for view in ("feed", "posts"):
+            for materialized in (True, False):
+                with override_settings(STREAM_PAGES=True, FEED_MATERIALIZED=materialized):
+                    sync_response, async_response = await self._get(2, reverse(view))
+                    self.assertTrue(async_response.is_async)
+                    chunks = [x.decode() async for x in async_response.streaming_content]
+                    expected = await sync_to_async(b"".join)(sync_response.streaming_content)
+                self.assertNotIn('<article class="post', chunks[0])
+                self.assertListEqual(post_articles("".join(chunks)), post_articles(expected.decode()))
+                self.assertTrue(post_articles(expected.decode()))
+
+    async def test_login_required(self):
+        with override_settings(ROOT_URLCONF=self.async_urls):
+            response = await self.async_client.get(reverse("feed"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_async_middleware(self):
+        """Middleware can run in the event loop, except for the debug toolbar (disabled along with ASYNC_VIEWS)."""
+        for name in settings.MIDDLEWARE:
+            if not name.startswith("debug_toolbar."):
+                self.assertTrue(getattr(import_string(name), "async_capable", False), name)
+
+
+@override_settings(FEED_EVENTS={"BACKEND": "app.events.LocalBus", "OPTIONS": {"queue_size": 3}}, FEED_EVENTS_HEARTBEAT=0.05)
+class FeedEventsTestCase(FixturesTestCase):
+
+    def setUp(self):
+        events.bus.cache_clear()
+        self.addCleanup(events.bus.cache_clear)
+
+    def _post_ticket(self, user_id: int, title: str) -> Ticket:
+        with self.captureOnCommitCallbacks(execute=True):
+            return Ticket.objects.create(user_id=user_id, title=title)
+
+    async def _stream(self, user_id: int, last_event_id: str = None):
+        stream = events.event_stream(await User.objects.aget(pk=user_id), last_event_id)
+        self.assertEqual(await anext(stream), events.RETRY_FRAME)
+        return stream
+
+    def _entry(self, frame: bytes) -> tuple[str, dict]:
+        """The id and the entry of an event frame."""
+        fields = dict(x.split(": ", 1) for x in frame.decode().strip().split("\n"))
+        self.assertEqual(fields["event"], "entry")
+        return fields["id"], json.loads(fields["data"])
+
+    async def test_push_to_readers(self):
+        """Readers of the author's feed get the new post, other users only get keepalives."""
+        reader, other = await self._stream(2), await self._stream(1)
+        ticket = await sync_to_async(self._post_ticket)(4, "pushed")
+        event_id, entry = self._entry(await anext(reader))
+        self.assertEqual((entry["content_type"], entry["id"], entry["title"]), ("TICKET", ticket.pk, "pushed"))
+        self.assertEqual(event_id, posts.encode_cursor(ticket))
+        self.assertEqual(entry["commands"][0]["cmd_name"], "review")
+        self.assertEqual(await anext(other), events.KEEPALIVE_FRAME)
+        self.assertEqual(events.bus().connections(), 2)
+        await reader.aclose()
+        await other.aclose()
+        self.assertEqual(events.bus().connections(), 0)
+
+    async def test_last_event_id(self):
+        """Reconnecting clients first get the entries missed since their last event, oldest first."""
+        tickets = []
+        stream = await self._stream(2)
+        for i in range(3):
+            tickets.append(await sync_to_async(self._post_ticket)(4, f"ticket {i}"))
+            last_event_id, _ = self._entry(await anext(stream))
+            if i == 0:
+                first_event_id = last_event_id
+        await stream.aclose()
+        stream = await self._stream(2, first_event_id)
+        self.assertListEqual([self._entry(await anext(stream))[1]["id"] for x in tickets[1:]], [x.pk for x in tickets[1:]])
+        self.assertEqual(await anext(stream), events.KEEPALIVE_FRAME)
+        await stream.aclose()
+
+    async def test_bounded_queue(self):
+        """Slow readers keep the most recent frames only."""
+        subscription = events.bus().subscribe(2)
+        for i in range(5):
+            events.bus().dispatch([2], b"%d" % i)
+        await asyncio.sleep(0)
+        self.assertListEqual([await subscription.get(timeout=0) for i in range(3)], [b"2", b"3", b"4"])
+        self.assertIsNone(await subscription.get(timeout=0.01))
+        events.bus().unsubscribe(subscription)
+
+    async def test_sqlite_bus(self):
+        """Events published by a worker reach the subscriptions of another worker."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.sqlite3")
+            worker, publisher = events.SqliteBus(path, poll_interval=0.01), events.SqliteBus(path)
+            subscription = worker.subscribe(2)
+            await asyncio.sleep(0.05)
+            publisher.publish([2, 3], b"frame")
+            self.assertEqual(await subscription.get(timeout=1), b"frame")
+            worker.unsubscribe(subscription)
+            await worker._poller
+
+    def test_view_under_wsgi(self):
+        """WSGI handlers would hold a worker for each connection: the view refuses them."""
+        self.client.force_login(User.objects.get(pk=2))
+        response = self.client.get(reverse("feed_events"))
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+    async def test_view(self):
+        with override_settings(ROOT_URLCONF=AsyncViewsTestCase.async_urls):
+            response = await self.async_client.get(reverse("feed_events"))
+            self.assertEqual(response.status_code, 302)
+            await self.async_client.aforce_login(await User.objects.aget(pk=2))
+            response = await self.async_client.get(reverse("feed_events"))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), events.RETRY_FRAME)
+        self.assertEqual(await anext(stream), events.KEEPALIVE_FRAME)
+        await stream.aclose()
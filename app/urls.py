@@ -1,20 +1,35 @@
+from django.conf import settings
 from django.urls import path, include
 
-from . import views
+from . import views, async_views, api
 
-urlpatterns = [
-    path("", views.index, name="index"),
-    path('account/', include("my_auth.urls")),
-    path("feed", views.feed, name="feed"),
-    path("subscriptions", views.subscriptions, name="subscriptions"),
-    path("subscriptions", views.subscriptions, name="add_subscription"),
-    path("subscriptions/cancel/<int:followed_user_id>", views.subscription_cancel, name="cancel_subscription"),
-    path("posts/tickets/new", views.create_ticket, name="new_ticket"),
-    path("posts/tickets/edit/<int:ticket_id>", views.edit_ticket, name="edit_ticket"),
-    path("posts/tickets/delete/<int:ticket_id>", views.delete_ticket, name="delete_ticket"),
-    path("posts/review/for_ticket/<int:ticket_id>", views.review_for_ticket, name="review_for_ticket"),
-    path("posts/review/create_review", views.create_review, name="create_review"),
-    path("posts/review/edit/<int:review_id>", views.edit_review, name="edit_review"),
-    path("posts/review/delete/<int:review_id>", views.delete_review, name="delete_review"),
-    path("posts", views.posts, name="posts"),
-]
+
+def app_patterns(pages) -> list:
+    """The app's url patterns, pages being the module serving the feed, posts and subscriptions pages:
+    app.views, or app.async_views for ASGI deployments."""
+    return [
+        path("", views.index, name="index"),
+        path('account/', include("my_auth.urls")),
+        path("feed", pages.feed, name="feed"),
+        path("feed/events", async_views.feed_events, name="feed_events"),
+        path("subscriptions", pages.subscriptions, name="subscriptions"),
+        path("subscriptions", pages.subscriptions, name="add_subscription"),
+        path("subscriptions/cancel/<int:followed_user_id>", views.subscription_cancel, name="cancel_subscription"),
+        path("posts/tickets/new", views.create_ticket, name="new_ticket"),
+        path("posts/tickets/edit/<int:ticket_id>", views.edit_ticket, name="edit_ticket"),
+        path("posts/tickets/delete/<int:ticket_id>", views.delete_ticket, name="delete_ticket"),
+        path("posts/review/for_ticket/<int:ticket_id>", views.review_for_ticket, name="review_for_ticket"),
+        path("posts/review/create_review", views.create_review, name="create_review"),
+        path("posts/review/edit/<int:review_id>", views.edit_review, name="edit_review"),
+        path("posts/review/delete/<int:review_id>", views.delete_review, name="delete_review"),
+        path("posts", pages.posts, name="posts"),
+        path("api/feed", api.feed, name="api_feed"),
+        path("api/feed/since", api.feed_since, name="api_feed_since"),
+        path("api/posts", api.posts, name="api_posts"),
+        path("api/users/suggestions", api.username_suggestions, name="api_username_suggestions"),
+        path("api/subscriptions/batch", api.subscriptions_batch, name="api_subscriptions_batch"),
+        path("api/metrics", api.metrics, name="api_metrics"),
+    ]
+
+
+urlpatterns = app_patterns(async_views if settings.ASYNC_VIEWS else views)
@@ -1,16 +1,21 @@
-from itertools import chain
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpRequest, HttpResponse, Http404
 from .models import User, Ticket, Review
+from .entries import TicketEntry, ReviewEntry
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django import urls
 from . import forms
 from django.utils.translation import gettext as _
 from django.core.exceptions import ObjectDoesNotExist
 from . import subscriptions as subscription_tools
+from . import suggestions as suggestion_tools
 from . import posts as post_tools
+from . import feed as feed_tools
+from . import access, feed_cache
 from . import helpers
+from . import streaming
 
 
 def index(request: HttpRequest) -> HttpResponse:
@@ -25,37 +30,68 @@ def index(request: HttpRequest) -> HttpResponse:
 
 @login_required
 def feed(request: HttpRequest) -> HttpResponse:
-    """Display the user's feed"""
-    tickets = []
-    for t in post_tools.own_or_followed_tickets(request.user):
-        cmd = ["review"] if t.can_review else None
-        tickets.append(post_tools.prepare_post_entry(t, cmd))
-    reviews = [
-        post_tools.prepare_post_entry(x)
-        for x in post_tools.own_or_followed_reviews(request.user)
-    ]
-    entries = sorted(
-        chain(tickets, reviews), key=lambda x: x.get("time_created"), reverse=True
-    )
-    context = {"feed_entries": entries}
+    """Display a page of the user's feed.
+    The page to display is set by the "cursor" query parameter.
+
+    When STREAM_PAGES is set, the whole feed is streamed instead."""
+    if settings.STREAM_PAGES:
+        return _stream_feed(request)
+    cursor = request.GET.get("cursor")
+    try:
+        entries, next_cursor = feed_cache.get_or_load(
+            request.user.pk, cursor, lambda: feed_tools.prepared_page(request.user, cursor)
+        )
+    except ValueError:
+        raise Http404()
+    context = {"feed_entries": entries, "next_cursor": next_cursor}
     return render(request, "app/feed/feed.html", context)
 
 
+def _stream_feed(request: HttpRequest) -> HttpResponse:
+    """Streams the whole feed, entries are loaded and rendered lazily."""
+    entries = (
+        post_tools.prepare_post_entry(x, feed_tools.entry_commands(x))
+        for x in feed_tools.iter_feed(request.user, chunk_size=settings.STREAM_CHUNK_SIZE)
+    )
+    return streaming.stream_page(request, "app/feed/feed.html", {}, entries)
+
+
 @login_required
 def subscriptions(request: HttpRequest) -> forms.SubscribeToUserForm:
-    """Display the subscription page to subscribe to other users."""
+    """Display the subscription page to subscribe to other users.
+    Followed users and followers are paginated, by the "following" and "followers" query parameters."""
     if request.POST.get("action") == "validate_subscription":
         subscribe_form = _handle_subscription_form(request)
     else:
         subscribe_form = forms.SubscribeToUserForm()
-    following = subscription_tools.followed_users(request.user).values("pk", "username")
-    followers = subscription_tools.followers(request.user).values("pk", "username")
-    context = {
+    try:
+        following = subscription_tools.followed_users_page(request.user, request.GET.get("following"))
+        followers = subscription_tools.followers_page(request.user, request.GET.get("followers"))
+    except ValueError:
+        raise Http404()
+    suggestions = suggestion_tools.suggested_users(request.user)
+    context = subscriptions_context(request, subscribe_form, following, followers, suggestions)
+    return render(request, "app/subscriptions/subscriptions.html", context=context)
+
+
+def subscriptions_context(
+    request: HttpRequest,
+    subscribe_form: forms.SubscribeToUserForm,
+    following: subscription_tools.UsersPage,
+    followers: subscription_tools.UsersPage,
+    suggestions: list[dict],
+) -> dict:
+    """Context of the subscriptions page. Totals are read from the user's counters."""
+    return {
+        "suggestions": suggestions,
         "subscribe_form": subscribe_form,
-        "following": following,
-        "followers": followers,
+        "following": following.users,
+        "followers": followers.users,
+        "following_count": request.user.following_count,
+        "followers_count": request.user.followers_count,
+        "following_next_cursor": following.next_cursor,
+        "followers_next_cursor": followers.next_cursor,
     }
-    return render(request, "app/subscriptions/subscriptions.html", context=context)
 
 
 def _handle_subscription_form(request: HttpRequest):
@@ -72,6 +108,7 @@ def _handle_subscription_form(request: HttpRequest):
                 "username": followed.username
             }
             messages.success(request, success_msg)
+            request.user.refresh_from_db(fields=["following_count"])
         except ObjectDoesNotExist:
             messages.error(request, _("Operation failed!"))
             form.add_error(
@@ -118,7 +155,7 @@ def create_ticket(request: HttpRequest) -> HttpResponse:
 @login_required
 def edit_ticket(request: HttpRequest, ticket_id: int) -> HttpResponse:
     """Edit an existing ticket"""
-    ticket_instance = get_object_or_404(Ticket, pk=ticket_id, user=request.user)
+    ticket_instance = get_object_or_404(access.editable_tickets(request.user), pk=ticket_id)
     edit_url = urls.reverse("edit_ticket", kwargs={"ticket_id": ticket_id})
     success_msg_tpl = _("Updated ticket #%(ticket_id)i: %(ticket_title)s")
     return _edit_or_create_ticket(
@@ -167,7 +204,7 @@ def _edit_or_create_ticket(
 @login_required
 def delete_ticket(request: HttpRequest, ticket_id: int):
     """Deletes a ticket belonging to the current user."""
-    ticket: Ticket = get_object_or_404(Ticket, pk=ticket_id, user=request.user)
+    ticket: Ticket = get_object_or_404(access.editable_tickets(request.user), pk=ticket_id)
     ticket.delete()
     messages.success(
         request,
@@ -182,11 +219,7 @@ def review_for_ticket(request: HttpRequest, ticket_id: int):
     """Creates a review in reply to a ticket.
     Ticket must be visible in the user's feed, otherwise the view will raise a 404.
     """
-    ticket_instance = get_object_or_404(
-        post_tools.own_or_followed_tickets(request.user), pk=ticket_id
-    )
-    if not ticket_instance.can_review:
-        raise Http404()
+    ticket_instance = get_object_or_404(access.reviewable_tickets(request.user), pk=ticket_id)
     review_instance = Review(ticket=ticket_instance, user=request.user)
     return _edit_or_create_review(
         request=request,
@@ -201,13 +234,11 @@ def review_for_ticket(request: HttpRequest, ticket_id: int):
 @login_required
 def edit_review(request: HttpRequest, review_id: int):
     """Updates an existing review."""
-    review_instance = get_object_or_404(Review, pk=review_id, user=request.user)
+    review_instance = get_object_or_404(access.editable_reviews(request.user), pk=review_id)
     return _edit_or_create_review(
         request=request,
         usecase="update",
-        ticket_instance=Ticket.objects.select_related("user").get(
-            pk=review_instance.ticket_id
-        ),
+        ticket_instance=review_instance.ticket,
         review_instance=review_instance,
         success_msg_tpl=_("Updated your review in reply to ticket #%(ticket_id)d"),
         edit_url=urls.reverse("edit_review", kwargs={"review_id": review_id}),
@@ -278,45 +309,44 @@ def create_review(request: HttpRequest):
 @login_required
 def delete_review(request: HttpRequest, review_id: int):
     """Deletes a review written by the current user."""
-    review_instance = get_object_or_404(Review, pk=review_id, user=request.user)
+    review_instance = get_object_or_404(access.editable_reviews(request.user), pk=review_id)
     review_instance.delete()
     messages.success(
         request,
         _("Deleted Review #%(review_id)d to ticket #%(ticket_id)d")
-        % ({"review_id": review_id, "ticket_id": review_instance.ticket.pk}),
+        % ({"review_id": review_id, "ticket_id": review_instance.ticket_id}),
     )
     return helpers.redirect_next(request, "feed")
 
 
 @login_required
 def posts(request: HttpRequest) -> HttpResponse:
-    """Display all reviews and tickets posted by a user."""
-    tickets = Ticket.objects.select_related("user").filter(user=request.user)
-    reviews = (
-        Review.objects.select_related("user")
-        .select_related("ticket")
-        .select_related("ticket__user")
-        .filter(user=request.user)
+    """Display all reviews and tickets posted by a user.
+    The page is streamed when STREAM_PAGES is set."""
+    tickets = post_tools.own_tickets(request.user)
+    reviews = post_tools.own_reviews(request.user)
+    entries = (
+        posts_entry(x, request)
+        for x in post_tools.iter_entries(tickets, reviews, chunk_size=settings.STREAM_CHUNK_SIZE)
     )
-    posts = sorted(
-        [
-            post_tools.prepare_post_entry(
-                entry=x,
-                with_commands=[
-                    {
-                        "cmd_name": "edit",
-                        "url": helpers.add_next_url(x.edit_url, request, "posts"),
-                    },
-                    {
-                        "cmd_name": "delete",
-                        "url": helpers.add_next_url(x.delete_url, request, "posts"),
-                    },
-                ],
-            )
-            for x in chain(tickets, reviews)
+    if settings.STREAM_PAGES:
+        return streaming.stream_page(request, "app/posts/posts.html", {}, entries)
+    context = {"posts": list(entries)}
+    return render(request, "app/posts/posts.html", context=context)
+
+
+def posts_entry(entry: TicketEntry | ReviewEntry, request: HttpRequest) -> TicketEntry | ReviewEntry:
+    """Prepares an entry of the posts page, with edit and delete commands."""
+    return post_tools.prepare_post_entry(
+        entry=entry,
+        with_commands=[
+            {
+                "cmd_name": "edit",
+                "url": helpers.add_next_url(entry.edit_url, request, "posts"),
+            },
+            {
+                "cmd_name": "delete",
+                "url": helpers.add_next_url(entry.delete_url, request, "posts"),
+            },
         ],
-        key=lambda x: x.get("time_created"),
-        reverse=True,
     )
-    context = {"posts": posts}
-    return render(request, "app/posts/posts.html", context=context)
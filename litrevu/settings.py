@@ -82,6 +82,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The local memory cache is private to each process:
+# use a shared backend (memcached, redis...) when running several workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'litrevu',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -118,6 +131,42 @@ AUTH_PASSWORD_VALIDATORS = [
     }
 ]
 
+# Password hashing: the first hasher hashes new passwords, the others check older hashes.
+# PBKDF2 runs PASSWORD_PBKDF2_ITERATIONS iterations, Django's default (870000) when None: each login
+# costs about 0.6 ms of CPU per thousand iterations. Compare costs with: python manage.py benchlogin
+PASSWORD_HASHERS = [
+    "my_auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+PASSWORD_PBKDF2_ITERATIONS = None
+
+# Failed logins allowed per client IP and per username within a sliding WINDOW of seconds,
+# further logins are rejected before hashing their password (see my_auth/throttle.py).
+# "my_auth.throttle.MemoryStore" counts failures in each worker: use "my_auth.throttle.CacheStore"
+# with a shared cache backend (see CACHES) to count them across workers.
+LOGIN_THROTTLE = {
+    "STORE": "my_auth.throttle.MemoryStore",
+    "OPTIONS": {"max_keys": 100_000},
+    "WINDOW": 300,
+    "LIMITS": {"ip": 30, "username": 10},
+}
+
+# Number of threads hashing passwords for the async login and registration views (see my_auth/async_views.py)
+PASSWORD_HASHING_WORKERS = 4
+
+# Sessions are read from the cache, and written to both the cache and the database
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Users of authenticated requests are cached for USER_CACHE_TIMEOUT seconds (see my_auth/backends.py).
+# Sessions store the path of the backend that logged their user in: sessions opened with another backend
+# end, their users log in again once. ModelBackend is not kept in the list to keep them: failed logins
+# would then check their password twice.
+AUTHENTICATION_BACKENDS = ["my_auth.backends.CachedModelBackend"]
+USER_CACHE_TIMEOUT = 60
+
 # Custom User model
 # see https://docs.djangoproject.com/en/5.1/topics/auth/customizing/#auth-custom-user
 AUTH_USER_MODEL = "app.User"
@@ -194,8 +243,57 @@ FILE_UPLOAD_HANDLERS = [
 MEDIA_ROOT = Path(BASE_DIR, "media/").resolve()
 MEDIA_URL = "/media/"
 
+# Read feeds from the materialized feed table (see app/feed.py)
+# instead of querying tickets and reviews on each page view.
+FEED_MATERIALIZED = True
+
+# Shape of the query finding the reviews displayed in a feed (see app/posts.py):
+# "or" or "union". Compare both with: python manage.py benchfeedqueries
+FEED_REVIEWS_QUERY = "or"
+
+# Lifetime of a cached feed page, in seconds (see app/feed_cache.py).
+# Cached pages are dropped as soon as a post or subscription changes the feed.
+FEED_CACHE_TIMEOUT = 600
+
+# Number of users whose followed users are cached by each process (see app/graph_cache.py),
+# and their lifetime in seconds: the longest a worker may miss a subscription change
+# made in another worker without a shared cache backend (see CACHES).
+GRAPH_CACHE_SIZE = 10000
+GRAPH_CACHE_TIMEOUT = 60
+
+# Cache the rendered body of each post, shared by all pages displaying it (see app/fragment_cache.py).
+# Cached bodies are versioned by the post's last update, POST_FRAGMENT_TIMEOUT is in seconds.
+POST_FRAGMENT_CACHE = True
+POST_FRAGMENT_TIMEOUT = 3600
+
+# Stream the feed and posts pages: the page layout is sent straight away,
+# then entries are rendered as they are loaded, STREAM_CHUNK_SIZE rows at a time.
+# The streamed feed displays all entries at once, without pagination nor cache.
+STREAM_PAGES = False
+STREAM_CHUNK_SIZE = 100
+
+# Serve the feed, posts, subscriptions, login and registration pages with async views
+# (see app/async_views.py and my_auth/async_views.py),
+# when running under ASGI. Compare with: python manage.py benchasgi
+ASYNC_VIEWS = False
+
+# Push new feed entries to connected users with server-sent events (see app/events.py), under ASGI.
+# The "app.events.LocalBus" backend only reaches users connected to the publishing worker:
+# use "app.events.SqliteBus" to share events between the workers of a host.
+FEED_EVENTS = {
+    "BACKEND": "app.events.LocalBus",
+    "OPTIONS": {"queue_size": 20},
+}
+# FEED_EVENTS = {
+#     "BACKEND": "app.events.SqliteBus",
+#     "OPTIONS": {"path": BASE_DIR / "events.sqlite3", "queue_size": 20, "poll_interval": 0.5},
+# }
+# Seconds between keepalive comments sent on idle connections
+FEED_EVENTS_HEARTBEAT = 30
+
 # Django Debug Toolbar
-DISPLAY_DEBUG_TOOLBAR = True
+# Its middleware is synchronous only: under ASGI, each request would go through a thread adapter.
+DISPLAY_DEBUG_TOOLBAR = not ASYNC_VIEWS
 if DISPLAY_DEBUG_TOOLBAR:
     INSTALLED_APPS.append('debug_toolbar')
     MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
@@ -5,3 +5,7 @@ class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'my_auth'
     label = 'my_auth'
+
+    def ready(self):
+        # connect signal receivers
+        from . import signals  # noqa: F401
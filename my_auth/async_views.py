@@ -0,0 +1,104 @@
+"""Asynchronous versions of the login and registration views, served when ASYNC_VIEWS is set
+(see settings.py) and the app runs under ASGI (see litrevu/asgi.py).
+
+Hashing a password takes tens of milliseconds of CPU (see PASSWORD_HASHERS): authenticate() and
+create_user() are handed over to a thread pool of PASSWORD_HASHING_WORKERS threads, so that logins
+never block the event loop, and at most PASSWORD_HASHING_WORKERS passwords are hashed at once.
+Other queries run in Django's thread for synchronous code, as with sync_to_async().
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, partial, wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import alogin, authenticate
+from django.db import IntegrityError, close_old_connections
+from django.http import HttpRequest, HttpResponse
+from django.shortcuts import render
+from django.utils.translation import gettext as _
+from django.contrib.auth import password_validation
+from app.models import User
+from .forms import AuthForm, RegisterForm
+from . import throttle
+from .views import _redirect_url, _redirect_after_authentication
+
+
+@cache
+def hashing_executor() -> ThreadPoolExecutor:
+    """The thread pool hashing passwords, created on first use."""
+    return ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix="password-hashing")
+
+
+async def run_hashing(function, *args, **kwargs):
+    """Runs function in the password hashing thread pool, and waits for its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hashing_executor(), partial(_with_connections(function), *args, **kwargs))
+
+
+def _with_connections(function):
+    """Pool threads outlive requests: their database connections are closed like at the end of a request."""
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return wrapper
+
+
+async def register(request: HttpRequest) -> HttpResponse:
+    """Register a new user and redirect to user feed on success, see my_auth.views.register()."""
+    context = {}
+    if request.POST.get("action") == "register":
+        register_form = RegisterForm(request.POST)
+        if await sync_to_async(register_form.is_valid)():
+            username = register_form.cleaned_data.get("username")
+            password = register_form.cleaned_data.get("password")
+            try:
+                user = await run_hashing(User.objects.create_user, username=username, password=password)
+                await alogin(request, user)
+                return _redirect_after_authentication(request)
+            except IntegrityError as e:
+                register_form.add_error(field="username", error=e)
+            except Exception as e:
+                register_form.add_error(field=None, error=e)
+    else:
+        register_form = RegisterForm()
+    request.user = await request.auser()
+    context["register_form"] = register_form
+    context["password_help_text"] = password_validation.password_validators_help_texts()
+    context["redirect_after_login"] = _redirect_url(request)
+    return render(request, "app/register.html", context)
+
+
+async def auth(request: HttpRequest) -> HttpResponse:
+    """Autenticate an existing user and redirect to user feed on success, see my_auth.views.auth()."""
+    context = {}
+    status = 200
+    if request.POST.get("action") == "login":
+        auth_form = AuthForm(request.POST)
+        if auth_form.is_valid():
+            username = auth_form.cleaned_data.get("username")
+            password = auth_form.cleaned_data.get("password")
+            # the throttle's counters may be in a shared cache backend, see CACHES: read them off the event loop
+            if not await sync_to_async(throttle.allow_login)(request, username):
+                auth_form.add_error(field=None, error=_("Too many failed logins, try again later"))
+                status = 429
+            else:
+                user = await run_hashing(authenticate, request=request, username=username, password=password)
+                if user is not None:
+                    await alogin(request, user)
+                    return _redirect_after_authentication(request)
+                else:
+                    await sync_to_async(throttle.login_failed)(request, username)
+                    auth_form.add_error(field=None, error=_("Wrong login"))
+        else:
+            auth_form.add_error(field=None, error="Invalid data")
+    else:
+        auth_form = AuthForm()
+    request.user = await request.auser()
+    context["auth_form"] = auth_form
+    context["redirect_after_login"] = _redirect_url(request)
+    return render(request, "app/index.html", context, status=status)
@@ -0,0 +1,35 @@
+"""Authentication backend loading the users of authenticated requests from Django's cache.
+
+Every request authenticated by a session loads its user: CachedModelBackend keeps users in the cache
+for USER_CACHE_TIMEOUT seconds (see settings.py). Cached users are dropped when saved or deleted,
+which covers password and profile changes, and when their subscription counters change (see app.signals).
+Workers only drop the users cached by the others with a shared cache backend (see CACHES).
+"""
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from typing import Iterable
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose get_user() reads the user from the cache first.
+    Async requests load their user with django.contrib.auth.aget_user(), which runs get_user() in a thread."""
+
+    def get_user(self, user_id):
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, timeout=settings.USER_CACHE_TIMEOUT)
+        return user
+
+
+def invalidate_users(user_ids: Iterable[int]):
+    """Drops the cached users, reloaded from the database by their next request."""
+    cache.delete_many([_user_key(x) for x in set(user_ids)])
+
+
+def _user_key(user_id) -> str:
+    return f"auth_user:{user_id}"
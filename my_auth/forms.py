@@ -2,10 +2,16 @@ from django import forms
 from django.core import validators
 from django.core.exceptions import ValidationError
 from django.contrib.auth import password_validation
+from django.utils.functional import lazy
 from django.utils.translation import gettext as _
 from app.models import User
 
 
+def password_help_text() -> str:
+    """Help texts of all password validators, in the active language."""
+    return "\n".join(password_validation.password_validators_help_texts())
+
+
 class AuthForm(forms.Form):
     """Authentication form requires only two fields, username and password.
     Validation process differs from Registration form."""
@@ -32,7 +38,8 @@ class RegisterForm(forms.ModelForm):
     password = forms.CharField(
         required=True,
         widget=forms.PasswordInput(render_value=False),
-        help_text="\n".join(password_validation.password_validators_help_texts())
+        # evaluated when rendered, in the language of the request: not once at import
+        help_text=lazy(password_help_text, str)(),
     )
 
     password_confirm = forms.CharField(
@@ -42,7 +49,7 @@ class RegisterForm(forms.ModelForm):
 
     def clean_username(self):
         username = self.cleaned_data.get("username")
-        if User.objects.filter(username__iexact=username).exists():
+        if User.objects.filter(username_key=username.lower()).exists():
             self.add_error("username", _("A user with this username already exists."))
         return username
 
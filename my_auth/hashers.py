@@ -0,0 +1,18 @@
+"""Password hashers with a cost set in settings.py, see PASSWORD_HASHERS.
+
+Hashes keep the algorithm name of Django's hashers: existing hashes are still checked,
+and upgraded to the configured cost at the user's next login.
+Compare the login latency and throughput of several costs with: python manage.py benchlogin
+"""
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2 with the number of iterations set by PASSWORD_PBKDF2_ITERATIONS,
+    Django's default when not set."""
+
+    @property
+    def iterations(self) -> int:
+        return getattr(settings, "PASSWORD_PBKDF2_ITERATIONS", None) or hashers.PBKDF2PasswordHasher.iterations
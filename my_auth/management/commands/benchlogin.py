@@ -0,0 +1,84 @@
+import asyncio
+import statistics
+import time
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from app.models import User
+from my_auth.async_views import run_hashing
+
+USERNAME = "bench_login"
+PASSWORD = "Bench-l0gin-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the login latency and throughput with the configured PASSWORD_HASHERS:"
+        " authenticate() called one at a time, then by concurrent logins through the async views' hashing"
+        " thread pool (see my_auth.async_views). PBKDF2 iteration counts can be compared with --iterations."
+        " The benchmark user is deleted when the benchmark ends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations", type=int, nargs="*", default=[],
+            help="PBKDF2 iteration counts to compare, PASSWORD_PBKDF2_ITERATIONS by default.",
+        )
+        parser.add_argument("--logins", type=int, default=50, help="Number of logins per measure.")
+        parser.add_argument(
+            "--concurrency", type=int, default=None,
+            help="Number of concurrent logins, PASSWORD_HASHING_WORKERS by default.",
+        )
+
+    def handle(self, *args, **kwargs):
+        n_logins = kwargs["logins"]
+        concurrency = kwargs["concurrency"] or settings.PASSWORD_HASHING_WORKERS
+        user = User.objects.create_user(username=USERNAME, password=PASSWORD)
+        try:
+            for iterations in kwargs["iterations"] or [settings.PASSWORD_PBKDF2_ITERATIONS]:
+                with override_settings(PASSWORD_PBKDF2_ITERATIONS=iterations):
+                    hasher = get_hasher()
+                    # hashed with this cost: authenticate() would upgrade it on the first login otherwise
+                    user.set_password(PASSWORD)
+                    user.save(update_fields=["password"])
+                    cost = getattr(hasher, "iterations", None)
+                    self.stdout.write("%s%s:" % (hasher.algorithm, " %d iterations" % cost if cost else ""))
+                    self._measure_latency(n_logins)
+                    self._measure_throughput(n_logins, concurrency)
+        finally:
+            user.delete()
+
+    def _measure_latency(self, n_logins: int):
+        timings = []
+        for i in range(n_logins):
+            start = time.perf_counter()
+            if authenticate(username=USERNAME, password=PASSWORD) is None:
+                raise RuntimeError("login failed")
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        self.stdout.write(
+            "  one at a time: median %.1f ms, p95 %.1f ms, %.1f logins/s"
+            % (statistics.median(timings), timings[int(len(timings) * 0.95) - 1], 1000 / statistics.mean(timings))
+        )
+
+    def _measure_throughput(self, n_logins: int, concurrency: int):
+        async def logins():
+            pending = asyncio.Semaphore(concurrency)
+
+            async def login():
+                async with pending:
+                    return await run_hashing(authenticate, username=USERNAME, password=PASSWORD)
+
+            return await asyncio.gather(*(login() for i in range(n_logins)))
+
+        start = time.perf_counter()
+        users = asyncio.run(logins())
+        elapsed = time.perf_counter() - start
+        if None in users:
+            raise RuntimeError("login failed")
+        self.stdout.write(
+            "  %d concurrent logins, %d hashing threads: %.1f logins/s"
+            % (concurrency, settings.PASSWORD_HASHING_WORKERS, n_logins / elapsed)
+        )
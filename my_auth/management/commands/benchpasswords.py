@@ -0,0 +1,93 @@
+import random
+import string
+import time
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from my_auth.validators import SPECIAL_CHARS, StrengthPasswordValidator, password_stats, password_strength
+
+
+def _naive_password_stats(password: str) -> dict[str, float]:
+    """Character types counted with a dict and str methods on each character. Kept as a reference."""
+    upper = lower = digit = alpha = special = 0
+    chars_map = {}
+    for c in password:
+        chars_map[c] = chars_map.get(c, 0) + 1
+        if str.isalpha(c):
+            alpha += 1
+            if str.isupper(c):
+                upper += 1
+            else:
+                lower += 1
+        elif str.isnumeric(c):
+            digit += 1
+        elif c in SPECIAL_CHARS:
+            special += 1
+    return {
+        "diversity": len(chars_map) / len(password),
+        "alpha": alpha,
+        "lower": lower,
+        "upper": upper,
+        "digit": digit,
+        "special": special,
+    }
+
+
+def _random_example(required_strength: float) -> str:
+    """Password example grown from a shuffled character table, as help texts used to compute it. Kept as a reference."""
+    table = list(string.ascii_lowercase + string.ascii_uppercase + string.digits) + SPECIAL_CHARS
+    random.shuffle(table)
+    i = 1
+    while password_strength("".join(table[:i])) < required_strength:
+        i += 1
+    return "".join(table[:i])
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the throughput of the password strength validator (see my_auth.validators):"
+        " password stats, validate() and help texts, on random passwords."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--passwords", type=int, default=100_000, help="Number of passwords.")
+        parser.add_argument("--strength", default="PASSWORD_STRENGTH_MEDIUM", help="Required strength.")
+
+    def handle(self, *args, **kwargs):
+        rng = random.Random(0)
+        alphabet = string.ascii_letters + string.digits + "".join(SPECIAL_CHARS) + "@_ é"
+        passwords = ["".join(rng.choices(alphabet, k=rng.randint(6, 24))) for i in range(kwargs["passwords"])]
+        validator = StrengthPasswordValidator(min_strength=kwargs["strength"], min_length=8)
+        self.stdout.write("%d passwords of 6 to 24 characters" % len(passwords))
+
+        self._measure("naive stats", passwords, _naive_password_stats)
+        self._measure("table stats", passwords, password_stats)
+
+        def validate(password: str):
+            try:
+                validator.validate(password)
+            except ValidationError:
+                pass
+
+        self._measure("validate()", passwords, validate)
+
+        n = 1000
+        start = time.perf_counter()
+        for i in range(n):
+            _random_example(validator.min_strength)
+        elapsed = time.perf_counter() - start
+        self.stdout.write("%-14s %.1f µs per help text" % ("random search", elapsed * 1e6 / n))
+        start = time.perf_counter()
+        for i in range(n):
+            validator.get_help_text()
+        elapsed = time.perf_counter() - start
+        self.stdout.write("%-14s %.1f µs per help text" % ("cached", elapsed * 1e6 / n))
+
+    def _measure(self, variant: str, passwords: list[str], function):
+        start = time.perf_counter()
+        for password in passwords:
+            function(password)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            "%-14s %.0f passwords/s, %.2f µs per password"
+            % (variant, len(passwords) / elapsed, elapsed * 1e6 / len(passwords))
+        )
@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from app.models import User, UserFollows, Ticket
+
+PAGES = ["feed", "posts", "subscriptions"]
+
+SETUPS = [
+    (
+        "db sessions, ModelBackend",
+        {
+            "SESSION_ENGINE": "django.contrib.sessions.backends.db",
+            "AUTHENTICATION_BACKENDS": ["django.contrib.auth.backends.ModelBackend"],
+        },
+    ),
+    (
+        "cached_db sessions, CachedModelBackend",
+        {
+            "SESSION_ENGINE": "django.contrib.sessions.backends.cached_db",
+            "AUTHENTICATION_BACKENDS": ["my_auth.backends.CachedModelBackend"],
+        },
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the queries run by the feed, posts and subscriptions pages with database sessions and users,"
+        " and with cached sessions and users (see my_auth.backends)."
+        " Each page is requested once before counting, so that caches are filled."
+        " The synthetic users and posts are rolled back when the benchmark ends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=10, help="Number of requests per page.")
+
+    def handle(self, *args, **kwargs):
+        n_requests = kwargs["requests"]
+        setup_test_environment()
+        try:
+            with transaction.atomic():
+                reader = self._populate()
+                results = {label: self._count(reader, config, n_requests) for label, config in SETUPS}
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+        (before_label, before), (after_label, after) = results.items()
+        self.stdout.write("queries per request (sessions and users):")
+        self.stdout.write("%-15s %-28s %-40s %s" % ("page", before_label, after_label, "saved"))
+        for page in PAGES:
+            self.stdout.write(
+                "%-15s %-28s %-40s %.1f"
+                % (
+                    page,
+                    "%.1f (%.1f)" % before[page],
+                    "%.1f (%.1f)" % after[page],
+                    before[page][0] - after[page][0],
+                )
+            )
+
+    def _populate(self) -> User:
+        reader = User.objects.create(username="bench_sessions_reader", password="!")
+        authors = User.objects.bulk_create([User(username=f"bench_sessions_{i}", password="!") for i in range(5)])
+        UserFollows.objects.bulk_create([UserFollows(user=reader, followed_user=x) for x in authors])
+        for author in authors:
+            Ticket.objects.create(user=author, title="Bench ticket")
+        return reader
+
+    def _count(self, reader: User, config: dict, n_requests: int) -> dict[str, tuple[float, float]]:
+        """Average queries per request of each page: all of them, and those reading sessions and users."""
+        with override_settings(**config):
+            cache.clear()
+            client = Client()
+            client.force_login(reader)
+            counts = {}
+            for page in PAGES:
+                client.get(reverse(page))
+                with CaptureQueriesContext(connection) as ctx:
+                    for i in range(n_requests):
+                        client.get(reverse(page))
+                auth = [x for x in ctx.captured_queries if '"django_session"' in x["sql"] or 'FROM "app_user"' in x["sql"]]
+                counts[page] = (len(ctx.captured_queries) / n_requests, len(auth) / n_requests)
+        return counts
@@ -0,0 +1,15 @@
+"""Keeps the users cached by my_auth.backends up to date.
+Receivers are connected when the app is ready, see my_auth.apps.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from app.models import User
+from .backends import invalidate_users
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance: User, **kwargs):
+    """Drops the cached user after a password or profile change."""
+    invalidate_users([instance.pk])
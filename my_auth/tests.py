@@ -1,3 +1,249 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse, path, include
+from django.utils import translation
+from unittest.mock import patch
+from app.models import User, UserFollows
+from app import metrics, views as app_views
+from app.urls import app_patterns
+from my_auth import async_views, throttle, validators, views
+from my_auth.urls import auth_patterns
+from my_auth.validators import StrengthPasswordValidator, password_stats, password_strength
+import asyncio
+import time
 
-# Create your tests here.
+
+class PasswordStatsTestCase(TestCase):
+    def test_char_types(self):
+        """ASCII and other characters are classified like str methods do."""
+        self.assertDictEqual(
+            password_stats("aB1!é@ ²É漢"),
+            {"diversity": 1.0, "alpha": 5, "lower": 3, "upper": 2, "digit": 2, "special": 1},
+        )
+        self.assertEqual(password_stats("aaAA")["diversity"], 0.5)
+        self.assertEqual(password_stats("")["diversity"], 0)
+
+    def test_long_password(self):
+        """The entropy of long passwords does not overflow."""
+        self.assertEqual(password_strength(validators.EXAMPLE_CHARS * 5), 1.0)
+
+
+class PasswordHelpTextTestCase(TestCase):
+    def test_min_length(self):
+        """The length hint is the length of the shortest password meeting the strength requirement."""
+        for strength in (0.05, validators.PASSWORD_STRENGTH_LOW, validators.PASSWORD_STRENGTH_HIGHEST, 1.0):
+            length = StrengthPasswordValidator(min_strength=strength).length_hint()
+            self.assertGreaterEqual(password_strength(validators.EXAMPLE_CHARS[:length]), strength)
+            self.assertLess(password_strength(validators.EXAMPLE_CHARS[: length - 1]), strength)
+        self.assertEqual(StrengthPasswordValidator("PASSWORD_STRENGTH_LOW").length_hint(), 7)
+        self.assertEqual(StrengthPasswordValidator("PASSWORD_STRENGTH_LOW", min_length=12).length_hint(), 12)
+
+    def test_cached_per_language(self):
+        """Help texts are built once per language."""
+        validator = StrengthPasswordValidator(min_strength="PASSWORD_STRENGTH_HIGH", min_digit=1)
+        with patch.object(validators, "password_strength", wraps=password_strength) as strength:
+            with translation.override("fr"):
+                french = validator.get_help_text()
+                self.assertEqual(validator.get_help_text(), french)
+            with translation.override("en"):
+                self.assertNotEqual(validator.get_help_text(), french)
+        # the shortest example is searched once, then cached for this strength
+        self.assertLessEqual(strength.call_count, len(validators.EXAMPLE_CHARS))
+
+    def test_register_page(self):
+        response = self.client.get(reverse("register"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("password_help_text", response.context)
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class AsyncAuthViewsTestCase(TransactionTestCase):
+    """Passwords are hashed in pool threads, which only see committed data: these tests run outside a transaction."""
+
+    class async_urls:
+        """The project's urlconf, serving the async account pages."""
+        urlpatterns = [
+            path("litrevu/account/", include(auth_patterns(async_views))),
+            path("litrevu/", include(app_patterns(app_views))),
+        ]
+
+    def setUp(self):
+        User.objects.create_user(username="Hasher", password="Hash-m3-0nce")
+
+    async def _post(self, url_name: str, data: dict):
+        with override_settings(ROOT_URLCONF=self.async_urls):
+            return await self.async_client.post(reverse(url_name), data)
+
+    async def _session_user_id(self) -> str | None:
+        session = await self.async_client.asession()
+        return await session.aget("_auth_user_id")
+
+    async def test_login(self):
+        response = await self._post("auth", {"action": "login", "username": "hasher", "password": "wrong"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(await self._session_user_id())
+        with patch.object(async_views, "authenticate", wraps=authenticate) as login:
+            response = await self._post("auth", {"action": "login", "username": "hasher", "password": "Hash-m3-0nce"})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(login.called)
+        user = await User.objects.aget(username="Hasher")
+        self.assertEqual(await self._session_user_id(), str(user.pk))
+
+    async def test_register(self):
+        response = await self._post(
+            "register",
+            {"action": "register", "username": "Newcomer", "password": "N3w-c0mer!", "password_confirm": "N3w-c0mer!"},
+        )
+        self.assertEqual(response.status_code, 302)
+        user = await User.objects.aget(username="Newcomer")
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+        self.assertEqual(await self._session_user_id(), str(user.pk))
+
+    @override_settings(LOGIN_THROTTLE={"STORE": "my_auth.throttle.CacheStore", "WINDOW": 60, "LIMITS": {"ip": 5, "username": 2}})
+    async def test_throttle(self):
+        """Throttle counters are read and written off the event loop."""
+        throttle.store.cache_clear()
+        self.addCleanup(throttle.store.cache_clear)
+        await cache.aclear()
+        store_calls = []
+
+        def off_loop(function):
+            def wrapper(*args, **kwargs):
+                with self.assertRaises(RuntimeError):
+                    asyncio.get_running_loop()
+                store_calls.append(function.__name__)
+                return function(*args, **kwargs)
+
+            return wrapper
+
+        with patch.object(throttle, "allow_login", off_loop(throttle.allow_login)), patch.object(
+            throttle, "login_failed", off_loop(throttle.login_failed)
+        ):
+            for i in range(2):
+                response = await self._post("auth", {"action": "login", "username": "hasher", "password": "wrong"})
+                self.assertEqual(response.status_code, 200)
+            response = await self._post("auth", {"action": "login", "username": "hasher", "password": "Hash-m3-0nce"})
+        self.assertEqual(response.status_code, 429)
+        self.assertListEqual(store_calls, ["allow_login", "login_failed"] * 2 + ["allow_login"])
+
+    async def test_pages(self):
+        for url_name in ("auth", "register"):
+            with override_settings(ROOT_URLCONF=self.async_urls):
+                response = await self.async_client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 200)
+
+    def test_hashing_cost(self):
+        """Hashes of another cost are still checked, and upgraded at the next login."""
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            self.assertEqual(get_hasher().iterations, 2000)
+            self.assertIsNotNone(authenticate(username="hasher", password="Hash-m3-0nce"))
+        self.assertIn("$2000$", User.objects.get(username="Hasher").password)
+
+
+THROTTLE = {"STORE": "my_auth.throttle.MemoryStore", "WINDOW": 60, "LIMITS": {"ip": 5, "username": 3}}
+
+
+@override_settings(LOGIN_THROTTLE=THROTTLE, PASSWORD_PBKDF2_ITERATIONS=1000)
+class LoginThrottleTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttle.store.cache_clear()
+        self.addCleanup(throttle.store.cache_clear)
+        User.objects.create_user(username="Hasher", password="Hash-m3-0nce")
+
+    def _login(self, username: str, password: str = "wrong", ip: str = "10.0.0.1"):
+        return self.client.post(
+            reverse("auth"), {"action": "login", "username": username, "password": password}, REMOTE_ADDR=ip
+        )
+
+    def test_username_limit(self):
+        """Failures on a username throttle it from any IP, ignoring case, without hashing passwords."""
+        for i in range(3):
+            self.assertEqual(self._login("hasher", ip=f"10.0.0.{i}").status_code, 200)
+        with patch.object(views, "authenticate") as login:
+            response = self._login("HASHER", password="Hash-m3-0nce", ip="10.0.0.9")
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(login.called)
+        self.assertEqual(self._login("other", ip="10.0.0.9").status_code, 200)
+        self.assertDictEqual(throttle.stats(), {"attempts": 5, "rejected": 1, "rejection_rate": 0.2})
+
+    def test_ip_limit(self):
+        """Failures from an IP throttle it, whatever the username."""
+        for i in range(5):
+            self.assertEqual(self._login(f"user_{i}").status_code, 200)
+        self.assertEqual(self._login("hasher", password="Hash-m3-0nce").status_code, 429)
+        self.assertEqual(self._login("hasher", password="Hash-m3-0nce", ip="10.0.0.2").status_code, 302)
+
+    def test_sliding_window(self):
+        """Failures of the previous window count for the part of it within the last WINDOW seconds."""
+        request = RequestFactory().post("/", REMOTE_ADDR="10.0.0.1")
+        with patch.object(throttle.time, "time", return_value=6000.0):
+            for i in range(3):
+                throttle.login_failed(request, "hasher")
+            self.assertFalse(throttle.allow_login(request, "hasher"))
+        # halfway through the next window: the 3 failures count for 1.5
+        with patch.object(throttle.time, "time", return_value=6090.0):
+            self.assertTrue(throttle.allow_login(request, "hasher"))
+            throttle.login_failed(request, "hasher")
+            self.assertTrue(throttle.allow_login(request, "hasher"))
+            throttle.login_failed(request, "hasher")
+            self.assertFalse(throttle.allow_login(request, "hasher"))
+        with patch.object(throttle.time, "time", return_value=6120.0):
+            self.assertTrue(throttle.allow_login(request, "hasher"))
+
+    @override_settings(LOGIN_THROTTLE={**THROTTLE, "STORE": "my_auth.throttle.CacheStore"})
+    def test_cache_store(self):
+        throttle.store.cache_clear()
+        for i in range(3):
+            self._login("Bad name ?")
+        self.assertEqual(self._login("bad name ?").status_code, 429)
+        self.assertEqual(metrics.snapshot()[throttle.REJECTED], 1)
+
+    def test_memory_store_bound(self):
+        store = throttle.MemoryStore(max_keys=3)
+        for key in "abcd":
+            store.incr(key, timeout=60)
+        self.assertDictEqual(store.get_many("abcd"), {"b": 1, "c": 1, "d": 1})
+        # expired counters are dropped as soon as they are the oldest ones
+        with patch.object(throttle.time, "time", return_value=time.time() + 60):
+            store.incr("e", timeout=60)
+        self.assertListEqual(list(store._counts), ["e"])
+
+
+class CachedSessionsTestCase(TestCase):
+    fixtures = ["tests.yaml"]
+
+    def setUp(self):
+        cache.clear()
+        self.alix = User.objects.get(pk=2)
+        self.client.force_login(self.alix)
+        self.client.get(reverse("subscriptions"))
+
+    def _auth_queries(self, url: str) -> list[str]:
+        """Queries reading sessions and users while requesting url."""
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [x["sql"] for x in ctx.captured_queries if '"django_session"' in x["sql"] or 'FROM "app_user"' in x["sql"]]
+
+    def test_cached(self):
+        """Sessions and users are served from the cache."""
+        for page in ("feed", "posts", "subscriptions"):
+            self.assertListEqual(self._auth_queries(reverse(page)), [], page)
+
+    def test_password_change(self):
+        """Changing the password drops the cached user: its sessions end."""
+        self.alix.set_password("N3w-passw0rd")
+        self.alix.save()
+        response = self.client.get(reverse("feed"))
+        self.assertRedirects(response, reverse("auth") + "?next=" + reverse("feed"), fetch_redirect_response=False)
+
+    def test_follow_counts(self):
+        """Cached users are dropped along with their subscription counters."""
+        UserFollows.objects.create(user=self.alix, followed_user_id=5)
+        self.assertEqual(len(self._auth_queries(reverse("subscriptions"))), 1)
+        response = self.client.get(reverse("subscriptions"))
+        self.assertEqual(response.context["following_count"], 3)
@@ -0,0 +1,137 @@
+"""Login throttling: failed logins are counted per client IP and per username,
+and further attempts are rejected before their password is hashed once a limit is reached.
+
+Failures are counted in fixed windows of LOGIN_THROTTLE["WINDOW"] seconds, and the sliding count
+weighs the previous window by the part of it still within the last WINDOW seconds:
+two counters per key, whatever the number of attempts.
+
+Counters are kept by the store configured by LOGIN_THROTTLE (see settings.py): MemoryStore counts
+in each process, CacheStore in Django's cache, shared by all workers with a shared cache backend.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import cache
+from typing import Iterable
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest
+from django.utils.module_loading import import_string
+from app import metrics
+
+ATTEMPTS = metrics.counter("login_throttle.attempts")
+REJECTED = metrics.counter("login_throttle.rejected")
+
+
+class MemoryStore:
+    """Counters held by the current process, at most max_keys of them:
+    expired counters are dropped first, then the oldest ones.
+
+    Counters are ordered by creation, that is by expiry time as they share the same timeout:
+    each increment evicts from the oldest end, in constant time whatever the number of counters."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._counts: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, int]:
+        now = time.time()
+        with self._lock:
+            entries = [(x, self._counts.get(x)) for x in keys]
+        return {key: entry[0] for key, entry in entries if entry is not None and entry[1] > now}
+
+    def incr(self, key: str, timeout: float):
+        now = time.time()
+        with self._lock:
+            count, expires = self._counts.get(key, (0, 0))
+            if expires <= now:
+                count, expires = 0, now + timeout
+                # a restarted counter expires last
+                self._counts.pop(key, None)
+            self._counts[key] = (count + 1, expires)
+            self._evict(now)
+
+    def _evict(self, now: float):
+        while self._counts:
+            key, (count, expires) = next(iter(self._counts.items()))
+            if expires > now and len(self._counts) <= self.max_keys:
+                return
+            self._counts.popitem(last=False)
+
+
+class CacheStore:
+    """Counters held in a Django cache, see CACHES in settings.py.
+    Keys are hashed: usernames may hold characters some cache backends reject in keys."""
+
+    def __init__(self, alias: str = "default", key_prefix: str = "login_throttle:"):
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, int]:
+        cache_keys = {self._cache_key(x): x for x in keys}
+        values = self.cache.get_many(list(cache_keys))
+        return {cache_keys[x]: value for x, value in values.items()}
+
+    def incr(self, key: str, timeout: float):
+        key = self._cache_key(key)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # first failure in this window: add() is a no-op if another worker created it in between
+            if not self.cache.add(key, 1, timeout=timeout):
+                self.cache.incr(key)
+
+    def _cache_key(self, key: str) -> str:
+        return self.key_prefix + hashlib.sha256(key.encode()).hexdigest()
+
+
+@cache
+def store() -> MemoryStore | CacheStore:
+    """The counters store configured by the LOGIN_THROTTLE setting."""
+    config = settings.LOGIN_THROTTLE
+    return import_string(config["STORE"])(**config.get("OPTIONS", {}))
+
+
+def allow_login(request: HttpRequest, username: str) -> bool:
+    """Tells if a login attempt may check its password:
+    False when the client IP or the username reached its limit of failures."""
+    metrics.incr(ATTEMPTS)
+    keys = _keys(request, username)
+    limits = settings.LOGIN_THROTTLE["LIMITS"]
+    window = settings.LOGIN_THROTTLE["WINDOW"]
+    index, elapsed = divmod(time.time(), window)
+    previous_keys = {x: f"{key}:{int(index) - 1}" for x, key in keys.items()}
+    current_keys = {x: f"{key}:{int(index)}" for x, key in keys.items()}
+    counts = store().get_many([*previous_keys.values(), *current_keys.values()])
+    for scope in keys:
+        previous = counts.get(previous_keys[scope], 0)
+        current = counts.get(current_keys[scope], 0)
+        if previous * (1 - elapsed / window) + current >= limits[scope]:
+            metrics.incr(REJECTED)
+            return False
+    return True
+
+
+def login_failed(request: HttpRequest, username: str):
+    """Counts a failed login for the client IP and the username."""
+    window = settings.LOGIN_THROTTLE["WINDOW"]
+    index = int(time.time() // window)
+    for key in _keys(request, username).values():
+        # kept through the next window, which weighs it
+        store().incr(f"{key}:{index}", timeout=2 * window)
+
+
+def stats() -> dict[str, int | float]:
+    """Login attempts and rejections, and the rejection rate."""
+    attempts, rejected = metrics.values(ATTEMPTS, REJECTED)
+    return {"attempts": attempts, "rejected": rejected, "rejection_rate": metrics.ratio(rejected, attempts - rejected)}
+
+
+def _keys(request: HttpRequest, username: str) -> dict[str, str]:
+    return {
+        "ip": "ip:%s" % request.META.get("REMOTE_ADDR", ""),
+        "username": "username:%s" % username.strip().lower(),
+    }
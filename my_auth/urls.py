@@ -1,9 +1,17 @@
+from django.conf import settings
 from django.urls import path
 
-from . import views
+from . import views, async_views
 
-urlpatterns = [
-    path("login", views.auth, name="auth"),
-    path("register", views.register, name="register"),
-    path("logout", views.logout, name="logout"),
-]
+
+def auth_patterns(pages) -> list:
+    """The url patterns of the account pages, pages being the module serving the login and registration pages:
+    my_auth.views, or my_auth.async_views for ASGI deployments."""
+    return [
+        path("login", pages.auth, name="auth"),
+        path("register", pages.register, name="register"),
+        path("logout", views.logout, name="logout"),
+    ]
+
+
+urlpatterns = auth_patterns(async_views if settings.ASYNC_VIEWS else views)
@@ -1,5 +1,6 @@
+from functools import cache
 from django.core.exceptions import ValidationError
-from django.utils.translation import gettext as _
+from django.utils.translation import gettext as _, get_language
 import math
 
 # special chars: !"#$%&\'()*+,-./
@@ -119,7 +120,10 @@ def password_entropy(password: str, stats: dict[str, float] = None) -> int:
     """
     stats = stats or password_stats(password)
     r = password_char_range(password, stats)
-    return round(math.log2(math.pow(r, len(password))))
+    if not r:
+        return 0
+    # log2(R^L) = L * log2(R): R^L overflows a float for long passwords
+    return round(len(password) * math.log2(r))
 
 
 def password_char_range(password: str, stats: dict[str, float] = None) -> int:
@@ -153,51 +157,76 @@ def password_char_range(password: str, stats: dict[str, float] = None) -> int:
 
 def password_stats(password: str) -> dict[str, float]:
     """Parse a password and return some stats on character types
-    and diversity of employed characters."""
-    diversity = 0
-    upper = 0
-    lower = 0
-    digit = 0
-    alpha = 0
-    special = 0
-    chars_map = {}
-    for c in password:
-        chars_map[c] = chars_map.get(c, 0) + 1
-        if str.isalpha(c):
-            alpha += 1
-            if str.isupper(c):
-                upper += 1
-            else:
-                lower += 1
-        elif str.isnumeric(c):
-            digit += 1
-        elif c in SPECIAL_CHARS:
-            special += 1
-    diversity = len(chars_map) / len(password)
+    and diversity of employed characters.
+
+    Each character is replaced by the code of its type in a single str.translate() pass
+    over CHAR_TYPE_CODES, then codes are counted: both run in C."""
+    codes = password.translate(CHAR_TYPE_CODES)
+    lower, upper = codes.count("l"), codes.count("u")
     return {
-        "diversity": diversity,
-        "alpha": alpha,
+        "diversity": len(set(password)) / len(password) if password else 0,
+        "alpha": lower + upper,
         "lower": lower,
         "upper": upper,
-        "digit": digit,
-        "special": special,
+        "digit": codes.count("d"),
+        "special": codes.count("s"),
     }
 
 
+def char_type_of(c: str) -> str:
+    """The type code of a character counted by password_stats():
+    "l" (lowercase letter), "u" (uppercase letter), "d" (digit), "s" (special char) or "o" (other).
+    Letters without case count as lowercase letters."""
+    if c.isalpha():
+        return "u" if c.isupper() else "l"
+    if c.isnumeric():
+        return "d"
+    if c in SPECIAL_CHARS:
+        return "s"
+    return "o"
+
+
+class CharTypeCodes(dict):
+    """Translation table from code points to type codes, for str.translate().
+    Holds the ASCII characters, other characters are classified when met and not stored:
+    the table cannot grow with the input."""
+
+    def __missing__(self, code_point: int) -> str:
+        return char_type_of(chr(code_point))
+
+
+CHAR_TYPE_CODES = CharTypeCodes((x, char_type_of(chr(x))) for x in range(128))
+
+# characters of each type, interleaved so that any prefix spans the widest range of characters:
+# lowercase and uppercase letters first, then special chars and digits
+EXAMPLE_CHARS = "".join(
+    "".join(x)
+    for x in zip(
+        "abcdefghijklmnopqrstuvwxyz",
+        "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+        "".join(SPECIAL_CHARS).ljust(26),
+        "0123456789".ljust(26),
+    )
+).replace(" ", "")
+
+
+@cache
 def password_example(required_strength: float) -> str:
-    """Generates a random password example meeting a strength requirement.
+    """The shortest password example meeting a strength requirement.
+
+    Examples are prefixes of EXAMPLE_CHARS: distinct characters from the widest range
+    available for their length, so their length is the minimal length of a password
+    meeting the requirement. Examples are computed once for each strength.
     """
-    low_chars = [chr(x) for x in range(ord('a'), ord('z') + 1)]
-    upper_chars = [chr(x) for x in range(ord('A'), ord('Z') + 1)]
-    digits = [chr(x) for x in range(ord('0'), ord('9') + 1)]
-    from itertools import chain
-    import random
-    table = list(chain(low_chars, upper_chars, digits, SPECIAL_CHARS))
-    random.shuffle(table)
-    i = 1
-    while password_strength("".join(table[:i])) < required_strength:
-        i += 1
-    return "".join(table[:i])
+    for i in range(1, len(EXAMPLE_CHARS) + 1):
+        if password_strength(EXAMPLE_CHARS[:i]) >= required_strength:
+            return EXAMPLE_CHARS[:i]
+    return EXAMPLE_CHARS
+
+
+def min_password_length(min_strength: float) -> int:
+    """The minimal length of a password meeting a strength requirement."""
+    return len(password_example(min_strength)) if min_strength else 0
 
 
 class StrengthPasswordValidator:
@@ -233,7 +262,7 @@ class StrengthPasswordValidator:
         min_digit: int = 0,
         min_special: int = 0,
     ):
-        if str(min_strength).isnumeric():
+        if isinstance(min_strength, (int, float)) or str(min_strength).isnumeric():
             self.min_strength: float = float(min_strength)
         else:
             self.min_strength: float = float(password_strength_from_symbol(min_strength))
@@ -242,6 +271,7 @@ class StrengthPasswordValidator:
         self.min_upper: int = min_upper
         self.min_digit: int = min_digit
         self.min_special: int = min_special
+        self._help_texts: dict[str, str] = {}
 
     def validate(self, password: str, user=None):
         """Validates a password based on this validator's settings.
@@ -262,7 +292,14 @@ class StrengthPasswordValidator:
             raise ValidationError(msg, code=e.code)
 
     def get_help_text(self) -> str:
-        """Validator help text."""
+        """Validator help text, in the active language.
+        Help texts only depend on the validator's settings: they are built once per language."""
+        language = get_language()
+        if language not in self._help_texts:
+            self._help_texts[language] = self._build_help_text()
+        return self._help_texts[language]
+
+    def _build_help_text(self) -> str:
         help_msg = _("Choose a password strong enough")
         if length_suggestion := self.length_hint():
             help_msg += " (" + _("at least %d characters") % length_suggestion + ")"
@@ -281,9 +318,6 @@ class StrengthPasswordValidator:
         return help_msg
 
     def length_hint(self) -> int:
-        """Returns an estimate of minimal password length to meet strength or length requirement.
+        """Returns the minimal password length to meet both strength and length requirements.
         """
-        if self.min_strength:
-            return len(password_example(self.min_strength))
-        else:
-            return self.min_length
+        return max(min_password_length(self.min_strength), self.min_length)
@@ -4,6 +4,7 @@ from app.models import User
 from django.utils.translation import gettext as _
 from django.contrib.auth import login, authenticate, logout as django_logout, password_validation
 from .forms import AuthForm, RegisterForm
+from . import throttle
 from django.db import IntegrityError
 
 
@@ -33,26 +34,34 @@ def register(request: HttpRequest):
 
 
 def auth(request: HttpRequest):
-    """Autenticate an existing user and redirect to user feed on success."""
+    """Autenticate an existing user and redirect to user feed on success.
+    Answers 429 when too many logins failed for the client or the username."""
     context = {}
+    status = 200
     if request.POST.get('action') == "login":
         auth_form = AuthForm(request.POST)
         if auth_form.is_valid():
             username = auth_form.cleaned_data.get("username")
             password = auth_form.cleaned_data.get("password")
-            user = authenticate(request=request, username=username, password=password)
-            if user is not None:
-                login(request=request, user=user)
-                return _redirect_after_authentication(request)
+            # rejected before hashing the password, see my_auth.throttle
+            if not throttle.allow_login(request, username):
+                auth_form.add_error(field=None, error=_("Too many failed logins, try again later"))
+                status = 429
             else:
-                auth_form.add_error(field=None, error=_("Wrong login"))
+                user = authenticate(request=request, username=username, password=password)
+                if user is not None:
+                    login(request=request, user=user)
+                    return _redirect_after_authentication(request)
+                else:
+                    throttle.login_failed(request, username)
+                    auth_form.add_error(field=None, error=_("Wrong login"))
         else:
             auth_form.add_error(field=None, error="Invalid data")
     else:
         auth_form = AuthForm()
     context["auth_form"] = auth_form
     context["redirect_after_login"] = _redirect_url(request)
-    return render(request, "app/index.html", context)
+    return render(request, "app/index.html", context, status=status)
 
 
 def _redirect_url(request: HttpRequest) -> str:
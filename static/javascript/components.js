@@ -115,6 +115,50 @@
         }
     }
 
+    /**
+     * Suggests usernames in the datalist of a text input as the user types.
+     *
+     * usage ex. in your html:
+     *
+     * <input list="suggestions" data-suggestions-url="/litrevu/api/users/suggestions"><datalist id="suggestions"></datalist>
+     *
+     * Suggestions are requested at most once per prefix, and only after the user stops typing for a short delay.
+     */
+    function initUsernameSuggestions(input) {
+        const datalist = document.getElementById(input.getAttribute("list"));
+        const cache = new Map();
+        let timer = null;
+
+        function show(usernames) {
+            datalist.replaceChildren(...usernames.map((x) => {
+                const option = document.createElement("option");
+                option.value = x;
+                return option;
+            }));
+        }
+
+        input.addEventListener("input", () => {
+            clearTimeout(timer);
+            const prefix = input.value.trim().toLowerCase();
+            if (!prefix) {
+                show([]);
+            } else if (cache.has(prefix)) {
+                show(cache.get(prefix));
+            } else {
+                timer = setTimeout(async () => {
+                    const url = input.dataset.suggestionsUrl + "?q=" + encodeURIComponent(prefix);
+                    const response = await fetch(url, { credentials: "same-origin" });
+                    if (response.ok) {
+                        cache.set(prefix, (await response.json()).usernames);
+                        if (input.value.trim().toLowerCase() === prefix) {
+                            show(cache.get(prefix));
+                        }
+                    }
+                }, 150);
+            }
+        });
+    }
+
     /**
      * Intiialize the components: load the stylesheet, and define custom elements.
      */
@@ -123,6 +167,7 @@
         RatingWidget.stylesheetURL = loader.dataset.stylesheetUrl;
         customElements.define("star-icon", StarIcon);
         customElements.define("rating-widget", RatingWidget);
+        document.querySelectorAll("input[data-suggestions-url]").forEach(initUsernameSuggestions);
         const buttons = document.querySelectorAll("button[data-confirm-text]")
         buttons.forEach((x) => { x.addEventListener("click", (evt) => {
             const confirmText = decodeURI(evt.target.dataset.confirmText)